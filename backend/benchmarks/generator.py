@@ -0,0 +1,226 @@
+"""Synthetic event history generator for benchmarks."""
+
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+from src.models.events import (
+    CodeInsertionEvent,
+    CodeType,
+    DocumentationEvent,
+    Event,
+    TestGenerationEvent,
+)
+from src.storage.sharded_storage import shard_index
+
+# Language -> file extension
+LANGUAGES = {
+    "python": ".py",
+    "typescript": ".ts",
+    "javascript": ".js",
+    "go": ".go",
+    "java": ".java",
+    "markdown": ".md",
+}
+
+TEST_FRAMEWORKS = ["pytest", "jest", "vitest", "junit", "go-test"]
+DOC_TYPES = ["comment", "readme", "api-doc"]
+
+# Typical line counts per source: (min, max)
+LINE_RANGES = {
+    "manual": (1, 8),
+    "completion": (1, 25),
+    "agent": (10, 300),
+}
+
+MODELS = {
+    CodeType.CODE: CodeInsertionEvent,
+    CodeType.TEST: TestGenerationEvent,
+    CodeType.DOCUMENTATION: DocumentationEvent,
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse a mix specification such as "manual=0.7,completion=0.2,agent=0.1".
+
+    Args:
+        spec: Comma-separated name=weight pairs
+
+    Returns:
+        Dictionary of name -> weight
+    """
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class EventGenerator:
+    """Reproducible generator of realistic event histories."""
+
+    def __init__(
+        self,
+        developers: int = 20,
+        days: int = 90,
+        features: int = 30,
+        source_mix: Optional[Dict[str, float]] = None,
+        type_mix: Optional[Dict[str, float]] = None,
+        seed: int = 42,
+        end: Optional[datetime] = None,
+    ):
+        """
+        Initialize generator.
+
+        Args:
+            developers: Number of distinct developers
+            days: Number of days of history, ending at `end`
+            features: Number of distinct feature names used by agent events
+            source_mix: Relative weights of completion/agent/manual events
+            type_mix: Relative weights of code/test/documentation events
+            seed: Random seed; identical settings produce identical histories
+            end: End of the history (defaults to now)
+        """
+        self.developers = [f"dev-{i:04d}" for i in range(developers)]
+        self.days = days
+        self.features = [f"feature-{i:03d}" for i in range(features)]
+        self.source_mix = source_mix or {"manual": 0.7, "completion": 0.2, "agent": 0.1}
+        self.type_mix = type_mix or {"code": 0.8, "test": 0.15, "documentation": 0.05}
+        self.seed = seed
+        self.end = end or datetime.now()
+
+    def iter_dicts(self, count: int) -> Iterator[dict]:
+        """
+        Generate events in stored (serialized dict) form, oldest first.
+
+        Args:
+            count: Number of events
+
+        Yields:
+            Event dictionaries
+        """
+        rng = random.Random(self.seed)
+        sources = list(self.source_mix)
+        source_weights = list(self.source_mix.values())
+        types = list(self.type_mix)
+        type_weights = list(self.type_mix.values())
+        languages = list(LANGUAGES)
+
+        start = self.end - timedelta(days=self.days)
+        step = timedelta(days=self.days) / max(count, 1)
+
+        # Each developer works mostly in a couple of languages and a file pool
+        profiles = {
+            dev: rng.sample(languages, 2) for dev in self.developers
+        }
+
+        for i in range(count):
+            developer_id = rng.choice(self.developers)
+            source = rng.choices(sources, source_weights)[0]
+            event_type = rng.choices(types, type_weights)[0]
+            language = rng.choice(profiles[developer_id])
+            low, high = LINE_RANGES.get(source, (1, 10))
+            timestamp = start + step * i
+
+            event = {
+                "type": event_type,
+                "source": source,
+                "lines": rng.randint(low, high),
+                "file_path": (
+                    f"src/{developer_id}/module_{rng.randint(0, 200)}"
+                    f"{LANGUAGES[language]}"
+                ),
+                "developer_id": developer_id,
+                "timestamp": timestamp.isoformat(),
+                "metadata": None,
+            }
+
+            if event_type == CodeType.CODE.value:
+                event["language"] = language
+            elif event_type == CodeType.TEST.value:
+                event["test_framework"] = rng.choice(TEST_FRAMEWORKS)
+                event["coverage"] = None
+            else:
+                event["doc_type"] = rng.choice(DOC_TYPES)
+
+            if source == "agent":
+                event["metadata"] = {
+                    "feature_name": rng.choice(self.features),
+                    "total_files": rng.randint(1, 6),
+                }
+
+            yield event
+
+    def iter_events(self, count: int) -> Iterator[Event]:
+        """
+        Generate events as Pydantic models for the ingest path.
+
+        Args:
+            count: Number of events
+
+        Yields:
+            Event models
+        """
+        for event in self.iter_dicts(count):
+            yield MODELS[CodeType(event["type"])](**event)
+
+    def write_json(self, data_dir: Path, count: int, shards: int = 0) -> None:
+        """
+        Write a history directly in JSONStorage's array format.
+
+        Args:
+            data_dir: Storage directory
+            count: Number of events
+            shards: Split into ShardedStorage shard directories (0 for none)
+        """
+        self._write(data_dir, count, ".json", shards)
+
+    def write_jsonl(self, data_dir: Path, count: int, shards: int = 0) -> None:
+        """
+        Write a history directly in JSONLStorage's line format.
+
+        Args:
+            data_dir: Storage directory
+            count: Number of events
+            shards: Split into ShardedStorage shard directories (0 for none)
+        """
+        self._write(data_dir, count, ".jsonl", shards)
+
+    def _write(self, data_dir: Path, count: int, suffix: str, shards: int = 0) -> None:
+        """Stream events into per-type files without holding them in memory."""
+        names = {
+            "code": "code_insertions",
+            "test": "test_generations",
+            "documentation": "documentation",
+        }
+        if shards:
+            dirs = [data_dir / f"shard-{i:02d}" for i in range(shards)]
+        else:
+            dirs = [data_dir]
+        files = {}
+        for number, directory in enumerate(dirs):
+            directory.mkdir(parents=True, exist_ok=True)
+            for t, name in names.items():
+                files[number, t] = open(directory / f"{name}{suffix}", "w", encoding="utf-8")
+        first = {key: True for key in files}
+        try:
+            if suffix == ".json":
+                for f in files.values():
+                    f.write("[")
+            for event in self.iter_dicts(count):
+                number = shard_index(event["developer_id"], shards) if shards else 0
+                key = (number, event["type"])
+                f = files[key]
+                if suffix == ".json":
+                    f.write(("\n" if first[key] else ",\n") + json.dumps(event))
+                    first[key] = False
+                else:
+                    f.write(json.dumps(event) + "\n")
+            if suffix == ".json":
+                for f in files.values():
+                    f.write("\n]")
+        finally:
+            for f in files.values():
+                f.close()
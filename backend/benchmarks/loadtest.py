@@ -0,0 +1,273 @@
+"""
+HTTP load generator for the backend API.
+
+Usage (from the backend directory):
+
+    # In-process ASGI transport against a fresh temporary data directory
+    python -m benchmarks.loadtest --duration 30 --ingest-users 20 --dashboard-users 10
+
+    # Against a running server (e.g. uvicorn src.main:app --workers 4)
+    python -m benchmarks.loadtest --url http://localhost:8000 --duration 60
+
+Ingest users post events back to back across the typed routes and the generic
+``POST /api/events/`` union route. Dashboard users poll the developer, team,
+trends and features routes every ``--poll-interval`` seconds, like the VSCode
+metrics panel. The report gives throughput, p50/p95/p99 latency and error rate
+per route. In ASGI mode the app shares the generator's event loop, so the
+reported event-loop lag exposes handlers that block the loop.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import httpx
+from .generator import EventGenerator
+from .run import percentile
+
+# Typed ingest route per event type
+TYPED_ROUTES = {
+    "code": "/api/events/code",
+    "test": "/api/events/test",
+    "documentation": "/api/events/documentation",
+}
+GENERIC_ROUTE = "/api/events/"
+
+
+class RouteStats:
+    """Latency and error accumulator for one route."""
+
+    def __init__(self):
+        """Initialize empty stats."""
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Record one request latency (seconds) and outcome."""
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    def summary(self, duration: float) -> Dict:
+        """Summarize throughput, latency percentiles and errors."""
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        ms = lambda pct: round(percentile(latencies, pct) * 1000, 2) if count else None
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / duration, 2) if duration else None,
+            "p50_ms": ms(50),
+            "p95_ms": ms(95),
+            "p99_ms": ms(99),
+            "max_ms": round(latencies[-1] * 1000, 2) if count else None,
+        }
+
+
+class LoadTest:
+    """Drives concurrent ingest and dashboard traffic against the API."""
+
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        """
+        Initialize load test.
+
+        Args:
+            client: HTTP client bound to the API under test
+            args: Parsed command line arguments
+        """
+        self.client = client
+        self.args = args
+        self.stats: Dict[str, RouteStats] = {}
+        self.loop_lags: List[float] = []
+        self.deadline = 0.0
+
+    async def _request(self, label: str, method: str, url: str, **kwargs) -> None:
+        """Send one request and record it under `label`."""
+        stats = self.stats.setdefault(label, RouteStats())
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        stats.record(time.perf_counter() - start, ok)
+
+    async def ingest_user(self, user: int) -> None:
+        """Post events back to back until the deadline."""
+        generator = EventGenerator(
+            developers=self.args.developers, days=1, seed=self.args.seed + user
+        )
+        rng = random.Random(self.args.seed + user)
+        events = generator.iter_dicts(10_000_000)
+        while time.perf_counter() < self.deadline:
+            event = next(events)
+            if rng.random() < self.args.generic_ratio:
+                route = GENERIC_ROUTE
+            else:
+                route = TYPED_ROUTES[event["type"]]
+            await self._request(f"POST {route}", "POST", route, json=event)
+            # Always yield: in-process ASGI calls may complete without suspending
+            await asyncio.sleep(self.args.think_time)
+
+    async def dashboard_user(self, user: int) -> None:
+        """Poll dashboard routes at a fixed interval until the deadline."""
+        developer_id = f"dev-{user % self.args.developers:04d}"
+        routes = [
+            ("GET /api/metrics/developer/{id}", f"/api/metrics/developer/{developer_id}"),
+            ("GET /api/metrics/team", "/api/metrics/team"),
+            ("GET /api/metrics/trends", "/api/metrics/trends?days=30"),
+            ("GET /api/metrics/features", "/api/metrics/features?limit=20"),
+        ]
+        # Spread users over the interval instead of polling in lockstep
+        await asyncio.sleep(random.Random(user).random() * self.args.poll_interval)
+        while time.perf_counter() < self.deadline:
+            started = time.perf_counter()
+            for label, url in routes:
+                await self._request(label, "GET", url)
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(max(0.0, self.args.poll_interval - elapsed))
+
+    async def monitor_loop_lag(self, interval: float = 0.05) -> None:
+        """Record how late the event loop wakes up from short sleeps."""
+        while time.perf_counter() < self.deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lags.append(max(0.0, time.perf_counter() - start - interval))
+
+    async def run(self) -> Dict:
+        """Run all virtual users for the configured duration."""
+        start = time.perf_counter()
+        self.deadline = start + self.args.duration
+        tasks = [self.ingest_user(i) for i in range(self.args.ingest_users)]
+        tasks += [self.dashboard_user(i) for i in range(self.args.dashboard_users)]
+        tasks.append(self.monitor_loop_lag())
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+
+        routes = {label: s.summary(duration) for label, s in sorted(self.stats.items())}
+        total = sum(len(s.latencies) for s in self.stats.values())
+        errors = sum(s.errors for s in self.stats.values())
+        lags = sorted(self.loop_lags)
+
+        return {
+            "duration_seconds": round(duration, 2),
+            "total_requests": total,
+            "total_errors": errors,
+            "throughput_rps": round(total / duration, 2),
+            "routes": routes,
+            "event_loop_lag_ms": {
+                "p50": round(percentile(lags, 50) * 1000, 2) if lags else None,
+                "p99": round(percentile(lags, 99) * 1000, 2) if lags else None,
+                "max": round(lags[-1] * 1000, 2) if lags else None,
+            },
+        }
+
+
+async def _main(args: argparse.Namespace) -> Dict:
+    """Create the client for the selected transport and run the load test."""
+    limits = httpx.Limits(max_connections=args.ingest_users + args.dashboard_users)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout)
+        mode = "http"
+    else:
+        # Import the app only now so it picks up the temporary data directory
+        from src.main import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://loadtest",
+            timeout=args.timeout,
+        )
+        mode = "asgi"
+
+    async with client:
+        report = await LoadTest(client, args).run()
+
+    report["mode"] = mode
+    report["config"] = {
+        key: str(value) if isinstance(value, Path) else value
+        for key, value in vars(args).items()
+    }
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="AI LOC Tracker HTTP load test")
+    parser.add_argument("--url", default=None, help="Base URL; omit for in-process ASGI")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--ingest-users", type=int, default=10)
+    parser.add_argument("--dashboard-users", type=int, default=5)
+    parser.add_argument(
+        "--poll-interval", type=float, default=5.0, help="Dashboard poll period (s)"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=0.0, help="Pause between ingest posts (s)"
+    )
+    parser.add_argument(
+        "--generic-ratio",
+        type=float,
+        default=0.25,
+        help="Share of ingest posts sent to POST /api/events/ (default: 0.25)",
+    )
+    parser.add_argument("--developers", type=int, default=20)
+    parser.add_argument(
+        "--seed-events",
+        type=int,
+        default=0,
+        help="ASGI mode: pre-populate the store with this many events",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=["json", "jsonl"],
+        default="json",
+        help="ASGI mode: storage backend (default: json)",
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the load test and emit a JSON report."""
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="loc-loadtest-") as tmp:
+        if not args.url:
+            data_dir = Path(tmp)
+            os.environ["METRICS_DATA_DIR"] = str(data_dir)
+            os.environ["METRICS_STORAGE"] = args.storage
+            if args.seed_events:
+                generator = EventGenerator(developers=args.developers, seed=args.seed)
+                if args.storage == "jsonl":
+                    generator.write_jsonl(data_dir, args.seed_events)
+                else:
+                    generator.write_json(data_dir, args.seed_events)
+
+        report = asyncio.run(_main(args))
+
+    for label, route in report["routes"].items():
+        print(
+            f"[loadtest] {label}: {route['requests']} req, "
+            f"p50 {route['p50_ms']} ms, p99 {route['p99_ms']} ms, "
+            f"errors {route['errors']}",
+            file=sys.stderr,
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
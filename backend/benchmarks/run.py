@@ -0,0 +1,403 @@
+"""
+Storage and aggregation benchmarks.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.run --sizes 10000,100000 --output results.json
+
+For each storage backend and history size, the store is pre-populated with a
+synthetic history, then:
+
+- ingest throughput and per-save latency are measured by timing
+  ``save_event`` calls appended on top of that history (so the cost of a
+  growing store shows up), once per durability mode (``--durability``), and
+- query latency is measured for every ``MetricsAggregator`` method, cold
+  (first call, including parsing and index/rollup warm-up) and warm, and
+- with ``--codecs``, JSONL histories are sealed into segments with each
+  codec to report on-disk size against full-scan speed.
+
+Results are printed as JSON so runs can be diffed across versions/backends.
+Sizes of 1M and 10M events are supported but take long and need memory
+proportional to the history for the JSON backend.
+"""
+
+import argparse
+import functools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+from src.services.aggregator import MetricsAggregator
+from src.storage.json_storage import JSONStorage
+from src.models.events import CodeType
+from src.storage.jsonl_storage import CODECS, JSONLStorage
+from src.storage.durability import DurabilityMode, DurabilityPolicy
+from src.storage.sharded_storage import ShardedStorage
+from .generator import EventGenerator, parse_mix
+
+# Shards used by the *-sharded backends
+BENCH_SHARDS = 4
+
+BACKENDS = {
+    "json": (JSONStorage, EventGenerator.write_json),
+    "jsonl": (JSONLStorage, EventGenerator.write_jsonl),
+    "json-sharded": (
+        functools.partial(ShardedStorage, shards=BENCH_SHARDS, storage_cls=JSONStorage),
+        functools.partial(EventGenerator.write_json, shards=BENCH_SHARDS),
+    ),
+    "jsonl-sharded": (
+        functools.partial(ShardedStorage, shards=BENCH_SHARDS, storage_cls=JSONLStorage),
+        functools.partial(EventGenerator.write_jsonl, shards=BENCH_SHARDS),
+    ),
+}
+
+
+def _git_commit() -> str:
+    """Best-effort current git commit, for comparing results across versions."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an ascending list.
+
+    Args:
+        sorted_values: Non-empty ascending values
+        pct: Percentile (0-100)
+
+    Returns:
+        Percentile value
+    """
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _time_call(func: Callable, repeat: int) -> Dict:
+    """
+    Time a call once cold and `repeat` times warm.
+
+    Args:
+        func: Zero-argument callable
+        repeat: Number of warm repetitions
+
+    Returns:
+        Dictionary with latencies in milliseconds
+    """
+    start = time.perf_counter()
+    func()
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        warm.append((time.perf_counter() - start) * 1000)
+    warm.sort()
+
+    return {
+        "cold_ms": round(cold_ms, 3),
+        "warm_ms_median": round(statistics.median(warm), 3) if warm else None,
+        "warm_ms_p95": round(percentile(warm, 95), 3) if warm else None,
+    }
+
+
+def bench_ingest(storage, generator: EventGenerator, count: int) -> Dict:
+    """
+    Measure save_event throughput and latency on top of the existing history.
+
+    Args:
+        storage: Storage instance to write to
+        generator: Generator used for the appended events
+        count: Number of events to save
+
+    Returns:
+        Dictionary with throughput and latency figures
+    """
+    events = list(generator.iter_events(count))
+    latencies = []
+    start = time.perf_counter()
+    for event in events:
+        started = time.perf_counter()
+        storage.save_event(event)
+        latencies.append(time.perf_counter() - started)
+    # Writes still in the loss window are synced on close
+    storage.close()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "events": count,
+        "seconds": round(elapsed, 4),
+        "events_per_sec": round(count / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "loss_window": storage.durability.loss_window,
+    }
+
+
+def bench_queries(storage, generator: EventGenerator, repeat: int) -> Dict:
+    """
+    Measure latency of every MetricsAggregator method.
+
+    Args:
+        storage: Pre-populated storage instance
+        generator: Generator that produced the history
+        repeat: Warm repetitions per method
+
+    Returns:
+        Dictionary of method name -> latency figures
+    """
+    aggregator = MetricsAggregator(storage)
+    developer_id = generator.developers[0]
+    week_ago = generator.end - timedelta(days=7)
+
+    cases = {
+        "get_developer_metrics": lambda: aggregator.get_developer_metrics(developer_id),
+        "get_developer_metrics_7d": lambda: aggregator.get_developer_metrics(
+            developer_id, week_ago, generator.end
+        ),
+        "get_team_metrics": lambda: aggregator.get_team_metrics(),
+        "get_trends": lambda: aggregator.get_trends(None, 30),
+        "get_trends_developer": lambda: aggregator.get_trends(developer_id, 30),
+        "get_features_metrics": lambda: aggregator.get_features_metrics(20),
+        "query_language": lambda: aggregator.query(["language", "source"]),
+        "query_extension": lambda: aggregator.query(["file_extension"]),
+    }
+
+    return {name: _time_call(func, repeat) for name, func in cases.items()}
+
+
+def bench_segments(storage_cls, data_dir: Path, codec: str) -> Dict:
+    """
+    Seal a JSONL history into segments with a codec and time reading it back.
+
+    Args:
+        storage_cls: JSONL (or sharded JSONL) storage factory
+        data_dir: Directory holding a freshly written history
+        codec: Codec to seal with
+
+    Returns:
+        Dictionary with on-disk size, sealing time and cold scan latencies
+    """
+    storage = storage_cls(data_dir)
+    start = time.perf_counter()
+    for partition in getattr(storage, "shards", [storage]):
+        for event_type in CodeType:
+            partition.seal(event_type, codec)
+    seal_seconds = time.perf_counter() - start
+
+    # Fresh instances, so indexes are rebuilt from the segments
+    start = time.perf_counter()
+    rows = len(storage_cls(data_dir).get_all_events())
+    scan_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    MetricsAggregator(storage_cls(data_dir)).get_team_metrics()
+    team_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "storage_bytes": sum(f.stat().st_size for f in data_dir.rglob("*") if f.is_file()),
+        "seal_seconds": round(seal_seconds, 3),
+        "full_scan_ms": round(scan_ms, 3),
+        "full_scan_rows": rows,
+        "team_cold_ms": round(team_ms, 3),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    """Run all configured benchmarks and collect results."""
+    results = []
+    for size in args.sizes:
+        for backend in args.backends:
+            storage_cls, write_history = BACKENDS[backend]
+            generator = EventGenerator(
+                developers=args.developers,
+                days=args.days,
+                features=args.features,
+                source_mix=args.source_mix,
+                seed=args.seed,
+            )
+
+            with tempfile.TemporaryDirectory(prefix="loc-bench-") as tmp:
+                data_dir = Path(tmp)
+                start = time.perf_counter()
+                write_history(generator, data_dir, size)
+                populate_seconds = time.perf_counter() - start
+
+                storage = storage_cls(data_dir)
+                queries = bench_queries(storage, generator, args.repeat)
+
+                ingest = {}
+                for mode in args.durability:
+                    ingest_generator = EventGenerator(
+                        developers=args.developers,
+                        features=args.features,
+                        days=1,
+                        source_mix=args.source_mix,
+                        seed=args.seed + 1,
+                    )
+                    ingest[mode] = bench_ingest(
+                        storage_cls(data_dir, durability=DurabilityPolicy(mode)),
+                        ingest_generator,
+                        args.ingest_events,
+                    )
+
+                size_bytes = sum(f.stat().st_size for f in data_dir.rglob("*") if f.is_file())
+
+            segments = {}
+            if backend.startswith("jsonl"):
+                for codec in args.codecs:
+                    with tempfile.TemporaryDirectory(prefix="loc-bench-") as tmp:
+                        write_history(
+                            EventGenerator(
+                                developers=args.developers,
+                                days=args.days,
+                                features=args.features,
+                                source_mix=args.source_mix,
+                                seed=args.seed,
+                            ),
+                            Path(tmp),
+                            size,
+                        )
+                        segments[codec] = bench_segments(storage_cls, Path(tmp), codec)
+                        print(
+                            f"[bench] {backend} {size} events sealed with {codec}: "
+                            f"{segments[codec]['storage_bytes']} bytes, full scan "
+                            f"{segments[codec]['full_scan_ms']} ms",
+                            file=sys.stderr,
+                        )
+
+            result = {
+                "backend": backend,
+                "events": size,
+                "storage_bytes": size_bytes,
+                "populate_seconds": round(populate_seconds, 3),
+                "ingest": ingest,
+                "queries": queries,
+            }
+            if segments:
+                result["segments"] = segments
+            results.append(result)
+            saves = ", ".join(
+                f"{mode} {figures['events_per_sec']}/s" for mode, figures in ingest.items()
+            )
+            print(
+                f"[bench] {backend} {size} events: saves {saves}; "
+                f"team {queries['get_team_metrics']['warm_ms_median']} ms",
+                file=sys.stderr,
+            )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "sizes": args.sizes,
+                "backends": args.backends,
+                "developers": args.developers,
+                "days": args.days,
+                "features": args.features,
+                "source_mix": args.source_mix,
+                "ingest_events": args.ingest_events,
+                "durability": args.durability,
+                "codecs": args.codecs,
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="AI LOC Tracker storage benchmarks")
+    parser.add_argument(
+        "--sizes",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[10_000, 100_000],
+        help="Comma-separated history sizes (default: 10000,100000)",
+    )
+    parser.add_argument(
+        "--backends",
+        type=lambda s: s.split(","),
+        default=list(BACKENDS),
+        help="Comma-separated storage backends (default: all of "
+        + ",".join(BACKENDS)
+        + ")",
+    )
+    parser.add_argument("--developers", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--features", type=int, default=30)
+    parser.add_argument(
+        "--source-mix",
+        type=parse_mix,
+        default=None,
+        help='Source weights, e.g. "manual=0.7,completion=0.2,agent=0.1"',
+    )
+    parser.add_argument(
+        "--ingest-events",
+        type=int,
+        default=200,
+        help="Events saved one by one on top of each history (default: 200)",
+    )
+    parser.add_argument(
+        "--durability",
+        type=lambda s: s.split(","),
+        default=[DurabilityMode.NONE.value],
+        help="Comma-separated durability modes to ingest with "
+        "(always,group,interval,none; default: none)",
+    )
+    parser.add_argument(
+        "--codecs",
+        type=lambda s: s.split(",") if s else [],
+        default=[],
+        help="Comma-separated segment codecs to compare for JSONL backends "
+        "(none,gzip,lzma,bz2; default: skip)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Warm query repetitions")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    """Run benchmarks and emit JSON results."""
+    args = parse_args(argv)
+    unknown = [b for b in args.backends if b not in BACKENDS]
+    if unknown:
+        raise SystemExit(f"Unknown backend(s): {', '.join(unknown)}")
+    modes = {m.value for m in DurabilityMode}
+    unknown = [m for m in args.durability if m not in modes]
+    if unknown:
+        raise SystemExit(f"Unknown durability mode(s): {', '.join(unknown)}")
+    unknown = [c for c in args.codecs if c not in CODECS]
+    if unknown:
+        raise SystemExit(f"Unknown codec(s): {', '.join(unknown)}")
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Admin endpoints (require the METRICS_ADMIN_TOKEN secret)."""
+
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from ..dependencies import profiler
+from ..models.admin import ProfilingSettings
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+def _check_token(token: Optional[str]) -> None:
+    """
+    Reject requests without the admin token.
+
+    Args:
+        token: Value of the X-Admin-Token header
+
+    Raises:
+        HTTPException: 403 if the admin API is disabled or the token is wrong
+    """
+    if not profiler.admin_token:
+        raise HTTPException(status_code=403, detail="Admin API disabled")
+    # As bytes: compare_digest() rejects str with non-ASCII characters
+    if not token or not hmac.compare_digest(
+        token.encode("utf-8"), profiler.admin_token.encode("utf-8")
+    ):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/profiling", response_model=dict)
+async def get_profiling(x_admin_token: Optional[str] = Header(None)) -> dict:
+    """
+    Get profiling settings and stored profile ids.
+
+    Returns:
+        Settings and profile ids, newest first
+    """
+    _check_token(x_admin_token)
+    return {**profiler.settings(), "profiles": profiler.list_profiles()}
+
+
+@router.put("/profiling", response_model=dict)
+async def update_profiling(
+    settings: ProfilingSettings,
+    x_admin_token: Optional[str] = Header(None),
+) -> dict:
+    """
+    Toggle sampled profiling.
+
+    Args:
+        settings: New toggle settings
+
+    Returns:
+        Updated settings
+    """
+    _check_token(x_admin_token)
+    profiler.configure(settings.enabled, settings.sample_rate, settings.route_prefix)
+    return profiler.settings()
+
+
+@router.get("/profiling/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_summary(
+    profile_id: str,
+    x_admin_token: Optional[str] = Header(None),
+) -> PlainTextResponse:
+    """
+    Get the hotspot summary of a stored profile.
+
+    Args:
+        profile_id: Profile id from the profile list
+
+    Returns:
+        Top-N hotspot summary as text
+    """
+    _check_token(x_admin_token)
+    if profile_id not in profiler.list_profiles():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    summary = profiler.profile_dir / f"{profile_id}.txt"
+    return PlainTextResponse(summary.read_text(encoding="utf-8"))
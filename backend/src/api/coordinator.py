@@ -0,0 +1,253 @@
+"""Public API of a coordinator node, backed by the cluster nodes."""
+
+from datetime import datetime
+from typing import List, Optional
+import httpx
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from ..dependencies import coordinator
+from ..models.events import EventBatch
+from ..services.export import EXPORT_FORMATS, parse_export_filters
+from ..services.paging import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ORDERS, decode_cursor
+from .events import parse_batch
+
+router = APIRouter(tags=["coordinator"])
+
+
+async def _forward(request: Request, developer_id: Optional[str], json: Optional[dict] = None):
+    """Relay a request to the developer's node and its response back."""
+    try:
+        response = await coordinator.forward(
+            request.method,
+            developer_id,
+            request.url.path,
+            params=dict(request.query_params),
+            json=json,
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Backend node unavailable: {str(e)}")
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type"),
+    )
+
+
+@router.post("/api/events/code", response_model=dict)
+@router.post("/api/events/test", response_model=dict)
+@router.post("/api/events/documentation", response_model=dict)
+@router.post("/api/events/", response_model=dict)
+async def route_event(request: Request):
+    """
+    Forward an event to the node owning its developer.
+
+    Validation happens on the node, so errors are relayed unchanged.
+
+    Returns:
+        The node's response
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be JSON")
+    developer_id = body.get("developer_id") if isinstance(body, dict) else None
+    return await _forward(request, developer_id, json=body)
+
+
+@router.post("/api/events/batch", response_model=dict)
+async def route_event_batch(batch: EventBatch) -> dict:
+    """
+    Validate an event batch and split it across the owning nodes.
+
+    Args:
+        batch: Events and optional batch ID
+
+    Returns:
+        Combined response with the number of events saved
+    """
+    parse_batch(batch)
+    try:
+        return await coordinator.forward_batch(batch.batch_id, batch.events)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Backend node unavailable: {str(e)}")
+
+
+@router.get("/api/events", response_model=dict)
+async def list_events(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Events per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    order: str = Query("desc", description="desc (newest first) or asc"),
+    developer_id: Optional[List[str]] = Query(None, description="Developer ID filter (repeatable)"),
+    types: Optional[List[str]] = Query(
+        None, alias="type", description="Event type filter (repeatable)"
+    ),
+    source: Optional[List[str]] = Query(None, description="Code source filter (repeatable)"),
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+) -> dict:
+    """
+    Page through the raw events of every node owning matching developers.
+
+    Filters are validated here and passed on unchanged (language and
+    feature_name too); node pages are merged in timestamp order.
+
+    Returns:
+        Dictionary with events, count and next_cursor
+    """
+    try:
+        if order not in ORDERS:
+            raise ValueError(f"Invalid order '{order}', expected asc or desc")
+        parse_export_filters(types, source)
+        for value in (start_date, end_date):
+            if value:
+                datetime.fromisoformat(value)
+        after = decode_cursor(cursor, order) if cursor else None
+        if after is not None and len(after) < 4:
+            raise ValueError("Cursor does not match this cluster")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event query: {str(e)}")
+
+    try:
+        return await coordinator.page_events(
+            request.query_params.multi_items(), developer_id, limit, after, order
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Backend node unavailable: {str(e)}")
+
+
+@router.get("/api/events/export", response_class=StreamingResponse)
+async def export_events(
+    request: Request,
+    fmt: str = Query("ndjson", alias="format", description="ndjson or csv"),
+    developer_id: Optional[List[str]] = Query(None, description="Developer ID filter (repeatable)"),
+    types: Optional[List[str]] = Query(
+        None, alias="type", description="Event type filter (repeatable)"
+    ),
+    source: Optional[List[str]] = Query(None, description="Code source filter (repeatable)"),
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+) -> StreamingResponse:
+    """
+    Stream the raw events of every node owning matching developers.
+
+    Filters are validated here and passed on unchanged (feature_name too).
+
+    Returns:
+        Streaming response with the nodes' exports concatenated
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid format '{fmt}', expected ndjson or csv"
+        )
+    try:
+        parse_export_filters(types, source)
+        for value in (start_date, end_date):
+            if value:
+                datetime.fromisoformat(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid export filter: {str(e)}")
+
+    return StreamingResponse(
+        coordinator.export(request.query_params.multi_items(), developer_id, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="events.{fmt}"'},
+    )
+
+
+@router.get("/api/metrics/developer/{developer_id}", response_model=dict)
+async def get_developer_metrics(developer_id: str, request: Request):
+    """
+    Forward a developer metrics request to the developer's node.
+
+    Args:
+        developer_id: Developer identifier
+
+    Returns:
+        The node's response
+    """
+    return await _forward(request, developer_id)
+
+
+@router.get("/api/metrics/team", response_model=dict)
+async def get_team_metrics(
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+) -> dict:
+    """
+    Get team metrics merged from all nodes.
+
+    Args:
+        start_date: Optional start date filter (ISO format)
+        end_date: Optional end date filter (ISO format)
+
+    Returns:
+        Team metrics; `partial` is true if some nodes did not answer
+    """
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+
+        return await coordinator.team_metrics(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    except (RuntimeError, httpx.HTTPError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/api/metrics/trends", response_model=dict)
+async def get_trends(
+    developer_id: Optional[str] = Query(
+        None, description="Optional developer ID filter"
+    ),
+    days: int = Query(30, ge=1, le=365, description="Number of days to look back"),
+) -> dict:
+    """
+    Get trends merged from all nodes.
+
+    Args:
+        developer_id: Optional developer ID to filter
+        days: Number of days to look back (1-365)
+
+    Returns:
+        Trend data; `partial` is true if some nodes did not answer
+    """
+    try:
+        return await coordinator.trends(developer_id, days)
+    except (RuntimeError, httpx.HTTPError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/api/metrics/features", response_model=dict)
+async def get_features_metrics(
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of features to return"),
+) -> dict:
+    """
+    Get feature metrics merged from all nodes.
+
+    Args:
+        limit: Maximum number of features to return
+
+    Returns:
+        Feature metrics; `partial` is true if some nodes did not answer
+    """
+    try:
+        return await coordinator.features(limit)
+    except (RuntimeError, httpx.HTTPError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/api/metrics/health", response_model=dict)
+async def health_check() -> dict:
+    """
+    Health check endpoint.
+
+    Returns:
+        Health status and configured nodes
+    """
+    return {
+        "status": "healthy",
+        "service": "ai-loc-tracker-coordinator",
+        "version": "0.1.0",
+        "nodes": coordinator.nodes,
+    }
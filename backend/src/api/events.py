@@ -1,18 +1,30 @@
 """API endpoints for event ingestion."""
 
-from typing import Union
-from fastapi import APIRouter, HTTPException
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from ..models.events import (
     CodeInsertionEvent,
     TestGenerationEvent,
     DocumentationEvent,
+    CodeType,
+    Event,
+    EventBatch,
+    EVENT_MODELS,
 )
-from ..storage.json_storage import JSONStorage
+from ..dependencies import coalescer, storage
+from ..services.export import EXPORT_FORMATS, iter_export_rows, stream_export
+from ..services.paging import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, page_events
 
 router = APIRouter(prefix="/api/events", tags=["events"])
 
-# Initialize storage (in production, use dependency injection)
-storage = JSONStorage()
+# Batch IDs remembered so client retries of a saved batch are not saved twice
+RECENT_BATCHES = 1024
+_recent_batches: "OrderedDict[str, int]" = OrderedDict()
 
 
 @router.post("/code", response_model=dict)
@@ -27,7 +39,7 @@ async def receive_code_event(event: CodeInsertionEvent) -> dict:
         Success response
     """
     try:
-        storage.save_event(event)
+        coalescer.save_event(event)
         return {
             "success": True,
             "message": "Code insertion event saved",
@@ -49,7 +61,7 @@ async def receive_test_event(event: TestGenerationEvent) -> dict:
         Success response
     """
     try:
-        storage.save_event(event)
+        coalescer.save_event(event)
         return {
             "success": True,
             "message": "Test generation event saved",
@@ -71,7 +83,7 @@ async def receive_documentation_event(event: DocumentationEvent) -> dict:
         Success response
     """
     try:
-        storage.save_event(event)
+        coalescer.save_event(event)
         return {
             "success": True,
             "message": "Documentation event saved",
@@ -95,7 +107,7 @@ async def receive_event(
         Success response
     """
     try:
-        storage.save_event(event)
+        coalescer.save_event(event)
         return {
             "success": True,
             "message": "Event saved",
@@ -103,3 +115,193 @@ async def receive_event(
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save event: {str(e)}")
+
+
+def parse_batch(batch: EventBatch) -> List[Event]:
+    """
+    Validate every event of a batch against the model of its type.
+
+    Args:
+        batch: Event batch
+
+    Returns:
+        Validated events
+
+    Raises:
+        RequestValidationError: If any event is invalid (nothing is saved)
+    """
+    events, errors = [], []
+    for i, data in enumerate(batch.events):
+        try:
+            model = EVENT_MODELS[CodeType(data.get("type", CodeType.CODE.value))]
+            events.append(model.model_validate(data))
+        except ValueError as e:
+            if isinstance(e, ValidationError):
+                details = e.errors(include_url=False, include_context=False)
+            else:
+                details = [{"type": "enum", "loc": ("type",), "msg": str(e)}]
+            for error in details:
+                error["loc"] = ("body", "events", i, *error["loc"])
+                errors.append(error)
+    if errors:
+        raise RequestValidationError(errors)
+    return events
+
+
+@router.post("/batch", response_model=dict)
+async def receive_event_batch(batch: EventBatch) -> dict:
+    """
+    Receive several events of any type in one request.
+
+    The batch is validated as a whole and saved with one write per event
+    file. Resending a batch with a recently saved `batch_id` is acknowledged
+    without saving it again, so clients can retry safely.
+
+    Args:
+        batch: Events and optional batch ID
+
+    Returns:
+        Success response with the number of events saved
+    """
+    events = parse_batch(batch)
+    if batch.batch_id is not None and batch.batch_id in _recent_batches:
+        return {
+            "success": True,
+            "message": "Batch already saved",
+            "saved": _recent_batches[batch.batch_id],
+            "duplicate": True,
+        }
+    try:
+        coalescer.save_events(events)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save events: {str(e)}")
+
+    if batch.batch_id is not None:
+        _recent_batches[batch.batch_id] = len(events)
+        if len(_recent_batches) > RECENT_BATCHES:
+            _recent_batches.popitem(last=False)
+    return {
+        "success": True,
+        "message": "Event batch saved",
+        "saved": len(events),
+        "duplicate": False,
+    }
+
+
+@router.get("", response_model=dict)
+async def list_events(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Events per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    order: str = Query("desc", description="desc (newest first) or asc"),
+    developer_id: Optional[List[str]] = Query(None, description="Developer ID filter (repeatable)"),
+    types: Optional[List[str]] = Query(
+        None, alias="type", description="Event type filter (repeatable)"
+    ),
+    source: Optional[List[str]] = Query(None, description="Code source filter (repeatable)"),
+    language: Optional[List[str]] = Query(None, description="Language filter (repeatable)"),
+    feature_name: Optional[List[str]] = Query(
+        None, description="Feature name filter (repeatable)"
+    ),
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+) -> dict:
+    """
+    Page through raw stored events in timestamp order.
+
+    Each response carries an opaque ``next_cursor``; pass it back unchanged
+    (with the same filters and order) to get the next page. It is null once
+    there are no more events.
+
+    Args:
+        limit: Maximum number of events per page
+        cursor: Cursor of the previous page
+        order: desc or asc
+        developer_id: Developer IDs (default: all)
+        types: Event types (default: all)
+        source: Code sources (default: all)
+        language: Programming languages (default: all)
+        feature_name: Feature names (default: all)
+        start_date: Optional start date filter (ISO format)
+        end_date: Optional end date filter (ISO format)
+
+    Returns:
+        Dictionary with events, count and next_cursor
+    """
+    try:
+        result = page_events(
+            storage,
+            limit=limit,
+            cursor=cursor,
+            order=order,
+            types=types,
+            developer_ids=developer_id,
+            sources=source,
+            languages=language,
+            feature_names=feature_name,
+            start_date=datetime.fromisoformat(start_date) if start_date else None,
+            end_date=datetime.fromisoformat(end_date) if end_date else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event query: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list events: {str(e)}")
+
+    del result["keys"]
+    return result
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_events(
+    fmt: str = Query("ndjson", alias="format", description="ndjson or csv"),
+    developer_id: Optional[List[str]] = Query(None, description="Developer ID filter (repeatable)"),
+    types: Optional[List[str]] = Query(
+        None, alias="type", description="Event type filter (repeatable)"
+    ),
+    source: Optional[List[str]] = Query(None, description="Code source filter (repeatable)"),
+    feature_name: Optional[List[str]] = Query(
+        None, description="Feature name filter (repeatable)"
+    ),
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+) -> StreamingResponse:
+    """
+    Stream raw stored events as NDJSON or CSV.
+
+    Events are read and encoded chunk by chunk while the response is sent,
+    so server memory stays constant however large the export is. Rows come
+    type after type, in storage order within a type.
+
+    Args:
+        fmt: Export format, ndjson or csv
+        developer_id: Developer IDs to export (default: all)
+        types: Event types to export (default: all)
+        source: Code sources to export (default: all)
+        feature_name: Feature names to export (default: all)
+        start_date: Optional start date filter (ISO format)
+        end_date: Optional end date filter (ISO format)
+
+    Returns:
+        Streaming response with the matching events
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid format '{fmt}', expected ndjson or csv"
+        )
+    try:
+        rows = iter_export_rows(
+            storage,
+            types=types,
+            developer_ids=developer_id,
+            sources=source,
+            feature_names=feature_name,
+            start_date=datetime.fromisoformat(start_date) if start_date else None,
+            end_date=datetime.fromisoformat(end_date) if end_date else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid export filter: {str(e)}")
+
+    return StreamingResponse(
+        stream_export(rows, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="events.{fmt}"'},
+    )
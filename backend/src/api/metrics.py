@@ -1,29 +1,27 @@
 """API endpoints for metrics retrieval."""
 
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
-from ..storage.json_storage import JSONStorage
-from ..services.aggregator import MetricsAggregator
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
+from ..dependencies import aggregator, response_cache
+from ..services.shared_aggregates import AggregatesUnavailable
 
 router = APIRouter(prefix="/api/metrics", tags=["metrics"])
 
-# Initialize storage and aggregator (in production, use dependency injection)
-storage = JSONStorage()
-aggregator = MetricsAggregator(storage)
-
 
 @router.get("/developer/{developer_id}", response_model=dict)
 async def get_developer_metrics(
     developer_id: str,
+    request: Request,
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
-) -> dict:
+) -> Response:
     """
     Get metrics for a specific developer.
 
     Args:
         developer_id: Developer identifier
+        request: Incoming request (cache key and content negotiation)
         start_date: Optional start date filter (ISO format)
         end_date: Optional end date filter (ISO format)
 
@@ -34,8 +32,11 @@ async def get_developer_metrics(
         start = datetime.fromisoformat(start_date) if start_date else None
         end = datetime.fromisoformat(end_date) if end_date else None
 
-        metrics = aggregator.get_developer_metrics(developer_id, start, end)
-        return metrics
+        return response_cache.respond(
+            request, lambda: aggregator.get_developer_metrics(developer_id, start, end)
+        )
+    except AggregatesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
     except Exception as e:
@@ -44,13 +45,15 @@ async def get_developer_metrics(
 
 @router.get("/team", response_model=dict)
 async def get_team_metrics(
+    request: Request,
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
-) -> dict:
+) -> Response:
     """
     Get aggregated metrics for the entire team.
 
     Args:
+        request: Incoming request (cache key and content negotiation)
         start_date: Optional start date filter (ISO format)
         end_date: Optional end date filter (ISO format)
 
@@ -61,8 +64,11 @@ async def get_team_metrics(
         start = datetime.fromisoformat(start_date) if start_date else None
         end = datetime.fromisoformat(end_date) if end_date else None
 
-        metrics = aggregator.get_team_metrics(start, end)
-        return metrics
+        return response_cache.respond(
+            request, lambda: aggregator.get_team_metrics(start, end)
+        )
+    except AggregatesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
     except Exception as e:
@@ -71,15 +77,17 @@ async def get_team_metrics(
 
 @router.get("/trends", response_model=dict)
 async def get_trends(
+    request: Request,
     developer_id: Optional[str] = Query(
         None, description="Optional developer ID filter"
     ),
     days: int = Query(30, ge=1, le=365, description="Number of days to look back"),
-) -> dict:
+) -> Response:
     """
     Get time-series trends for metrics.
 
     Args:
+        request: Incoming request (cache key and content negotiation)
         developer_id: Optional developer ID to filter
         days: Number of days to look back (1-365)
 
@@ -87,32 +95,93 @@ async def get_trends(
         Trend data
     """
     try:
-        trends = aggregator.get_trends(developer_id, days)
-        return trends
+        # The trend window slides with the clock: reuse a response within the minute
+        return response_cache.respond(
+            request,
+            lambda: aggregator.get_trends(developer_id, days),
+            extra=(datetime.now().replace(second=0, microsecond=0),),
+        )
+    except AggregatesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get trends: {str(e)}")
 
 
 @router.get("/features", response_model=dict)
 async def get_features_metrics(
+    request: Request,
     limit: int = Query(20, ge=1, le=100, description="Maximum number of features to return"),
-) -> dict:
+) -> Response:
     """
     Get metrics grouped by feature_name.
     
     Args:
+        request: Incoming request (cache key and content negotiation)
         limit: Maximum number of features to return
         
     Returns:
         Dictionary with features and their LOC counts
     """
     try:
-        features = aggregator.get_features_metrics(limit)
-        return features
+        return response_cache.respond(
+            request, lambda: aggregator.get_features_metrics(limit)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get features: {str(e)}")
 
 
+@router.get("/query", response_model=dict)
+async def query_metrics(
+    request: Request,
+    group_by: List[str] = Query(..., description="Dimension(s) to group by"),
+    measures: Optional[List[str]] = Query(
+        None, description="Measure(s) to return (default: lines, events)"
+    ),
+    filters: Optional[List[str]] = Query(
+        None, description="Equality filter(s) as dimension:value"
+    ),
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of rows"),
+) -> Response:
+    """
+    Run a generic group-by aggregation over event dimensions.
+
+    Args:
+        request: Incoming request (cache key and content negotiation)
+        group_by: Dimensions such as language, file_extension, feature_name
+        measures: Measures such as lines, events, ai_lines, ai_percentage
+        filters: Filters as dimension:value, repeatable (OR within a dimension)
+        start_date: Optional start date filter (ISO format)
+        end_date: Optional end date filter (ISO format)
+        limit: Maximum number of rows to return
+
+    Returns:
+        Grouped rows, largest groups first
+    """
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+
+        parsed_filters = {}
+        for item in filters or []:
+            dimension, sep, value = item.partition(":")
+            if not sep:
+                raise ValueError(f"Filter must be dimension:value, got '{item}'")
+            parsed_filters.setdefault(dimension, []).append(value)
+
+        return response_cache.respond(
+            request,
+            lambda: aggregator.query(group_by, measures, parsed_filters, start, end, limit),
+        )
+    except AggregatesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid query: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to run query: {str(e)}")
+
+
 @router.get("/health", response_model=dict)
 async def health_check() -> dict:
     """
@@ -0,0 +1,120 @@
+"""Mergeable partial aggregates served to a cluster coordinator."""
+
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+from ..dependencies import aggregator, storage
+from ..services import partials
+from ..services.shared_aggregates import AggregatesUnavailable
+from ..services.paging import DEFAULT_PAGE_SIZE, page_events
+
+router = APIRouter(prefix="/api/partials", tags=["partials"])
+
+
+@router.get("/team", response_model=dict)
+async def get_team_partial(
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+) -> dict:
+    """
+    Get this node's team LOC totals and distinct sketches.
+
+    Args:
+        start_date: Optional start date filter (ISO format)
+        end_date: Optional end date filter (ISO format)
+
+    Returns:
+        Team partial with base64-encoded sketches
+    """
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+
+        return partials.encode_team(aggregator.team_partial(start, end))
+    except AggregatesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get partial: {str(e)}")
+
+
+@router.get("/trends", response_model=dict)
+async def get_trends_partial(
+    start_date: str = Query(..., description="Start date (ISO format)"),
+    end_date: str = Query(..., description="End date (ISO format)"),
+    developer_id: Optional[str] = Query(
+        None, description="Optional developer ID filter"
+    ),
+) -> dict:
+    """
+    Get this node's daily LOC totals (and developer sketches for the team).
+
+    Args:
+        start_date: Start of the period (ISO format)
+        end_date: End of the period (ISO format)
+        developer_id: Optional developer ID to filter
+
+    Returns:
+        Trends partial with base64-encoded sketches
+    """
+    try:
+        start = datetime.fromisoformat(start_date)
+        end = datetime.fromisoformat(end_date)
+
+        return partials.encode_trends(
+            aggregator.trends_partial(developer_id, start, end)
+        )
+    except AggregatesUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get partial: {str(e)}")
+
+
+@router.get("/features", response_model=dict)
+async def get_features_partial() -> dict:
+    """
+    Get this node's per-feature LOC counts.
+
+    Returns:
+        Feature name -> feature entry
+    """
+    try:
+        return aggregator.features_partial()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get partial: {str(e)}")
+
+
+@router.get("/events", response_model=dict)
+async def get_events_partial(request: Request) -> dict:
+    """
+    Get a page of this node's events together with their page keys.
+
+    Takes the query parameters of ``GET /api/events``; the coordinator
+    merges node pages by key.
+
+    Returns:
+        Page with events, count, next_cursor and keys
+    """
+    params = request.query_params
+    try:
+        start_date, end_date = params.get("start_date"), params.get("end_date")
+        return page_events(
+            storage,
+            limit=int(params.get("limit", DEFAULT_PAGE_SIZE)),
+            cursor=params.get("cursor"),
+            order=params.get("order", "desc"),
+            types=params.getlist("type"),
+            developer_ids=params.getlist("developer_id"),
+            sources=params.getlist("source"),
+            languages=params.getlist("language"),
+            feature_names=params.getlist("feature_name"),
+            start_date=datetime.fromisoformat(start_date) if start_date else None,
+            end_date=datetime.fromisoformat(end_date) if end_date else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event query: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get partial: {str(e)}")
@@ -0,0 +1,257 @@
+"""
+Maintenance commands for the event store.
+
+Usage (from the backend directory, with the backend stopped):
+
+    python -m src.cli compact [--retention-days 90] [--dry-run]
+    python -m src.cli seal [--codec gzip]
+    python -m src.cli recompress --codec lzma [SEGMENT ...]
+    python -m src.cli import [--format jsonl] [--workers N] FILE [FILE ...]
+    python -m src.cli verify [--repair]
+
+Storage is configured by the same METRICS_* environment variables as the
+backend (METRICS_STORAGE, METRICS_DATA_DIR, METRICS_SHARDS, ...).
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from .services.importer import DEFAULT_CHUNK_SIZE, IMPORT_FORMATS
+from .storage.jsonl_storage import CODECS
+
+
+def _compact(args: argparse.Namespace) -> int:
+    """Fold old raw events into daily summary records."""
+    from . import dependencies
+    from .dependencies import snapshots, storage
+    from .services.compaction import Compactor
+
+    compactor = (
+        Compactor(storage, retention_days=args.retention_days)
+        if args.retention_days is not None
+        else dependencies.compactor
+    )
+    result = compactor.compact(dry_run=args.dry_run)
+    if not args.dry_run and result["rows_folded"] > result["summaries"]:
+        # Row positions changed; the next start rebuilds aggregates instead
+        snapshots.path.unlink(missing_ok=True)
+    storage.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+def _partitions(storage) -> List:
+    """JSONL storages of every partition, or exit if storage is not JSONL."""
+    partitions = getattr(storage, "shards", [storage])
+    if not all(hasattr(partition, "seal") for partition in partitions):
+        raise SystemExit("Sealed segments need METRICS_STORAGE=jsonl")
+    return partitions
+
+
+def _seal(args: argparse.Namespace) -> int:
+    """Seal the active JSONL files into (compressed) segments."""
+    from .dependencies import snapshots, storage
+    from .models.events import CodeType
+
+    sealed = []
+    for partition in _partitions(storage):
+        for event_type in CodeType:
+            path = partition.seal(event_type, args.codec)
+            if path is not None:
+                sealed.append({"segment": str(path), "bytes": path.stat().st_size})
+    if sealed:
+        # The snapshot no longer matches the files; the next start rebuilds aggregates
+        snapshots.path.unlink(missing_ok=True)
+    storage.close()
+    print(json.dumps({"codec": args.codec, "sealed": sealed}, indent=2))
+    return 0
+
+
+def _recompress(args: argparse.Namespace) -> int:
+    """Rewrite sealed segments with another codec."""
+    from .dependencies import snapshots, storage
+    from .models.events import CodeType
+
+    wanted = {path.resolve() for path in args.segments}
+    rewritten = []
+    for partition in _partitions(storage):
+        for event_type in CodeType:
+            for segment in partition.sealed_segments(event_type):
+                if wanted and segment.resolve() not in wanted:
+                    continue
+                before = segment.stat().st_size
+                path = partition.recompress(event_type, segment, args.codec)
+                if path != segment:
+                    rewritten.append(
+                        {
+                            "segment": str(path),
+                            "bytes_before": before,
+                            "bytes_after": path.stat().st_size,
+                        }
+                    )
+    if rewritten:
+        snapshots.path.unlink(missing_ok=True)
+    storage.close()
+    print(json.dumps({"codec": args.codec, "rewritten": rewritten}, indent=2))
+    return 0
+
+
+def _verify(args: argparse.Namespace) -> int:
+    """Check stored files for damaged blocks, optionally repairing them."""
+    from .dependencies import snapshots, storage
+
+    files = []
+    for partition in getattr(storage, "shards", [storage]):
+        files.extend(partition.verify(repair=args.repair))
+    damaged = sum(1 for entry in files if entry["damaged"])
+    if any(entry["repaired"] for entry in files):
+        # Row positions changed; the next start rebuilds aggregates instead
+        snapshots.path.unlink(missing_ok=True)
+    storage.close()
+    print(json.dumps({"damaged_files": damaged, "files": files}, indent=2))
+    return 1 if damaged and not args.repair else 0
+
+
+def _import(args: argparse.Namespace) -> int:
+    """Bulk-load historical events from files straight into storage."""
+    from .dependencies import aggregator, snapshots, storage
+    from .services.importer import BulkImporter, detect_format, read_records
+
+    try:
+        formats = [args.format or detect_format(path) for path in args.inputs]
+    except ValueError as e:
+        raise SystemExit(str(e))
+    importer = BulkImporter(
+        storage,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        aggregate=not args.no_snapshot,
+    )
+    if not args.no_snapshot:
+        importer.load_stored(snapshots.load())
+
+    results = []
+    for path, fmt in zip(args.inputs, formats):
+        last_report = time.monotonic()
+
+        def report(totals: Dict) -> None:
+            nonlocal last_report
+            if time.monotonic() - last_report >= 1.0:
+                last_report = time.monotonic()
+                print(
+                    f"{path}: {totals['imported']} imported, {totals['invalid']} invalid, "
+                    f"{totals['events_per_second']} events/s",
+                    file=sys.stderr,
+                )
+
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8", newline="") as f:
+            result = importer.run(read_records(f, fmt), fmt, report)
+        for number, message in result["errors"]:
+            print(f"{path}: record {number}: {message}", file=sys.stderr)
+        results.append({"file": str(path), "format": fmt, **result})
+
+    if args.no_snapshot:
+        # The snapshot no longer matches the files; the next start rebuilds aggregates
+        snapshots.path.unlink(missing_ok=True)
+    else:
+        # Aggregates of everything stored, so the backend starts without a rescan
+        aggregator.restore_state(importer.aggregates(), ())
+        snapshots.write(snapshots.capture())
+    storage.close()
+    print(json.dumps({"snapshot": not args.no_snapshot, "files": results}, indent=2))
+    return 1 if any(result["invalid"] for result in results) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Parse arguments and run a command."""
+    parser = argparse.ArgumentParser(description="AI LOC Tracker maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compact = commands.add_parser(
+        "compact", help="Fold raw events older than the retention horizon into summaries"
+    )
+    compact.add_argument(
+        "--retention-days",
+        type=int,
+        default=None,
+        help="Days of raw events to keep (default: METRICS_RETENTION_DAYS or 90)",
+    )
+    compact.add_argument(
+        "--dry-run", action="store_true", help="Report the outcome without rewriting files"
+    )
+    compact.set_defaults(func=_compact)
+
+    seal = commands.add_parser(
+        "seal", help="Seal the active JSONL files into read-only segments"
+    )
+    seal.add_argument(
+        "--codec",
+        choices=list(CODECS),
+        default=os.getenv("METRICS_SEGMENT_CODEC", "gzip"),
+        help="Segment compression (default: METRICS_SEGMENT_CODEC or gzip)",
+    )
+    seal.set_defaults(func=_seal)
+
+    recompress = commands.add_parser(
+        "recompress", help="Rewrite sealed JSONL segments with another codec"
+    )
+    recompress.add_argument("--codec", choices=list(CODECS), required=True)
+    recompress.add_argument(
+        "segments", nargs="*", type=Path, help="Segment files (default: all sealed segments)"
+    )
+    recompress.set_defaults(func=_recompress)
+
+    verify = commands.add_parser(
+        "verify", help="Check the checksums of stored event files"
+    )
+    verify.add_argument(
+        "--repair",
+        action="store_true",
+        help="Rewrite damaged files without their damaged blocks (kept in .damaged-* files)",
+    )
+    verify.set_defaults(func=_verify)
+
+    bulk_import = commands.add_parser(
+        "import", help="Bulk-load historical events from JSONL, JSON or CSV files"
+    )
+    bulk_import.add_argument(
+        "inputs", nargs="+", type=Path, help="Input files (optionally .gz-compressed)"
+    )
+    bulk_import.add_argument(
+        "--format",
+        choices=list(IMPORT_FORMATS),
+        default=None,
+        help="Input format (default: guessed from each file's suffix)",
+    )
+    bulk_import.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes validating and aggregating chunks, 0 for none "
+        "(default: CPU count)",
+    )
+    bulk_import.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Records per chunk (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    bulk_import.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Skip building aggregates; the backend rebuilds them on its next start",
+    )
+    bulk_import.set_defaults(func=_import)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
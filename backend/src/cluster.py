@@ -0,0 +1,82 @@
+"""
+Run a local cluster: N backend nodes plus a coordinator.
+
+Usage (from the backend directory):
+
+    python -m src.cluster --nodes 3 --port 8000 --data-dir /tmp/loc-cluster
+
+Node i listens on ``port + i`` (8001, 8002, ...) with its own data directory
+``<data-dir>/node-i``; the coordinator listens on ``port`` and routes to them.
+Stop a node (e.g. ``kill -STOP <pid>``) to watch team queries degrade to
+partial results after ``--node-timeout`` seconds.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+
+def _spawn(port: int, env: dict) -> subprocess.Popen:
+    """Start one uvicorn process serving the app."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port)],
+        env={**os.environ, **env},
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Start the cluster and wait until interrupted."""
+    parser = argparse.ArgumentParser(description="Run a local AI LOC Tracker cluster")
+    parser.add_argument("--nodes", type=int, default=3, help="Number of backend nodes")
+    parser.add_argument("--port", type=int, default=8000, help="Coordinator port")
+    parser.add_argument("--data-dir", type=Path, default=Path("cluster-data"))
+    parser.add_argument(
+        "--node-timeout", type=float, default=2.0, help="Per-node timeout (s)"
+    )
+    args = parser.parse_args(argv)
+
+    processes = []
+    node_urls = []
+    for i in range(1, args.nodes + 1):
+        port = args.port + i
+        node_urls.append(f"http://localhost:{port}")
+        processes.append(
+            _spawn(port, {"METRICS_DATA_DIR": str(args.data_dir / f"node-{i}")})
+        )
+    processes.append(
+        _spawn(
+            args.port,
+            {
+                "METRICS_DATA_DIR": str(args.data_dir / "coordinator"),
+                "METRICS_NODES": ",".join(node_urls),
+                "METRICS_NODE_TIMEOUT": str(args.node_timeout),
+            },
+        )
+    )
+    print(
+        f"[cluster] coordinator http://localhost:{args.port} -> {', '.join(node_urls)}",
+        file=sys.stderr,
+    )
+
+    # Treat SIGTERM like Ctrl-C so the nodes are stopped as well
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            if p.poll() is None:
+                p.send_signal(signal.SIGINT)
+        for p in processes:
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Shared storage and service instances used by the API routers."""
+
+import os
+from .storage.json_storage import JSONStorage
+from .storage.jsonl_storage import JSONLStorage
+from .storage.durability import DurabilityMode, create_durability_policy
+from .storage.sharded_storage import ShardedStorage
+from .services.aggregator import MetricsAggregator
+from .services.coalescer import EventCoalescer
+from .services.compaction import Compactor
+from .services.coordinator import ClusterCoordinator
+from .services.response_cache import ResponseCache
+from .services.shared_aggregates import create_shared_aggregates
+from .services.snapshot import create_snapshot_manager
+from .profiling import create_profiler
+
+STORAGE_BACKENDS = {
+    "json": JSONStorage,
+    "jsonl": JSONLStorage,
+}
+
+# METRICS_STORAGE selects the backend, METRICS_DATA_DIR overrides backend/logs
+_backend = os.getenv("METRICS_STORAGE", "json")
+if _backend not in STORAGE_BACKENDS:
+    raise ValueError(f"Unknown METRICS_STORAGE '{_backend}', expected json or jsonl")
+
+# JSONL files growing past METRICS_SEGMENT_BYTES (0: never) are sealed into
+# read-only segments compressed with METRICS_SEGMENT_CODEC
+_storage_options = (
+    {
+        "segment_bytes": int(os.getenv("METRICS_SEGMENT_BYTES", "0")),
+        "segment_codec": os.getenv("METRICS_SEGMENT_CODEC", "gzip"),
+    }
+    if _backend == "jsonl"
+    else {}
+)
+
+# One storage instance so ingest-side sketches and indexes see every event
+# (in production, use dependency injection)
+# METRICS_SHARDS > 1 splits storage by developer into that many shards
+_shards = int(os.getenv("METRICS_SHARDS", "1"))
+if _shards > 1:
+    storage = ShardedStorage(
+        os.getenv("METRICS_DATA_DIR") or None,
+        shards=_shards,
+        storage_cls=STORAGE_BACKENDS[_backend],
+        durability=create_durability_policy(),
+        executor=os.getenv("METRICS_SHARD_EXECUTOR", "thread"),
+        **_storage_options,
+    )
+else:
+    storage = STORAGE_BACKENDS[_backend](
+        os.getenv("METRICS_DATA_DIR") or None,
+        durability=create_durability_policy(),
+        **_storage_options,
+    )
+
+# METRICS_SHARED_AGGREGATES=1 keeps sketches and rollup in shared memory for all
+# uvicorn workers serving the data directory; one elected worker folds in the
+# rows every worker stored, every METRICS_SHARED_SYNC_INTERVAL seconds
+shared_aggregates = None
+if os.getenv("METRICS_SHARED_AGGREGATES", "0") == "1":
+    if _backend != "jsonl":
+        raise ValueError("METRICS_SHARED_AGGREGATES needs METRICS_STORAGE=jsonl")
+    if _storage_options["segment_bytes"]:
+        # Workers would seal the files other workers append to
+        raise ValueError("METRICS_SHARED_AGGREGATES needs METRICS_SEGMENT_BYTES=0")
+    shared_aggregates = create_shared_aggregates(storage.data_dir)
+SHARED_SYNC_INTERVAL = float(os.getenv("METRICS_SHARED_SYNC_INTERVAL", "1"))
+aggregator = MetricsAggregator(storage, shared_aggregates)
+snapshots = create_snapshot_manager(aggregator)
+
+# Serialized metrics responses: METRICS_RESPONSE_CACHE_SIZE entries (0 disables),
+# served until new events arrive or up to METRICS_RESPONSE_MAX_STALENESS seconds after.
+# The storage signature catches events written by other workers or processes.
+response_cache = ResponseCache(
+    lambda: (aggregator.version, storage.signature()),
+    max_entries=int(os.getenv("METRICS_RESPONSE_CACHE_SIZE", "256")),
+    max_staleness=float(os.getenv("METRICS_RESPONSE_MAX_STALENESS", "0")),
+)
+
+# Events of METRICS_COALESCE_SOURCES (comma-separated) sharing a file, type and
+# source within METRICS_COALESCE_WINDOW seconds are stored as one record (0 disables)
+coalescer = EventCoalescer(
+    storage,
+    window=float(os.getenv("METRICS_COALESCE_WINDOW", "0")),
+    sources=[
+        source.strip()
+        for source in os.getenv("METRICS_COALESCE_SOURCES", "manual").split(",")
+        if source.strip()
+    ],
+)
+if coalescer.enabled and storage.durability.mode is not DurabilityMode.NONE:
+    # Held-back events are acknowledged but only kept in memory until saved
+    raise ValueError("METRICS_COALESCE_WINDOW needs METRICS_DURABILITY=none")
+
+# Seconds between aggregate snapshots; 0 disables snapshots
+SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "300"))
+profiler = create_profiler(storage.data_dir)
+
+# Raw events older than METRICS_RETENTION_DAYS are folded into daily summaries,
+# every METRICS_COMPACT_INTERVAL seconds (0 disables background compaction)
+compactor = Compactor(storage, retention_days=int(os.getenv("METRICS_RETENTION_DAYS", "90")))
+COMPACT_INTERVAL = float(os.getenv("METRICS_COMPACT_INTERVAL", "0"))
+if shared_aggregates is not None and COMPACT_INTERVAL > 0:
+    # Workers would rewrite the files other workers append to; compact offline
+    raise ValueError("METRICS_SHARED_AGGREGATES needs METRICS_COMPACT_INTERVAL=0")
+
+# METRICS_NODES (comma-separated node URLs) runs this app as a coordinator
+_nodes = [node.strip() for node in os.getenv("METRICS_NODES", "").split(",") if node.strip()]
+coordinator = (
+    ClusterCoordinator(
+        _nodes, aggregator, timeout=float(os.getenv("METRICS_NODE_TIMEOUT", "2.0"))
+    )
+    if _nodes
+    else None
+)
@@ -0,0 +1,321 @@
+"""In-process metrics with Prometheus text exposition."""
+
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+# Latency buckets in seconds (0.5 ms .. 10 s)
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Size buckets in bytes (256 B .. 256 MiB)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(11))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        Initialize metric.
+
+        Args:
+            name: Metric name
+            documentation: HELP text
+            labelnames: Names of the labels identifying each series
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Series key for a label set."""
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Render this metric in Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: Tuple[str, ...], value) -> List[str]:
+        """Render one series."""
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for a label set."""
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge for a label set."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the gauge for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """Decrease the gauge for a label set."""
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        """
+        Initialize histogram.
+
+        Args:
+            name: Metric name
+            documentation: HELP text
+            labelnames: Names of the labels identifying each series
+            buckets: Ascending bucket upper bounds
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation for a label set."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts + overflow, then sum
+                state = [[0] * (len(self.buckets) + 1), 0.0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of a block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key: Tuple[str, ...], value) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labelnames, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric to the registry and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format."""
+        _update_cache_ratios()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template.",
+        ("method", "route", "status"),
+    )
+)
+REQUESTS_IN_PROGRESS = REGISTRY.register(
+    Gauge("http_requests_in_progress", "Requests queued or being handled (queue depth).")
+)
+
+# Storage
+SAVE_LATENCY = REGISTRY.register(
+    Histogram(
+        "storage_save_seconds",
+        "Latency of one storage write (event or batch).",
+        ("backend", "type"),
+    )
+)
+SAVE_BYTES = REGISTRY.register(
+    Histogram(
+        "storage_save_bytes",
+        "Bytes written per storage write.",
+        ("backend", "type"),
+        buckets=SIZE_BUCKETS,
+    )
+)
+FSYNC_LATENCY = REGISTRY.register(
+    Histogram("storage_fsync_seconds", "fsync latency by durability mode.", ("mode",))
+)
+ROWS_SCANNED = REGISTRY.register(
+    Counter("storage_rows_scanned_total", "Rows visited by load_events.", ("backend", "type"))
+)
+ROWS_RETURNED = REGISTRY.register(
+    Counter("storage_rows_returned_total", "Rows returned by load_events.", ("backend", "type"))
+)
+DAMAGED_BLOCKS = REGISTRY.register(
+    Counter(
+        "storage_damaged_blocks_total",
+        "Damaged blocks of stored events skipped while reading.",
+        ("backend", "type"),
+    )
+)
+PARSE_LATENCY = REGISTRY.register(
+    Histogram("storage_parse_seconds", "Time spent decoding stored events.", ("backend", "type"))
+)
+CACHE_HITS = REGISTRY.register(
+    Counter("cache_hits_total", "Cache lookups served from memory.", ("cache",))
+)
+CACHE_MISSES = REGISTRY.register(
+    Counter("cache_misses_total", "Cache lookups that had to load data.", ("cache",))
+)
+CACHE_HIT_RATIO = REGISTRY.register(
+    Gauge("cache_hit_ratio", "Hits / lookups since start.", ("cache",))
+)
+
+# Snapshots
+SNAPSHOT_SECONDS = REGISTRY.register(
+    Histogram("snapshot_seconds", "Snapshot capture, write and restore time.", ("phase",))
+)
+SNAPSHOT_BYTES = REGISTRY.register(
+    Gauge("snapshot_bytes", "Size of the last written snapshot file.")
+)
+SNAPSHOT_REPLAYED = REGISTRY.register(
+    Gauge("snapshot_replayed_events", "Events replayed after the snapshot at startup.")
+)
+
+# Compaction
+COMPACTION_SECONDS = REGISTRY.register(
+    Histogram("compaction_seconds", "Duration of compaction runs.")
+)
+COMPACTED_EVENTS = REGISTRY.register(
+    Counter("compaction_events_total", "Stored rows removed by folding them into summary records.")
+)
+
+# Ingest coalescing
+COALESCED_EVENTS = REGISTRY.register(
+    Counter("coalesced_events_total", "Events merged into another event's stored record.")
+)
+COALESCE_PENDING = REGISTRY.register(
+    Gauge("coalesce_pending_records", "Coalesced records held back, not yet stored.")
+)
+
+# Event loop
+EVENT_LOOP_LAG = REGISTRY.register(
+    Histogram("event_loop_lag_seconds", "Delay of event-loop wakeups beyond schedule.")
+)
+
+
+def _update_cache_ratios() -> None:
+    """Refresh hit-ratio gauges from hit and miss counters."""
+    with CACHE_HITS._lock:
+        caches = {key[0] for key in CACHE_HITS._values}
+    with CACHE_MISSES._lock:
+        caches |= {key[0] for key in CACHE_MISSES._values}
+    for cache in caches:
+        hits = CACHE_HITS.value(cache=cache)
+        lookups = hits + CACHE_MISSES.value(cache=cache)
+        CACHE_HIT_RATIO.set(round(hits / lookups, 4) if lookups else 0.0, cache=cache)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    Count a cache lookup.
+
+    Args:
+        cache: Cache name
+        hit: Whether the lookup was served from memory
+    """
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache=cache)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    Measure event-loop lag until cancelled.
+
+    Sleeps for `interval` and records how much later than scheduled the loop
+    woke up; sustained lag means handlers are blocking the loop.
+
+    Args:
+        interval: Sampling interval in seconds
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
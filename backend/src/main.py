@@ -1,13 +1,88 @@
 """FastAPI main application."""
 
-from fastapi import FastAPI
+import asyncio
+import cProfile
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .api import events, metrics
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from .api import admin, events, metrics, partials
+from .dependencies import (
+    COMPACT_INTERVAL,
+    SHARED_SYNC_INTERVAL,
+    SNAPSHOT_INTERVAL,
+    aggregator,
+    coalescer,
+    compactor,
+    coordinator,
+    profiler,
+    response_cache,
+    snapshots,
+    storage,
+)
+from .instrumentation import (
+    REGISTRY,
+    REQUEST_LATENCY,
+    REQUESTS_IN_PROGRESS,
+    monitor_event_loop_lag,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Restore aggregates and run background tasks for the lifetime of the app."""
+    tasks = [asyncio.create_task(monitor_event_loop_lag())]
+    # A coordinator keeps no data of its own
+    shared = aggregator.shared is not None and coordinator is None
+    if shared:
+        # The elected worker keeps the shared aggregates current (rebuilt from
+        # the files when elected, so snapshots are not used)
+        tasks.append(asyncio.create_task(aggregator.sync_periodically(SHARED_SYNC_INTERVAL)))
+    snapshots_enabled = SNAPSHOT_INTERVAL > 0 and coordinator is None and not shared
+    if snapshots_enabled:
+        # Load the last snapshot and replay only the events stored after it
+        await run_in_threadpool(snapshots.restore)
+        tasks.append(asyncio.create_task(snapshots.run_periodically(SNAPSHOT_INTERVAL)))
+    if coalescer.enabled and coordinator is None:
+        tasks.append(asyncio.create_task(coalescer.run_periodically()))
+    if COMPACT_INTERVAL > 0 and coordinator is None:
+
+        async def after_compaction():
+            # Responses were built from the files compaction just rewrote
+            response_cache.clear()
+            if snapshots_enabled:
+                # Checkpoint right away so the snapshot matches the new files
+                await snapshots.checkpoint(force=True)
+
+        tasks.append(
+            asyncio.create_task(
+                compactor.run_periodically(COMPACT_INTERVAL, after_compaction)
+            )
+        )
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Save held-back events before the final checkpoint covers them
+        await run_in_threadpool(coalescer.close)
+        if snapshots_enabled:
+            await snapshots.checkpoint()
+        # Sync writes still inside the durability loss window
+        await run_in_threadpool(storage.close)
+        if shared:
+            await run_in_threadpool(aggregator.close)
+        if coordinator is not None:
+            await coordinator.close()
+
 
 app = FastAPI(
     title="AI LOC Tracker API",
     description="Backend API for tracking AI-augmented engineering metrics and Lines of Code (LOC)",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware for frontend integration
@@ -19,9 +94,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record per-route latency and in-flight requests."""
+    REQUESTS_IN_PROGRESS.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_PROGRESS.dec()
+        # Label by route template so path parameters don't explode cardinality
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Profile the request when asked via X-Profile or sampled by the admin toggle."""
+    if not profiler.acquire(request.url.path, request.headers.get(profiler.HEADER)):
+        return await call_next(request)
+
+    request_profiler = cProfile.Profile()
+    request_profiler.enable()
+    try:
+        response = await call_next(request)
+    finally:
+        request_profiler.disable()
+        profile_id = await run_in_threadpool(
+            profiler.finish, request_profiler, request.method, request.url.path
+        )
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
 # Include routers
-app.include_router(events.router)
-app.include_router(metrics.router)
+if coordinator is not None:
+    # Coordinator mode: the nodes own the data
+    from .api import coordinator as coordinator_api
+
+    app.include_router(coordinator_api.router)
+else:
+    app.include_router(events.router)
+    app.include_router(metrics.router)
+    app.include_router(partials.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
@@ -34,8 +159,15 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Prometheus text-format instrumentation."""
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
@@ -0,0 +1,16 @@
+"""Pydantic models for admin endpoints."""
+
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class ProfilingSettings(BaseModel):
+    """Admin toggle for sampled request profiling."""
+
+    enabled: bool = Field(description="Whether sampled profiling is on")
+    sample_rate: float = Field(
+        default=0.01, ge=0, le=1, description="Fraction of requests to profile"
+    )
+    route_prefix: Optional[str] = Field(
+        default=None, description="Only profile paths starting with this prefix"
+    )
@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Union
+from typing import List, Optional, Union
 from pydantic import BaseModel, Field
 
 
@@ -82,3 +82,25 @@ class DocumentationEvent(BaseModel):
 
 # Union type for all events
 Event = Union[CodeInsertionEvent, TestGenerationEvent, DocumentationEvent]
+
+# Model for each event type
+EVENT_MODELS = {
+    CodeType.CODE: CodeInsertionEvent,
+    CodeType.TEST: TestGenerationEvent,
+    CodeType.DOCUMENTATION: DocumentationEvent,
+}
+
+
+class EventBatch(BaseModel):
+    """Several events sent in one request."""
+
+    batch_id: Optional[str] = Field(
+        default=None,
+        max_length=128,
+        description="Client-chosen batch ID; a recently saved ID is not saved again",
+    )
+    events: List[dict] = Field(
+        min_length=1,
+        max_length=1000,
+        description="Events, each validated by the model of its `type` (default: code)",
+    )
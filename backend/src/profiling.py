@@ -0,0 +1,201 @@
+"""Opt-in per-request profiling with a bounded on-disk ring of profiles."""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and stores their profiles.
+
+    A request is profiled when it carries ``X-Profile: <admin token>`` or when
+    the admin toggle is on and the request is sampled. Either way, at most
+    ``max_per_minute`` profiles are taken and only one request is profiled at
+    a time, so enabling it in production has a bounded cost. Each profile is
+    written as ``<id>.prof`` (pstats) plus ``<id>.txt`` (top-N hotspots); only
+    the newest ``keep`` profiles are kept on disk.
+
+    cProfile records everything running on the event-loop thread while the
+    request is in flight, so concurrent requests can show up in a profile.
+    """
+
+    HEADER = "x-profile"
+
+    def __init__(
+        self,
+        profile_dir: Path,
+        admin_token: Optional[str] = None,
+        max_per_minute: int = 6,
+        keep: int = 20,
+        top_n: int = 25,
+    ):
+        """
+        Initialize profiler.
+
+        Args:
+            profile_dir: Directory for the profile ring
+            admin_token: Secret required in the X-Profile header (None disables it)
+            max_per_minute: Upper bound on profiles taken per minute
+            keep: Number of profiles kept on disk
+            top_n: Number of functions listed in each hotspot summary
+        """
+        self.profile_dir = Path(profile_dir)
+        self.admin_token = admin_token
+        self.max_per_minute = max_per_minute
+        self.keep = keep
+        self.top_n = top_n
+
+        # Admin toggle
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.route_prefix: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._busy = False
+        self._recent: List[float] = []
+
+    def settings(self) -> Dict:
+        """Current toggle settings and limits."""
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "route_prefix": self.route_prefix,
+            "max_per_minute": self.max_per_minute,
+            "keep": self.keep,
+            "top_n": self.top_n,
+        }
+
+    def configure(
+        self,
+        enabled: bool,
+        sample_rate: float,
+        route_prefix: Optional[str] = None,
+    ) -> None:
+        """
+        Update the admin toggle.
+
+        Args:
+            enabled: Whether sampled profiling is on
+            sample_rate: Fraction of matching requests to profile (0-1)
+            route_prefix: Only sample paths starting with this prefix
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.route_prefix = route_prefix
+
+    def acquire(self, path: str, header_value: Optional[str]) -> bool:
+        """
+        Decide whether to profile a request and reserve the profiler if so.
+
+        Args:
+            path: Request path
+            header_value: Value of the X-Profile header, if any
+
+        Returns:
+            True if the caller must profile the request and then call finish()
+        """
+        requested = bool(
+            self.admin_token
+            and header_value
+            # As bytes: compare_digest() rejects str with non-ASCII characters
+            and hmac.compare_digest(
+                header_value.encode("utf-8"), self.admin_token.encode("utf-8")
+            )
+        )
+        sampled = (
+            self.enabled
+            and (not self.route_prefix or path.startswith(self.route_prefix))
+            and random.random() < self.sample_rate
+        )
+        if not (requested or sampled):
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if now - t < 60]
+            if self._busy or len(self._recent) >= self.max_per_minute:
+                return False
+            self._busy = True
+            self._recent.append(now)
+            return True
+
+    def finish(self, profiler: cProfile.Profile, method: str, path: str) -> str:
+        """
+        Write a profile and its hotspot summary, then release the profiler.
+
+        Args:
+            profiler: Stopped profiler
+            method: HTTP method
+            path: Request path
+
+        Returns:
+            Profile id (file name stem)
+        """
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+            profile_id = (
+                f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{method.lower()}-{slug}"
+            )
+
+            profiler.dump_stats(str(self.profile_dir / f"{profile_id}.prof"))
+
+            summary = io.StringIO()
+            summary.write(f"{method} {path}\n\n")
+            stats = pstats.Stats(profiler, stream=summary)
+            stats.sort_stats("cumulative").print_stats(self.top_n)
+            (self.profile_dir / f"{profile_id}.txt").write_text(
+                summary.getvalue(), encoding="utf-8"
+            )
+
+            self._trim()
+            return profile_id
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def list_profiles(self) -> List[str]:
+        """Ids of stored profiles, newest first."""
+        if not self.profile_dir.exists():
+            return []
+        return sorted((p.stem for p in self.profile_dir.glob("*.prof")), reverse=True)
+
+    def _trim(self) -> None:
+        """Delete the oldest profiles beyond the ring size."""
+        for profile_id in self.list_profiles()[self.keep:]:
+            for suffix in (".prof", ".txt"):
+                try:
+                    (self.profile_dir / f"{profile_id}{suffix}").unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def create_profiler(data_dir: Path) -> RequestProfiler:
+    """
+    Create the request profiler from environment settings.
+
+    METRICS_ADMIN_TOKEN enables header-triggered profiling and the admin API,
+    METRICS_PROFILE_MAX_PER_MINUTE and METRICS_PROFILE_KEEP bound its cost.
+
+    Args:
+        data_dir: Storage directory; profiles go to its ``profiles`` subdirectory
+
+    Returns:
+        Configured profiler
+    """
+    return RequestProfiler(
+        Path(data_dir) / "profiles",
+        admin_token=os.getenv("METRICS_ADMIN_TOKEN") or None,
+        max_per_minute=int(os.getenv("METRICS_PROFILE_MAX_PER_MINUTE", "6")),
+        keep=int(os.getenv("METRICS_PROFILE_KEEP", "20")),
+    )
@@ -1,25 +1,71 @@
 """Metrics aggregation service."""
 
-from datetime import datetime
-from typing import Dict, List, Optional
+import asyncio
+import logging
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from ..models.events import CodeType
 from ..storage.json_storage import JSONStorage
 from .calculator import MetricsCalculator
+from .distinct import DistinctTracker, weekly_counts
+from . import partials
+from .query import QueryEngine
+from .rollup import DailyRollup, rollup_key
+from .shared_aggregates import AggregatesUnavailable, SharedAggregates
+
+logger = logging.getLogger(__name__)
 
 
 class MetricsAggregator:
     """Aggregate metrics from storage."""
 
-    def __init__(self, storage: JSONStorage):
+    def __init__(self, storage: JSONStorage, shared: Optional[SharedAggregates] = None):
         """
         Initialize aggregator with storage.
 
         Args:
             storage: JSONL storage instance
+            shared: Sketches and rollup shared by the worker processes of the
+                storage (None keeps them in this process only)
         """
         self.storage = storage
         self.calculator = MetricsCalculator(storage)
 
+        # Ingest-side sketches and rollups, warmed from history lazily. With
+        # shared aggregates every worker reads those instead, and these are
+        # only kept by the worker elected to update them (see sync_shared()).
+        self.distinct = DistinctTracker()
+        self.rollup = DailyRollup()
+        self.shared = shared
+        self.query_engine = QueryEngine(storage, self._rollup_source(self.rollup))
+        self._warm = False
+        # storage.external_changes when the aggregates were built; a higher
+        # count means the storage holds rows of another process they lack
+        self._external_changes = 0
+        # Incremented whenever stored data changes (keys cached responses)
+        self._changes = 0
+        # Storage position the shared aggregates cover (writer only)
+        self._shared_position: Optional[Dict] = None
+        self._sync_lock = threading.Lock()
+        storage.subscribe(self._on_event_saved)
+
+    @property
+    def version(self) -> int:
+        """Number that changes whenever stored data or aggregates change."""
+        if self.shared is None:
+            return self._changes
+        return self._changes + self.shared.sequence
+
+    @property
+    def sketches(self):
+        """Distinct sketches answering reads: the shared ones if any, else this process's."""
+        return self.distinct if self.shared is None else self.shared
+
+    def _rollup_source(self, rollup: DailyRollup):
+        """Rollup answering queries: the shared one if any, else `rollup`."""
+        return rollup if self.shared is None else self.shared
+
     def get_developer_metrics(
         self,
         developer_id: str,
@@ -99,41 +145,94 @@ class MetricsAggregator:
         Returns:
             Dictionary with team metrics
         """
-        # Load all events
-        events = self.storage.get_all_events(None, start_date, end_date)
+        return self.build_team_metrics(
+            self.team_partial(start_date, end_date), start_date, end_date
+        )
+
+    def team_partial(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict:
+        """
+        Compute mergeable team aggregates for this storage.
 
-        # Get unique developer IDs
-        developer_ids = set(
-            e.get("developer_id") for e in events if e.get("developer_id")
+        Args:
+            start_date: Start date for filtering
+            end_date: End date for filtering
+
+        Returns:
+            LOC totals for the team and per developer, plus distinct sketches
+        """
+        # Mergeable LOC totals per developer, computed per shard
+        partial = partials.merge_team(
+            self._map_partials(partials.team_partial, start_date, end_date)
         )
 
+        self._ensure_warm()
+        start_day = start_date.date() if start_date else None
+        end_day = end_date.date() if end_date else None
+        partial["distinct"] = {
+            dimension: self.sketches.merged(dimension, start_day, end_day)
+            for dimension in DistinctTracker.DIMENSIONS
+        }
+        return partial
+
+    def build_team_metrics(
+        self,
+        partial: Dict,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict:
+        """
+        Build the team metrics response from (merged) team partials.
+
+        Args:
+            partial: Output of team_partial(), possibly merged across nodes
+            start_date: Start date of the period
+            end_date: End date of the period
+
+        Returns:
+            Dictionary with team metrics
+        """
+        developer_ids = set(partial["developers"])
+
         # Calculate metrics for each developer
         leaderboard = []
-        for dev_id in developer_ids:
-            dev_metrics = self.get_developer_metrics(dev_id, start_date, end_date)
+        for dev_id, dev_totals in partial["developers"].items():
+            code_metrics = self._metrics_from_totals(dev_totals, CodeType.CODE)
+            test_metrics = self._metrics_from_totals(dev_totals, CodeType.TEST)
+            doc_metrics = self._metrics_from_totals(dev_totals, CodeType.DOCUMENTATION)
             leaderboard.append(
                 {
                     "developer_id": dev_id,
-                    "overall_score": dev_metrics["overall_score"],
-                    "ai_loc_percentage": dev_metrics["code_metrics"]["ai_percentage"],
-                    "ai_test_percentage": dev_metrics["test_metrics"]["ai_percentage"],
-                    "ai_doc_percentage": dev_metrics["documentation_metrics"][
-                        "ai_percentage"
-                    ],
-                    "total_loc": dev_metrics["code_metrics"]["total_lines"],
+                    "overall_score": self._score_metrics(
+                        code_metrics, test_metrics, doc_metrics
+                    ),
+                    "ai_loc_percentage": code_metrics["ai_percentage"],
+                    "ai_test_percentage": test_metrics["ai_percentage"],
+                    "ai_doc_percentage": doc_metrics["ai_percentage"],
+                    "total_loc": code_metrics["total_lines"],
                 }
             )
 
-        # Sort by overall score (descending)
-        leaderboard.sort(key=lambda x: x["overall_score"], reverse=True)
+        # Sort by overall score (descending); ties by developer, so the order
+        # does not depend on where events are stored (e.g. after compaction)
+        leaderboard.sort(key=lambda x: (-x["overall_score"], x["developer_id"]))
 
         # Calculate team aggregates
-        team_code_metrics = self.calculator.calculate_loc_metrics(events, CodeType.CODE)
-        team_test_metrics = self.calculator.calculate_loc_metrics(events, CodeType.TEST)
-        team_doc_metrics = self.calculator.calculate_loc_metrics(
-            events, CodeType.DOCUMENTATION
+        team_code_metrics = self._metrics_from_totals(partial["team"], CodeType.CODE)
+        team_test_metrics = self._metrics_from_totals(partial["team"], CodeType.TEST)
+        team_doc_metrics = self._metrics_from_totals(
+            partial["team"], CodeType.DOCUMENTATION
         )
 
+        distinct = {
+            dimension: sketch.count()
+            for dimension, sketch in partial["distinct"].items()
+        }
+        distinct["relative_error"] = round(self.sketches.relative_error, 4)
+
         return {
             "period": {
                 "start": start_date.isoformat() if start_date else None,
@@ -146,6 +245,7 @@ class MetricsAggregator:
             },
             "leaderboard": leaderboard,
             "total_developers": len(developer_ids),
+            "distinct": distinct,
         }
 
     def get_trends(
@@ -163,50 +263,131 @@ class MetricsAggregator:
         Returns:
             Dictionary with trend data
         """
+        start_date, end_date = self.trend_period(days)
+        return self.build_trends(
+            self.trends_partial(developer_id, start_date, end_date),
+            developer_id,
+            days,
+            start_date,
+            end_date,
+        )
+
+    @staticmethod
+    def trend_period(days: int) -> Tuple[datetime, datetime]:
+        """
+        Period covered by trends over the last `days` days.
+
+        Args:
+            days: Number of days to look back
+
+        Returns:
+            Tuple of (start_date, end_date)
+        """
         end_date = datetime.now()
         start_date = datetime.fromtimestamp(
             end_date.timestamp() - (days * 24 * 60 * 60)
         )
+        return start_date, end_date
 
-        # Load events
-        events = self.storage.get_all_events(developer_id, start_date, end_date)
+    def trends_partial(
+        self,
+        developer_id: Optional[str],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict:
+        """
+        Compute mergeable trend aggregates for this storage.
 
-        # Group by date
-        daily_metrics = {}
-        for event in events:
-            event_date = datetime.fromisoformat(event["timestamp"]).date()
-            if event_date not in daily_metrics:
-                daily_metrics[event_date] = []
-            daily_metrics[event_date].append(event)
+        Args:
+            developer_id: Optional developer ID to filter
+            start_date: Start of the period
+            end_date: End of the period
 
-        # Calculate metrics for each day
-        trends = []
-        for date, day_events in sorted(daily_metrics.items()):
-            code_metrics = self.calculator.calculate_loc_metrics(
-                day_events, CodeType.CODE
-            )
-            test_metrics = self.calculator.calculate_loc_metrics(
-                day_events, CodeType.TEST
-            )
-            doc_metrics = self.calculator.calculate_loc_metrics(
-                day_events, CodeType.DOCUMENTATION
+        Returns:
+            LOC totals per day, plus per-day developer sketches for the team
+        """
+        # Mergeable LOC totals per day, computed per shard
+        partial = {
+            "days": partials.merge_daily(
+                self._map_partials(
+                    partials.daily_partial,
+                    developer_id,
+                    start_date,
+                    end_date,
+                    developer_id=developer_id,
+                )
             )
+        }
+
+        # Active developer counts only make sense for team-wide trends
+        if developer_id is None:
+            self._ensure_warm()
+            partial["active_developers"] = {
+                day.isoformat(): sketch
+                for day, sketch in self.sketches.day_sketches(
+                    "developers", start_date.date(), end_date.date()
+                ).items()
+            }
+        return partial
+
+    def build_trends(
+        self,
+        partial: Dict,
+        developer_id: Optional[str],
+        days: int,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict:
+        """
+        Build the trends response from (merged) trend partials.
+
+        Args:
+            partial: Output of trends_partial(), possibly merged across nodes
+            developer_id: Developer the trends were filtered to, if any
+            days: Number of days looked back
+            start_date: Start of the period
+            end_date: End of the period
 
+        Returns:
+            Dictionary with trend data
+        """
+        # Calculate metrics for each day
+        trends = []
+        for day, totals in sorted(partial["days"].items()):
             trends.append(
                 {
-                    "date": date.isoformat(),
-                    "code": code_metrics,
-                    "tests": test_metrics,
-                    "documentation": doc_metrics,
+                    "date": day,
+                    "code": self._metrics_from_totals(totals, CodeType.CODE),
+                    "tests": self._metrics_from_totals(totals, CodeType.TEST),
+                    "documentation": self._metrics_from_totals(
+                        totals, CodeType.DOCUMENTATION
+                    ),
                 }
             )
 
-        return {
+        result = {
             "developer_id": developer_id,
             "period_days": days,
             "trends": trends,
         }
 
+        if "active_developers" in partial:
+            sketches = {
+                date.fromisoformat(day): sketch
+                for day, sketch in partial["active_developers"].items()
+            }
+            for trend in trends:
+                sketch = sketches.get(date.fromisoformat(trend["date"]))
+                trend["active_developers"] = sketch.count() if sketch else 0
+            result["weekly_active_developers"] = weekly_counts(
+                sketches, start_date.date(), end_date.date(), self.sketches.precision
+            )
+            result["distinct_relative_error"] = round(
+                self.sketches.relative_error, 4
+            )
+
+        return result
+
     def get_features_metrics(
         self,
         limit: int = 20,
@@ -220,48 +401,32 @@ class MetricsAggregator:
         Returns:
             Dictionary with features and their LOC counts
         """
-        # Load all events
-        events = self.storage.get_all_events()
-        
-        # Group by feature_name from metadata
-        features = {}
-        for event in events:
-            metadata = event.get("metadata") or {}
-            feature_name = metadata.get("feature_name") if isinstance(metadata, dict) else "unknown"
-            if not feature_name:
-                feature_name = "unknown"
-            
-            if feature_name not in features:
-                features[feature_name] = {
-                    "feature_name": feature_name,
-                    "total_loc": 0,
-                    "code_loc": 0,
-                    "test_loc": 0,
-                    "doc_loc": 0,
-                    "event_count": 0,
-                    "last_updated": None,
-                }
-            
-            features[feature_name]["total_loc"] += event.get("lines", 0)
-            features[feature_name]["event_count"] += 1
-            
-            # Track by type
-            event_type = event.get("type", "code")
-            if event_type == "code":
-                features[feature_name]["code_loc"] += event.get("lines", 0)
-            elif event_type == "test":
-                features[feature_name]["test_loc"] += event.get("lines", 0)
-            elif event_type == "documentation":
-                features[feature_name]["doc_loc"] += event.get("lines", 0)
-            
-            # Track last updated timestamp
-            event_timestamp = event.get("timestamp", "")
-            if event_timestamp:
-                if features[feature_name]["last_updated"] is None or event_timestamp > features[feature_name]["last_updated"]:
-                    features[feature_name]["last_updated"] = event_timestamp
-        
-        # Convert to list and sort by last_updated (most recent first)
-        features_list = list(features.values())
+        return self.build_features_metrics(self.features_partial(), limit)
+
+    def features_partial(self) -> Dict[str, Dict]:
+        """
+        Compute mergeable per-feature aggregates for this storage.
+
+        Returns:
+            Feature name -> feature entry
+        """
+        # Per-feature counts, computed per shard and merged
+        return partials.merge_features(self._map_partials(partials.feature_partial))
+
+    def build_features_metrics(self, partial: Dict[str, Dict], limit: int = 20) -> Dict:
+        """
+        Build the features response from (merged) feature partials.
+
+        Args:
+            partial: Output of features_partial(), possibly merged across nodes
+            limit: Maximum number of features to return
+
+        Returns:
+            Dictionary with features and their LOC counts
+        """
+        features_list = list(partial.values())
+
+        # Sort by last_updated (most recent first)
         features_list.sort(
             key=lambda x: x["last_updated"] if x["last_updated"] else "",
             reverse=True
@@ -272,10 +437,251 @@ class MetricsAggregator:
         
         return {
             "features": features_list,
-            "total_features": len(features),
+            "total_features": len(partial),
             "showing": len(features_list),
         }
     
+    def query(
+        self,
+        group_by: List[str],
+        measures: Optional[List[str]] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> Dict:
+        """
+        Run a generic group-by aggregation.
+
+        Args:
+            group_by: Dimension names to group by
+            measures: Measure names to return
+            filters: Dimension name -> accepted values
+            start_date: Start date for filtering
+            end_date: End date for filtering
+            limit: Maximum number of rows to return
+
+        Returns:
+            Dictionary with grouped rows
+        """
+        self._ensure_warm()
+        return self.query_engine.run(
+            group_by, measures, filters, start_date, end_date, limit
+        )
+
+    def _map_partials(
+        self,
+        func: Callable,
+        *args,
+        developer_id: Optional[str] = None,
+    ) -> List:
+        """
+        Compute a partial aggregate per storage shard.
+
+        Sharded storages run `func` on every shard in parallel, or only on the
+        developer's shard when `developer_id` is given; other storages are a
+        single partition.
+
+        Args:
+            func: Partial aggregate function taking the storage first
+            *args: Extra arguments passed to func
+            developer_id: Developer whose shard holds all relevant events
+
+        Returns:
+            List of partial aggregates to merge
+        """
+        if not hasattr(self.storage, "map_shards"):
+            return [func(self.storage, *args)]
+        if developer_id:
+            return [func(self.storage.shard_for(developer_id), *args)]
+        return self.storage.map_shards(func, *args)
+
+    def _metrics_from_totals(
+        self, totals: partials.LocTotals, code_type: CodeType
+    ) -> Dict:
+        """LOC metrics of one code type from mergeable totals."""
+        return self.calculator.metrics_from_totals(totals.get(code_type.value, {}))
+
+    def _score_metrics(self, code_metrics: Dict, test_metrics: Dict, doc_metrics: Dict) -> float:
+        """Overall score of a developer from their per-type metrics."""
+        targets = self.calculator.get_targets()
+        return self._calculate_overall_score(
+            self.calculator.check_target_status(
+                code_metrics["ai_percentage"], targets["ai_loc"]
+            ),
+            self.calculator.check_target_status(
+                test_metrics["ai_percentage"], targets["ai_tests"]
+            ),
+            self.calculator.check_target_status(
+                doc_metrics["ai_percentage"], targets["ai_docs"]
+            ),
+        )
+
+    def _on_event_saved(self, event: Dict) -> None:
+        """Feed a newly saved event to the sketches and rollup."""
+        self._changes += 1
+        # Before warm-up the history scan will pick the event up instead; the
+        # shared aggregates' writer reads it from the files like other workers' events
+        if not self._warm or self.shared is not None:
+            return
+        self.distinct.observe(event)
+        self.rollup.observe(event)
+
+    def _ensure_warm(self) -> None:
+        """
+        Populate sketches and rollup from stored history once.
+
+        Raises:
+            AggregatesUnavailable: With shared aggregates, until the writer's
+                first sync (run by sync_periodically(), off the event loop)
+                has published them
+        """
+        if self.shared is not None:
+            if not self.shared.published:
+                raise AggregatesUnavailable("Aggregates are still being built, retry shortly")
+            return
+        if self._warm:
+            return
+
+        distinct, rollup = DistinctTracker(), DailyRollup()
+        for event in self.storage.get_all_events():
+            distinct.observe(event)
+            rollup.observe(event)
+        self.distinct = distinct
+        self.rollup = rollup
+        self.query_engine = QueryEngine(self.storage, self._rollup_source(rollup))
+        self._external_changes = self.storage.external_changes
+        self._warm = True
+
+    def export_state(self) -> Optional[Dict]:
+        """
+        Serialize sketches and rollup for a snapshot.
+
+        Call it holding the storage's write lock (listeners update the
+        aggregates under it), right after taking the storage's snapshot
+        state. If the storage has meanwhile found rows written by another
+        process, which the aggregates lack, they are rebuilt from the files
+        on next use instead.
+
+        Returns:
+            JSON-compatible state, or None before the history has been scanned
+            or while a rebuild is pending
+        """
+        if not self._warm:
+            return None
+        if self.storage.external_changes != self._external_changes:
+            logger.info("Event files were changed by another process, rebuilding aggregates")
+            self._warm = False
+            self._changes += 1
+            return None
+        return {"distinct": self.distinct.to_dict(), "rollup": self.rollup.to_dict()}
+
+    def restore_state(self, state: Dict, tail: Iterable[Dict]) -> int:
+        """
+        Restore sketches and rollup from a snapshot and replay newer events.
+
+        Args:
+            state: Output of export_state()
+            tail: Events stored after the snapshot was taken
+
+        Returns:
+            Number of replayed events
+        """
+        distinct = DistinctTracker.from_dict(state["distinct"])
+        rollup = DailyRollup.from_dict(state["rollup"])
+
+        replayed = 0
+        for event in tail:
+            distinct.observe(event)
+            rollup.observe(event)
+            replayed += 1
+
+        self.distinct = distinct
+        self.rollup = rollup
+        self.query_engine = QueryEngine(self.storage, self._rollup_source(rollup))
+        self._external_changes = self.storage.external_changes
+        self._warm = True
+        self._changes += 1
+        return replayed
+
+    def sync_shared(self) -> Optional[int]:
+        """
+        Fold the rows stored since the last sync into the shared aggregates.
+
+        Only one worker process (the writer, elected through a file lock)
+        updates them. It reads new rows from the event files, so events saved
+        by every worker are counted, and copies only the changed day sketches
+        and rollup cells into shared memory. If files were sealed or
+        rewritten since the last sync, or this worker just took over, the
+        aggregates are rebuilt from all stored rows and published anew.
+
+        Returns:
+            Number of events folded in, or None if another worker is the writer
+        """
+        with self._sync_lock:
+            if not self.shared.try_acquire_writer():
+                self._shared_position = None
+                return None
+
+            position = self.storage.tail_position()
+            events = (
+                None
+                if self._shared_position is None
+                else self.storage.iter_appended(position, self._shared_position)
+            )
+            if events is None:
+                events = self.storage.iter_appended(position)
+                if events is None:
+                    # Files changed while taking the position; try again next sync
+                    return 0
+                distinct, rollup = DistinctTracker(self.shared.precision), DailyRollup()
+                folded = 0
+                for event in events:
+                    distinct.observe(event)
+                    rollup.observe(event)
+                    folded += 1
+                self.distinct, self.rollup = distinct, rollup
+                self.shared.publish(distinct, rollup)
+            else:
+                keys = set()
+                folded = 0
+                for event in events:
+                    self.distinct.observe(event)
+                    self.rollup.observe(event)
+                    key = rollup_key(event)
+                    if key is not None:
+                        keys.add(key)
+                    folded += 1
+                if keys:
+                    self.shared.update(self.distinct, self.rollup, keys)
+            self._shared_position = position
+            self._warm = True
+            return folded
+
+    def close(self) -> None:
+        """Stop updating the shared aggregates, so another worker takes over."""
+        if self.shared is None:
+            return
+        with self._sync_lock:
+            self.shared.close()
+            self._shared_position = None
+
+    async def sync_periodically(self, interval: float) -> None:
+        """
+        Sync the shared aggregates every `interval` seconds until cancelled.
+
+        Every worker runs this, so another one takes over when the writer exits.
+
+        Args:
+            interval: Seconds between syncs
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.sync_shared)
+            except OSError:
+                logger.exception("Syncing shared aggregates failed")
+            await asyncio.sleep(interval)
+
     def _calculate_overall_score(
         self,
         ai_loc_status: str,
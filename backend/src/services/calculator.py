@@ -35,24 +35,33 @@ class MetricsCalculator:
         # Filter by code type
         filtered_events = [e for e in events if e.get("type") == code_type.value]
 
-        total_lines = sum(e.get("lines", 0) for e in filtered_events)
+        # Sum lines by source
+        source_lines: Dict[str, int] = {}
+        for e in filtered_events:
+            source = e.get("source")
+            source_lines[source] = source_lines.get(source, 0) + e.get("lines", 0)
+
+        return self.metrics_from_totals(source_lines)
+
+    def metrics_from_totals(self, source_lines: Dict[str, int]) -> Dict:
+        """
+        Calculate LOC metrics from line totals per source.
+
+        Totals are mergeable across partitions (add them per source), so
+        metrics over sharded data can be computed from partial totals.
+
+        Args:
+            source_lines: Source value -> total lines, for one code type
+
+        Returns:
+            Dictionary with metrics
+        """
+        total_lines = sum(source_lines.values())
 
         # Count by source
-        completion_lines = sum(
-            e.get("lines", 0)
-            for e in filtered_events
-            if e.get("source") == CodeSource.COMPLETION.value
-        )
-        agent_lines = sum(
-            e.get("lines", 0)
-            for e in filtered_events
-            if e.get("source") == CodeSource.AGENT.value
-        )
-        manual_lines = sum(
-            e.get("lines", 0)
-            for e in filtered_events
-            if e.get("source") == CodeSource.MANUAL.value
-        )
+        completion_lines = source_lines.get(CodeSource.COMPLETION.value, 0)
+        agent_lines = source_lines.get(CodeSource.AGENT.value, 0)
+        manual_lines = source_lines.get(CodeSource.MANUAL.value, 0)
 
         # AI lines = completion + agent
         ai_lines = completion_lines + agent_lines
@@ -0,0 +1,204 @@
+"""Ingest-side coalescing of fine-grained events into fewer stored records."""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..instrumentation import COALESCE_PENDING, COALESCED_EVENTS
+from ..models.events import CodeSource, Event
+from .query import DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Query dimensions events must share to be coalesced (besides day and file
+# path): developer, type and source, plus the other dimensions metrics group
+# on, so every total, per-feature and per-language figure stays exact
+COALESCE_KEY = (
+    "developer_id",
+    "type",
+    "source",
+    "language",
+    "feature_name",
+    "test_framework",
+    "doc_type",
+)
+
+
+def _group_key(row: dict) -> Tuple:
+    """Coalescing group of a serialized event: day, file path and COALESCE_KEY values."""
+    day = datetime.fromisoformat(row["timestamp"]).date()
+    return (day, row.get("file_path"), *(DIMENSIONS[dim](row) for dim in COALESCE_KEY))
+
+
+def merge_row(record: dict, row: dict) -> None:
+    """
+    Fold a serialized event into a coalesced record.
+
+    The record keeps the first event's metadata and gains ``event_count``
+    and ``first_timestamp`` (like compacted summaries); ``lines`` is summed
+    and ``timestamp`` is the latest.
+
+    Args:
+        record: Record to update in place
+        row: Event of the same group
+    """
+    record["lines"] += row["lines"]
+    record["event_count"] = record.get("event_count", 1) + row.get("event_count", 1)
+    record["first_timestamp"] = min(
+        record.get("first_timestamp", record["timestamp"]),
+        row.get("first_timestamp", row["timestamp"]),
+    )
+    # String comparison, the same way compaction picks the latest timestamp
+    record["timestamp"] = max(record["timestamp"], row["timestamp"])
+    if row.get("coverage") is not None:
+        record["coverage"] = row["coverage"]
+
+
+class EventCoalescer:
+    """
+    Merges events of the same file, source and type arriving close together.
+
+    Events from the coalesced sources are held back in memory for `window`
+    seconds after the first event of their group arrived; later events of
+    the group are folded into the same record, which is then saved as one
+    row with summed ``lines`` and an ``event_count``. Other events are
+    saved right away. Metric totals and event counts are unchanged; held
+    back events show up in metrics once their record is saved, and are lost
+    if the process dies before that (so the backend only coalesces with
+    durability mode ``none``).
+
+    Runs on the event loop like request handlers, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        storage,
+        window: float = 0.0,
+        sources: Iterable[str] = (CodeSource.MANUAL.value,),
+        max_pending: int = 10_000,
+    ):
+        """
+        Initialize coalescer.
+
+        Args:
+            storage: Storage records are saved to
+            window: Seconds a group stays open (0 disables coalescing)
+            sources: Code sources whose events are coalesced
+            max_pending: Open groups kept before the oldest are saved early
+        """
+        if window < 0:
+            raise ValueError("window must not be negative")
+        valid = {source.value for source in CodeSource}
+        self.sources = set(sources)
+        if not self.sources <= valid:
+            raise ValueError(
+                f"Unknown coalesce source(s): {', '.join(sorted(self.sources - valid))}"
+            )
+        self.storage = storage
+        self.window = window
+        self.max_pending = max_pending
+        # Open groups in the order they were opened: key -> (opened at, record)
+        self._pending: Dict[Tuple, Tuple[float, dict]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether events are coalesced at all."""
+        return self.window > 0 and bool(self.sources)
+
+    def save_event(self, event: Event) -> None:
+        """
+        Save an event, or hold it back for coalescing.
+
+        Args:
+            event: Event to save
+        """
+        self.save_events([event])
+
+    def save_events(self, events: List[Event]) -> None:
+        """
+        Save events, holding back those of coalesced sources.
+
+        Args:
+            events: Events to save
+        """
+        if not self.enabled:
+            self.storage.save_events(events)
+            return
+
+        direct = []
+        now = time.monotonic()
+        for event in events:
+            if event.source.value not in self.sources:
+                direct.append(event)
+                continue
+            # Serialized the way storages do, so records can be saved as they are
+            row = event.model_dump(mode="json")
+            row["timestamp"] = event.timestamp.isoformat()
+            key = _group_key(row)
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = (now, row)
+            else:
+                merge_row(pending[1], row)
+                COALESCED_EVENTS.inc()
+
+        if direct:
+            self.storage.save_events(direct)
+        if len(self._pending) > self.max_pending:
+            self._save(len(self._pending) - self.max_pending)
+        COALESCE_PENDING.set(len(self._pending))
+
+    def flush(self, everything: bool = False) -> int:
+        """
+        Save the records of groups whose window has passed.
+
+        Args:
+            everything: Save every open group regardless of its age
+
+        Returns:
+            Number of records saved
+        """
+        if everything:
+            count = len(self._pending)
+        else:
+            deadline = time.monotonic() - self.window
+            count = 0
+            # Groups are opened in time order, so the expired ones come first
+            for opened, _ in self._pending.values():
+                if opened > deadline:
+                    break
+                count += 1
+        self._save(count)
+        COALESCE_PENDING.set(len(self._pending))
+        return count
+
+    def _save(self, count: int) -> None:
+        """Save and close the `count` oldest open groups."""
+        if not count:
+            return
+        keys = list(self._pending)[:count]
+        records = [self._pending[key][1] for key in keys]
+        self.storage.save_events(records)
+        for key in keys:
+            del self._pending[key]
+
+    def close(self) -> None:
+        """Save every open group (on shutdown)."""
+        self.flush(everything=True)
+
+    async def run_periodically(self, interval: Optional[float] = None) -> None:
+        """
+        Save expired groups until cancelled.
+
+        Args:
+            interval: Seconds between checks (defaults to the window, at most 1s)
+        """
+        interval = interval or min(self.window, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.flush()
+            except OSError:
+                # Records stay pending and are retried on the next check
+                logger.exception("Saving coalesced events failed")
@@ -0,0 +1,312 @@
+"""Compaction of old raw events into per-day summary records."""
+
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from ..instrumentation import COMPACTED_EVENTS, COMPACTION_SECONDS
+from ..models.events import CodeType
+from .distinct import AI_SOURCES, DEFAULT_PRECISION, HyperLogLog, carried_sketches
+from .query import DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Row attributes a summary record is grouped by (besides the day). The
+# requested developer/type/source/language/feature key plus the few other
+# attributes the query engine can group on, so every aggregate stays exact.
+SUMMARY_KEY = (
+    "developer_id",
+    "type",
+    "source",
+    "language",
+    "feature_name",
+    "file_extension",
+    "test_framework",
+    "doc_type",
+)
+
+
+def _row_day(row: dict) -> Optional[date]:
+    """Calendar day of a stored row, or None if its timestamp is unusable."""
+    try:
+        return datetime.fromisoformat(row["timestamp"]).date()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def summarize(
+    rows: List[dict], horizon: date, precision: int = DEFAULT_PRECISION
+) -> Tuple[List[dict], List[dict], int]:
+    """
+    Fold rows older than a horizon into summary records.
+
+    A summary record looks like a stored event of its group whose ``lines``
+    is the group's total, plus ``event_count`` (events represented),
+    ``first_timestamp`` and ``summary: true``. Its ``timestamp`` is the
+    group's latest, so "last updated" values are unchanged. The first
+    summary of each day also carries ``file_sketches``: the day's distinct
+    file and AI file sketches, which the distinct tracker merges instead of
+    adding each file path. Existing summaries are merged again, so
+    compaction is idempotent.
+
+    Args:
+        rows: Stored rows of one event type, in file order
+        horizon: Rows from days before this one are folded
+        precision: HyperLogLog precision of the file sketches
+
+    Returns:
+        Tuple of (summary records sorted by timestamp, rows kept as they
+        are in original order, number of rows folded)
+    """
+    groups: Dict[Tuple, dict] = {}
+    day_sketches: Dict[date, Dict[str, HyperLogLog]] = {}
+    kept: List[dict] = []
+    folded = 0
+
+    for row in rows:
+        day = _row_day(row)
+        if day is None or day >= horizon:
+            kept.append(row)
+            continue
+
+        folded += 1
+        key = (day, *(DIMENSIONS[dim](row) for dim in SUMMARY_KEY))
+        sketches = day_sketches.get(day)
+        if sketches is None:
+            sketches = {
+                "files": HyperLogLog(precision),
+                "ai_files": HyperLogLog(precision),
+            }
+            day_sketches[day] = sketches
+        file_path = row.get("file_path")
+        if file_path:
+            sketches["files"].add(file_path)
+            if row.get("source") in AI_SOURCES:
+                sketches["ai_files"].add(file_path)
+        for name, sketch in carried_sketches(row, precision).items():
+            sketches[name].merge(sketch)
+
+        summary = groups.get(key)
+        if summary is None:
+            developer_id, event_type, source, language, feature_name = key[1:6]
+            summary = {
+                "type": event_type,
+                "source": source,
+                "lines": 0,
+                "file_path": None,
+                "language": language,
+                "developer_id": developer_id,
+                "timestamp": row["timestamp"],
+                "first_timestamp": row.get("first_timestamp", row["timestamp"]),
+                "metadata": (
+                    {"feature_name": feature_name} if feature_name != "unknown" else None
+                ),
+                "event_count": 0,
+                "summary": True,
+            }
+            if event_type == CodeType.TEST.value:
+                summary["test_framework"] = row.get("test_framework")
+            elif event_type == CodeType.DOCUMENTATION.value:
+                summary["doc_type"] = row.get("doc_type")
+            groups[key] = summary
+
+        summary["lines"] += row.get("lines", 0)
+        summary["event_count"] += row.get("event_count", 1)
+        # A representative path keeps file_extension queries working
+        if file_path and (summary["file_path"] is None or file_path < summary["file_path"]):
+            summary["file_path"] = file_path
+        # String comparison, the same way feature metrics pick last_updated
+        summary["timestamp"] = max(summary["timestamp"], row["timestamp"])
+        summary["first_timestamp"] = min(
+            summary["first_timestamp"], row.get("first_timestamp", row["timestamp"])
+        )
+
+    summaries = sorted(groups.values(), key=lambda s: s["timestamp"])
+    for summary in summaries:
+        sketches = day_sketches.pop(_row_day(summary), None)
+        if sketches is not None:
+            summary["file_sketches"] = {
+                name: sketch.pack() for name, sketch in sketches.items()
+            }
+    return summaries, kept, folded
+
+
+class Compactor:
+    """
+    Folds raw events older than a retention horizon into summary records.
+
+    Totals, event counts, distinct counts and last-updated times computed by
+    the aggregator stay identical; only per-event detail (exact times within
+    a day, file paths per event, free-form metadata) of old events is
+    dropped. Date filters with a time of day cut through compacted days at
+    the summary's latest timestamp.
+
+    Rewrites event files in place. Each active file is read and rewritten
+    under the storage's write lock, so concurrent saves wait instead of being
+    lost; in the backend it runs in a worker thread. Other processes do not
+    take that lock, so the CLI must not run next to a live backend.
+    """
+
+    def __init__(self, storage, retention_days: int = 90):
+        """
+        Initialize compactor.
+
+        Args:
+            storage: Storage to compact (sharded storages are compacted per shard)
+            retention_days: Days of raw events kept before today
+        """
+        if retention_days < 1:
+            raise ValueError("retention_days must be at least 1")
+        self.storage = storage
+        self.retention_days = retention_days
+
+    def horizon(self, today: Optional[date] = None) -> date:
+        """
+        First day whose events are kept raw.
+
+        Args:
+            today: Reference day (defaults to today)
+
+        Returns:
+            Horizon day
+        """
+        return (today or date.today()) - timedelta(days=self.retention_days)
+
+    def compact(self, dry_run: bool = False, today: Optional[date] = None) -> Dict:
+        """
+        Compact every event file of the storage.
+
+        Args:
+            dry_run: Compute the outcome without rewriting files
+            today: Reference day for the horizon (defaults to today)
+
+        Returns:
+            Dictionary with horizon, rows and bytes before/after and seconds taken
+        """
+        started = time.perf_counter()
+        horizon = self.horizon(today)
+        result = {
+            "horizon": horizon.isoformat(),
+            "dry_run": dry_run,
+            "rows_before": 0,
+            "rows_after": 0,
+            "rows_folded": 0,
+            "summaries": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+        }
+
+        for partition in getattr(self.storage, "shards", [self.storage]):
+            for event_type in CodeType:
+                # JSONL storage also has sealed segments, each compacted on its own
+                sealed = (
+                    partition.sealed_segments(event_type)
+                    if hasattr(partition, "sealed_segments")
+                    else []
+                )
+                for segment in [*sealed, None]:
+                    self._compact_file(partition, event_type, segment, horizon, dry_run, result)
+
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        if not dry_run:
+            COMPACTION_SECONDS.observe(result["seconds"])
+            COMPACTED_EVENTS.inc(result["rows_folded"] - result["summaries"])
+        return result
+
+    def _compact_file(
+        self,
+        partition,
+        event_type: CodeType,
+        segment: Optional[Path],
+        horizon: date,
+        dry_run: bool,
+        result: Dict,
+    ) -> None:
+        """
+        Compact one event file and add its figures to a compact() result.
+
+        Args:
+            partition: Storage (or shard) holding the file
+            event_type: Type of events in the file
+            segment: Sealed segment path, or None for the active file
+            horizon: Rows from days before this one are folded
+            dry_run: Compute the outcome without rewriting the file
+            result: compact() result to update
+        """
+        # Events are only appended to the active file; hold off writers until
+        # it is rewritten so none are lost in between. A sealed segment must
+        # not be compressed by a background seal in between either.
+        lock = partition.write_lock if segment is None else partition.segment_lock
+        with lock:
+            self._rewrite_file(partition, event_type, segment, horizon, dry_run, result)
+
+    def _rewrite_file(
+        self,
+        partition,
+        event_type: CodeType,
+        segment: Optional[Path],
+        horizon: date,
+        dry_run: bool,
+        result: Dict,
+    ) -> None:
+        """Read, summarize and rewrite one event file (see _compact_file())."""
+        file_path = segment or partition.files[event_type]
+        if not file_path.exists():
+            return
+        size = file_path.stat().st_size
+        rows = (
+            partition.read_rows(event_type)
+            if segment is None
+            else partition.read_rows(event_type, segment)
+        )
+        summaries, kept, folded = summarize(rows, horizon)
+
+        result["rows_before"] += len(rows)
+        result["bytes_before"] += size
+        result["rows_folded"] += folded
+        result["summaries"] += len(summaries)
+        result["rows_after"] += len(summaries) + len(kept)
+
+        # Nothing to gain from rewriting a file without foldable rows
+        if dry_run or folded == len(summaries):
+            result["bytes_after"] += size
+            return
+        result["bytes_after"] += (
+            partition.replace_rows(event_type, summaries + kept)
+            if segment is None
+            else partition.replace_rows(event_type, summaries + kept, segment)
+        )
+
+    async def run_periodically(
+        self,
+        interval: float,
+        after: Optional[Callable[[], Awaitable]] = None,
+    ) -> None:
+        """
+        Compact every `interval` seconds until cancelled.
+
+        Args:
+            interval: Seconds between runs
+            after: Coroutine function awaited after a run that rewrote files
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Reads and rewrites whole files: keep it off the event loop
+                result = await asyncio.to_thread(self.compact)
+            except OSError:
+                logger.exception("Compaction failed")
+                continue
+            if result["rows_folded"] == result["summaries"]:
+                continue
+            logger.info(
+                "Compacted %d rows into %d summaries (%d -> %d bytes)",
+                result["rows_folded"],
+                result["summaries"],
+                result["bytes_before"],
+                result["bytes_after"],
+            )
+            if after is not None:
+                await after()
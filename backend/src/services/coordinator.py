@@ -0,0 +1,401 @@
+"""Coordinator that spreads developers over backend nodes."""
+
+import asyncio
+import bisect
+import hashlib
+import heapq
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from ..storage.timeline import Key, narrow
+from . import partials
+from .aggregator import MetricsAggregator
+from .paging import ORDERS, encode_cursor
+
+
+def _ring_hash(key: str) -> int:
+    """Stable 64-bit position on the hash ring."""
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """
+    Consistent-hash ring with virtual nodes.
+
+    Adding or removing a node only moves the developers whose ring positions
+    fall next to that node's virtual points (about 1/N of them).
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = 64):
+        """
+        Initialize ring.
+
+        Args:
+            nodes: Node base URLs
+            vnodes: Virtual points per node (more = more even spread)
+        """
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+
+        self.nodes = list(nodes)
+        points = sorted(
+            (_ring_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: Optional[str]) -> str:
+        """
+        Get the node owning a key.
+
+        Args:
+            key: Routing key (developer_id)
+
+        Returns:
+            Node base URL
+        """
+        index = bisect.bisect(self._hashes, _ring_hash(key or ""))
+        return self._owners[index % len(self._owners)]
+
+
+class ClusterCoordinator:
+    """
+    Routes ingest to nodes by developer and scatter-gathers team queries.
+
+    Every node is a regular backend. Ingest and per-developer reads go to the
+    node owning the developer on the hash ring. Team, trends and features
+    queries fetch mergeable partials (``/api/partials/*``) from all nodes in
+    parallel and merge them; nodes that fail or exceed ``timeout`` are left
+    out and the response is marked ``partial`` with their ``missing_nodes``.
+    """
+
+    def __init__(
+        self,
+        nodes: List[str],
+        builder: MetricsAggregator,
+        timeout: float = 2.0,
+        vnodes: int = 64,
+    ):
+        """
+        Initialize coordinator.
+
+        Args:
+            nodes: Node base URLs, e.g. http://localhost:8001
+            builder: Aggregator used to build responses from merged partials
+            timeout: Per-node request timeout in seconds
+            vnodes: Virtual points per node on the hash ring
+        """
+        self.nodes = [node.rstrip("/") for node in nodes]
+        self.ring = HashRing(self.nodes, vnodes)
+        self.builder = builder
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client shared by all node requests."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=8 * len(self.nodes)),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Close pooled node connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def forward(
+        self,
+        method: str,
+        developer_id: Optional[str],
+        path: str,
+        params: Optional[Dict] = None,
+        json: Optional[Dict] = None,
+    ) -> httpx.Response:
+        """
+        Send a request to the node owning a developer.
+
+        Args:
+            method: HTTP method
+            developer_id: Developer used for routing
+            path: Request path
+            params: Query parameters
+            json: JSON body
+
+        Returns:
+            Node response
+
+        Raises:
+            httpx.HTTPError: If the node is unreachable or times out
+        """
+        node = self.ring.node_for(developer_id)
+        return await self.client.request(
+            method, f"{node}{path}", params=params, json=json
+        )
+
+    async def forward_batch(self, batch_id: Optional[str], events: List[Dict]) -> Dict:
+        """
+        Split an event batch by owning node and send the parts in parallel.
+
+        Every part keeps the client's batch_id, so a retry after a partial
+        failure is not saved twice by the nodes that already stored their part.
+
+        Args:
+            batch_id: Client batch ID (or None)
+            events: Event dictionaries
+
+        Returns:
+            Combined response with the number of events saved
+
+        Raises:
+            httpx.HTTPError: If a node is unreachable, times out or rejects its part
+        """
+        parts: Dict[str, List[Dict]] = {}
+        for event in events:
+            parts.setdefault(self.ring.node_for(event.get("developer_id")), []).append(event)
+
+        async def send(node: str, part: List[Dict]) -> Dict:
+            response = await self.client.post(
+                f"{node}/api/events/batch", json={"batch_id": batch_id, "events": part}
+            )
+            response.raise_for_status()
+            return response.json()
+
+        results = await asyncio.gather(*(send(n, p) for n, p in parts.items()))
+        return {
+            "success": True,
+            "message": "Event batch saved",
+            "saved": sum(result["saved"] for result in results),
+            "duplicate": all(result["duplicate"] for result in results),
+        }
+
+    async def export(
+        self,
+        params: List[Tuple[str, str]],
+        developer_ids: Optional[List[str]],
+        fmt: str,
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream the raw-event exports of the nodes one after the other.
+
+        Only the nodes owning the requested developers are asked. CSV
+        headers after the first node's are dropped. A node failing midway
+        aborts the stream, since the response status has already been sent.
+
+        Args:
+            params: Export query parameters (repeated keys allowed)
+            developer_ids: Developer filter used to pick nodes (None for all)
+            fmt: Export format, ndjson or csv
+
+        Yields:
+            Response body chunks
+
+        Raises:
+            httpx.HTTPError: If a node is unreachable or fails
+        """
+        nodes = (
+            sorted({self.ring.node_for(d) for d in developer_ids})
+            if developer_ids
+            else self.nodes
+        )
+        # The connect timeout still applies; a long export may take any time to read
+        timeout = httpx.Timeout(self.timeout, read=None)
+        for i, node in enumerate(nodes):
+            async with self.client.stream(
+                "GET", f"{node}/api/events/export", params=params, timeout=timeout
+            ) as response:
+                response.raise_for_status()
+                skip_header = fmt == "csv" and i > 0
+                async for chunk in response.aiter_bytes():
+                    if skip_header:
+                        newline = chunk.find(b"\n")
+                        if newline < 0:
+                            continue
+                        chunk = chunk[newline + 1 :]
+                        skip_header = False
+                    if chunk:
+                        yield chunk
+
+    async def page_events(
+        self,
+        params: List[Tuple[str, str]],
+        developer_ids: Optional[List[str]],
+        limit: int,
+        after: Optional[Key],
+        order: str,
+    ) -> Dict:
+        """
+        One page of events merged from the nodes owning matching developers.
+
+        Each node returns a page starting right after the cursor, translated
+        to its own keys; the pages are merged by key and cut at `limit`.
+        Keys gain the node number after the timestamp. Unlike aggregate
+        queries, leaving a node out would make cursors skip its events, so
+        any node failure fails the request.
+
+        Args:
+            params: Event query parameters (repeated keys allowed; cursor is replaced)
+            developer_ids: Developer filter used to pick nodes (None for all)
+            limit: Maximum number of events
+            after: Decoded cursor key (None for the first page)
+            order: "desc" or "asc"
+
+        Returns:
+            Page with events, count and next_cursor
+
+        Raises:
+            httpx.HTTPError: If a node is unreachable or fails
+        """
+        numbers = (
+            sorted({self.nodes.index(self.ring.node_for(d)) for d in developer_ids})
+            if developer_ids
+            else list(range(len(self.nodes)))
+        )
+        base_params = [(key, value) for key, value in params if key != "cursor"]
+
+        async def fetch(number: int) -> Dict:
+            node_params = list(base_params)
+            node_after = narrow(after, number)
+            if node_after is not None:
+                node_params.append(("cursor", encode_cursor(node_after, order)))
+            return await self._fetch(self.nodes[number], "/api/partials/events", node_params)
+
+        pages = await asyncio.gather(*(fetch(number) for number in numbers))
+        merged = heapq.merge(
+            *(
+                [
+                    ((key[0], number, *key[1:]), event)
+                    for key, event in zip(page["keys"], page["events"])
+                ]
+                for number, page in zip(numbers, pages)
+            ),
+            key=lambda item: item[0],
+            reverse=ORDERS[order],
+        )
+        rows = list(islice(merged, limit))
+        return {
+            "events": [event for _, event in rows],
+            "count": len(rows),
+            "next_cursor": encode_cursor(rows[-1][0], order) if len(rows) == limit else None,
+        }
+
+    async def _fetch(self, node: str, path: str, params: Dict) -> Dict:
+        """GET JSON from one node, raising on errors."""
+        response = await self.client.get(f"{node}{path}", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def scatter(self, path: str, params: Dict) -> Tuple[List[Dict], List[str]]:
+        """
+        GET a partial from every node in parallel.
+
+        Args:
+            path: Partial endpoint path
+            params: Query parameters
+
+        Returns:
+            Tuple of (results from healthy nodes, URLs of missing nodes)
+
+        Raises:
+            RuntimeError: If no node answered
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        outcomes = await asyncio.gather(
+            *(self._fetch(node, path, params) for node in self.nodes),
+            return_exceptions=True,
+        )
+        results, missing = [], []
+        for node, outcome in zip(self.nodes, outcomes):
+            if isinstance(outcome, (httpx.HTTPError, ValueError)):
+                missing.append(node)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results.append(outcome)
+        if not results:
+            raise RuntimeError("No backend node answered")
+        return results, missing
+
+    @staticmethod
+    def _mark(result: Dict, missing: List[str]) -> Dict:
+        """Flag a merged result that lacks some nodes."""
+        result["partial"] = bool(missing)
+        result["missing_nodes"] = missing
+        return result
+
+    async def team_metrics(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict:
+        """
+        Team metrics merged from all nodes.
+
+        Args:
+            start_date: Start date for filtering
+            end_date: End date for filtering
+
+        Returns:
+            Team metrics, with partial/missing_nodes
+        """
+        results, missing = await self.scatter(
+            "/api/partials/team",
+            {
+                "start_date": start_date.isoformat() if start_date else None,
+                "end_date": end_date.isoformat() if end_date else None,
+            },
+        )
+        merged = partials.merge_team(partials.decode_team(r) for r in results)
+        return self._mark(
+            self.builder.build_team_metrics(merged, start_date, end_date), missing
+        )
+
+    async def trends(self, developer_id: Optional[str], days: int) -> Dict:
+        """
+        Trends merged from all nodes (or from the owning node for a developer).
+
+        Args:
+            developer_id: Optional developer ID to filter
+            days: Number of days to look back
+
+        Returns:
+            Trend data, with partial/missing_nodes
+        """
+        start_date, end_date = self.builder.trend_period(days)
+        params = {
+            "developer_id": developer_id,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+        }
+        if developer_id:
+            node = self.ring.node_for(developer_id)
+            results = [await self._fetch(node, "/api/partials/trends", params)]
+            missing = []
+        else:
+            results, missing = await self.scatter("/api/partials/trends", params)
+
+        merged = partials.merge_trends(partials.decode_trends(r) for r in results)
+        return self._mark(
+            self.builder.build_trends(merged, developer_id, days, start_date, end_date),
+            missing,
+        )
+
+    async def features(self, limit: int) -> Dict:
+        """
+        Feature metrics merged from all nodes.
+
+        Args:
+            limit: Maximum number of features to return
+
+        Returns:
+            Feature metrics, with partial/missing_nodes
+        """
+        results, missing = await self.scatter("/api/partials/features", {})
+        merged = partials.merge_features(results)
+        return self._mark(self.builder.build_features_metrics(merged, limit), missing)
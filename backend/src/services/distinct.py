@@ -0,0 +1,477 @@
+"""Approximate distinct counting with HyperLogLog sketches."""
+
+import base64
+import binascii
+import hashlib
+import logging
+import math
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from ..models.events import CodeSource
+
+logger = logging.getLogger(__name__)
+
+# Sources counted as AI-generated code
+AI_SOURCES = (CodeSource.COMPLETION.value, CodeSource.AGENT.value)
+
+# Default precision: 2^12 registers (4 KiB per sketch), ~1.6% standard error
+DEFAULT_PRECISION = 12
+
+# Day sketches compacted summary records carry in ``file_sketches``
+FILE_SKETCHES = ("files", "ai_files")
+
+
+class HyperLogLog:
+    """
+    Mergeable HyperLogLog cardinality sketch.
+
+    Each sketch uses ``2 ** precision`` one-byte registers. The standard error
+    of an estimate is ``1.04 / sqrt(2 ** precision)`` (about 1.6% for the
+    default precision of 12); ~95% of estimates fall within twice that bound.
+    Small cardinalities use linear counting and are close to exact.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        """
+        Initialize an empty sketch.
+
+        Args:
+            precision: Number of index bits (4-16)
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of the cardinality estimate."""
+        return 1.04 / math.sqrt(self.num_registers)
+
+    def add(self, value: str) -> None:
+        """
+        Add a value to the sketch.
+
+        Args:
+            value: Value to count
+        """
+        # Stable 64-bit hash so sketches built in different processes merge
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        remainder = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remainder.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """
+        Merge another sketch into this one (register-wise maximum).
+
+        Args:
+            other: Sketch with the same precision
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    @classmethod
+    def union(
+        cls, sketches: List["HyperLogLog"], precision: int = DEFAULT_PRECISION
+    ) -> "HyperLogLog":
+        """
+        Merge many sketches at once.
+
+        A single n-way register maximum is much cheaper than repeated
+        pairwise merges.
+
+        Args:
+            sketches: Sketches with the same precision
+            precision: Precision of the result if `sketches` is empty
+
+        Returns:
+            New merged sketch
+        """
+        result = cls(sketches[0].precision if sketches else precision)
+        if len(sketches) == 1:
+            result.registers = bytearray(sketches[0].registers)
+        elif sketches:
+            if any(s.precision != result.precision for s in sketches):
+                raise ValueError("Cannot merge sketches with different precision")
+            result.registers = bytearray(map(max, *(s.registers for s in sketches)))
+        return result
+
+    def encode(self) -> str:
+        """Serialize the registers as base64 (for snapshots and node partials)."""
+        return base64.b64encode(self.registers).decode("ascii")
+
+    @classmethod
+    def decode(cls, data: str, precision: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        """
+        Restore a sketch serialized with encode().
+
+        Args:
+            data: Base64 registers
+            precision: Precision the sketch was created with
+
+        Returns:
+            Restored sketch
+        """
+        sketch = cls(precision)
+        registers = bytearray(base64.b64decode(data))
+        if len(registers) != sketch.num_registers:
+            raise ValueError("Sketch size does not match precision")
+        sketch.registers = registers
+        return sketch
+
+    def pack(self) -> str:
+        """Serialize the registers zlib-compressed as base64 (compact for sparse sketches)."""
+        return base64.b64encode(zlib.compress(bytes(self.registers))).decode("ascii")
+
+    @classmethod
+    def unpack(cls, data: str, precision: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        """
+        Restore a sketch serialized with pack().
+
+        Args:
+            data: Base64 compressed registers
+            precision: Precision the sketch was created with
+
+        Returns:
+            Restored sketch
+        """
+        sketch = cls(precision)
+        registers = bytearray(zlib.decompress(base64.b64decode(data)))
+        if len(registers) != sketch.num_registers:
+            raise ValueError("Sketch size does not match precision")
+        sketch.registers = registers
+        return sketch
+
+    def copy(self) -> "HyperLogLog":
+        """Return an independent copy of this sketch."""
+        clone = HyperLogLog(self.precision)
+        clone.registers = bytearray(self.registers)
+        return clone
+
+    def count(self) -> int:
+        """
+        Estimate the number of distinct values added.
+
+        Returns:
+            Estimated cardinality
+        """
+        m = self.num_registers
+        registers = bytes(self.registers)
+
+        # Harmonic mean over registers, grouped by register value
+        inverse_sum = sum(
+            registers.count(rank) * 2.0 ** -rank for rank in set(registers)
+        )
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / inverse_sum
+
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting for small cardinalities
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+
+class DistinctTracker:
+    """Per-day HyperLogLog sketches for distinct developers, files and languages."""
+
+    DIMENSIONS = ("developers", "files", "ai_files", "languages")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        """
+        Initialize tracker.
+
+        Args:
+            precision: HyperLogLog precision used for every sketch
+        """
+        self.precision = precision
+        self.buckets: Dict[date, Dict[str, HyperLogLog]] = {}
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of every estimate returned by this tracker."""
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def observe(self, event: dict) -> None:
+        """
+        Add an event to the sketches of its day.
+
+        Args:
+            event: Event dictionary as stored
+        """
+        try:
+            day = datetime.fromisoformat(event["timestamp"]).date()
+        except (KeyError, TypeError, ValueError):
+            return
+
+        sketches = self.buckets.get(day)
+        if sketches is None:
+            sketches = {name: HyperLogLog(self.precision) for name in self.DIMENSIONS}
+            self.buckets[day] = sketches
+
+        developer_id = event.get("developer_id")
+        if developer_id:
+            sketches["developers"].add(developer_id)
+
+        file_path = event.get("file_path")
+        if file_path:
+            sketches["files"].add(file_path)
+            if event.get("source") in AI_SOURCES:
+                sketches["ai_files"].add(file_path)
+
+        # Compacted summary records carry the file sketches of the day they fold
+        for name, sketch in carried_sketches(event, self.precision).items():
+            sketches[name].merge(sketch)
+
+        language = event.get("language")
+        if language:
+            sketches["languages"].add(language)
+
+    def merge(self, other: "DistinctTracker") -> None:
+        """
+        Merge the day sketches of another tracker with the same precision.
+
+        Args:
+            other: Tracker to fold into this one
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge trackers with different precision")
+        for day, sketches in other.buckets.items():
+            mine = self.buckets.get(day)
+            if mine is None:
+                self.buckets[day] = {name: sketch.copy() for name, sketch in sketches.items()}
+            else:
+                for name, sketch in sketches.items():
+                    mine[name].merge(sketch)
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize all day sketches for a snapshot.
+
+        Returns:
+            JSON-compatible dictionary (registers as base64)
+        """
+        return {
+            "precision": self.precision,
+            "days": {
+                day.isoformat(): {
+                    name: sketch.encode() for name, sketch in sketches.items()
+                }
+                for day, sketches in self.buckets.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DistinctTracker":
+        """
+        Restore a tracker serialized with to_dict().
+
+        Args:
+            data: Serialized tracker
+
+        Returns:
+            Restored tracker
+        """
+        tracker = cls(data["precision"])
+        for day, sketches in data["days"].items():
+            tracker.buckets[date.fromisoformat(day)] = {
+                name: HyperLogLog.decode(sketches[name], tracker.precision)
+                for name in cls.DIMENSIONS
+            }
+        return tracker
+
+    def merged(
+        self,
+        dimension: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> HyperLogLog:
+        """
+        Merge the day sketches of a dimension over an inclusive date range.
+
+        Args:
+            dimension: One of DIMENSIONS
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Returns:
+            Merged sketch
+        """
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unknown distinct dimension: {dimension}")
+
+        selected = [
+            sketches[dimension]
+            for day, sketches in self.buckets.items()
+            if (not start or day >= start) and (not end or day <= end)
+        ]
+        return HyperLogLog.union(selected, self.precision)
+
+    def day_sketches(
+        self,
+        dimension: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Dict[date, HyperLogLog]:
+        """
+        Get the day sketches of a dimension within an inclusive date range.
+
+        Args:
+            dimension: One of DIMENSIONS
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Returns:
+            Day -> sketch
+        """
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unknown distinct dimension: {dimension}")
+        return {
+            day: sketches[dimension]
+            for day, sketches in self.buckets.items()
+            if (not start or day >= start) and (not end or day <= end)
+        }
+
+    def estimate(
+        self,
+        dimension: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> int:
+        """
+        Estimate distinct values of a dimension over an inclusive date range.
+
+        Args:
+            dimension: One of DIMENSIONS
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Returns:
+            Estimated distinct count
+        """
+        return self.merged(dimension, start, end).count()
+
+    def daily(self, dimension: str, day: date) -> int:
+        """
+        Estimate distinct values of a dimension on a single day.
+
+        Args:
+            dimension: One of DIMENSIONS
+            day: Day to estimate
+
+        Returns:
+            Estimated distinct count (0 if the day has no events)
+        """
+        sketches = self.buckets.get(day)
+        if sketches is None:
+            return 0
+        return sketches[dimension].count()
+
+    def weekly(
+        self,
+        dimension: str,
+        start: date,
+        end: date,
+    ) -> List[Dict]:
+        """
+        Estimate distinct values per calendar week (Monday start).
+
+        Args:
+            dimension: One of DIMENSIONS
+            start: First day of the period
+            end: Last day of the period
+
+        Returns:
+            List of {"week_start", "count"} dictionaries
+        """
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unknown distinct dimension: {dimension}")
+        return weekly_counts(
+            {day: sketches[dimension] for day, sketches in self.buckets.items()},
+            start,
+            end,
+            self.precision,
+        )
+
+
+def carried_sketches(event: dict, precision: int = DEFAULT_PRECISION) -> Dict[str, HyperLogLog]:
+    """
+    Decode the file sketches a compacted summary record carries.
+
+    Malformed sketches are logged and skipped, so one bad stored row cannot
+    fail aggregation.
+
+    Args:
+        event: Event dictionary as stored
+        precision: Precision the sketches were created with
+
+    Returns:
+        Sketch name (one of FILE_SKETCHES) -> sketch
+    """
+    carried = event.get("file_sketches")
+    if not carried:
+        return {}
+    if not isinstance(carried, dict):
+        logger.warning("Skipping malformed file_sketches of event at %s", event.get("timestamp"))
+        return {}
+
+    sketches = {}
+    for name, data in carried.items():
+        try:
+            if name not in FILE_SKETCHES:
+                raise KeyError(name)
+            sketches[name] = HyperLogLog.unpack(data, precision)
+        except (zlib.error, binascii.Error, KeyError, TypeError, ValueError):
+            logger.warning(
+                "Skipping malformed %r file sketch of event at %s", name, event.get("timestamp")
+            )
+    return sketches
+
+
+def weekly_counts(
+    sketches: Dict[date, HyperLogLog],
+    start: date,
+    end: date,
+    precision: int = DEFAULT_PRECISION,
+) -> List[Dict]:
+    """
+    Estimate distinct values per calendar week (Monday start) from day sketches.
+
+    Args:
+        sketches: Day -> sketch of one dimension
+        start: First day of the period
+        end: Last day of the period
+        precision: Precision of the sketches
+
+    Returns:
+        List of {"week_start", "count"} dictionaries
+    """
+    weeks = []
+    week_start = start - timedelta(days=start.weekday())
+    while week_start <= end:
+        first = max(week_start, start)
+        last = min(week_start + timedelta(days=6), end)
+        selected = [
+            sketch for day, sketch in sketches.items() if first <= day <= last
+        ]
+        weeks.append(
+            {
+                "week_start": week_start.isoformat(),
+                "count": HyperLogLog.union(selected, precision).count(),
+            }
+        )
+        week_start += timedelta(days=7)
+    return weeks
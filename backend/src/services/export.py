@@ -0,0 +1,201 @@
+"""Streaming export of raw events as NDJSON or CSV."""
+
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Set
+from ..models.events import EVENT_MODELS, CodeSource, CodeType
+from .rollup import feature_name_of
+
+# Export formats: name -> media type
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Stored fields besides the model fields, set on coalesced records and
+# compaction summaries
+SUMMARY_FIELDS = ("event_count", "first_timestamp", "summary", "file_sketches")
+
+# CSV columns written as JSON values
+CSV_JSON_COLUMNS = ("summary", "file_sketches", "metadata")
+
+# CSV columns: the fields of every event model, the feature name (derived
+# from metadata) and the summary fields, so CSV exports import losslessly
+CSV_COLUMNS = tuple(
+    dict.fromkeys(
+        [
+            *(
+                field
+                for model in EVENT_MODELS.values()
+                for field in model.model_fields
+                if field != "metadata"
+            ),
+            "feature_name",
+            *SUMMARY_FIELDS,
+            "metadata",
+        ]
+    )
+)
+
+# Rows encoded per response chunk
+CHUNK_ROWS = 1000
+
+
+def parse_export_filters(
+    types: Optional[List[str]], sources: Optional[List[str]]
+) -> List[CodeType]:
+    """
+    Validate the enumerated export filters.
+
+    Args:
+        types: Event type values (None for all types)
+        sources: Code source values
+
+    Returns:
+        Event types to export
+
+    Raises:
+        ValueError: If a type or source is unknown
+    """
+    for source in sources or []:
+        CodeSource(source)
+    return [CodeType(t) for t in types] if types else list(CodeType)
+
+
+def iter_export_rows(
+    storage,
+    types: Optional[List[str]] = None,
+    developer_ids: Optional[List[str]] = None,
+    sources: Optional[List[str]] = None,
+    feature_names: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Iterator[dict]:
+    """
+    Iterate stored events matching export filters, type after type.
+
+    Within a type, events come in storage order. Compacted summary records
+    are exported as stored (with ``event_count`` and ``summary: true``).
+
+    Args:
+        storage: Storage to read from
+        types: Event types to export (default: all)
+        developer_ids: Developer IDs to export (default: all)
+        sources: Code sources to export (default: all)
+        feature_names: Feature names to export (default: all)
+        start_date: Export events after this date
+        end_date: Export events before this date
+
+    Returns:
+        Iterator of event dictionaries (filters are validated before it is
+        returned, so errors surface before a response starts)
+
+    Raises:
+        ValueError: If a type or source is unknown
+    """
+    event_types = parse_export_filters(types, sources)
+    return _iter_rows(
+        storage,
+        event_types,
+        developer_ids,
+        sources,
+        set(feature_names or []),
+        start_date,
+        end_date,
+    )
+
+
+def _iter_rows(
+    storage,
+    event_types: List[CodeType],
+    developer_ids: Optional[List[str]],
+    sources: Optional[List[str]],
+    wanted_features: Set[str],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+) -> Iterator[dict]:
+    """Generator behind iter_export_rows()."""
+    for event_type in event_types:
+        for event in storage.iter_events(
+            event_type,
+            developer_id=developer_ids or None,
+            start_date=start_date,
+            end_date=end_date,
+            source=sources or None,
+        ):
+            if wanted_features and feature_name_of(event) not in wanted_features:
+                continue
+            yield event
+
+
+def _csv_row(event: dict) -> list:
+    """Values of an event in CSV_COLUMNS order."""
+    values = {
+        **event,
+        "feature_name": feature_name_of(event),
+        "event_count": event.get("event_count", 1),
+    }
+    for column in CSV_JSON_COLUMNS:
+        if values.get(column) is not None:
+            values[column] = json.dumps(values[column])
+    return [values.get(column) for column in CSV_COLUMNS]
+
+
+def encode_rows(rows: Iterable[dict], fmt: str) -> bytes:
+    """
+    Encode events in an export format.
+
+    Args:
+        rows: Event dictionaries
+        fmt: One of EXPORT_FORMATS
+
+    Returns:
+        Encoded rows (CSV without header)
+    """
+    if fmt == "ndjson":
+        return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(_csv_row(row) for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def csv_header() -> bytes:
+    """CSV header line."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(CSV_COLUMNS)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_export(rows: Iterator[dict], fmt: str) -> AsyncIterator[bytes]:
+    """
+    Encode events into response chunks of CHUNK_ROWS rows.
+
+    Rows are pulled from the storage iterator on the event loop one chunk at
+    a time. Each chunk is sent (the server waits while a slow client's
+    buffer is full) before the next is read, so memory stays bounded by one
+    chunk whatever the export size, and the loop is yielded after every
+    chunk so other requests keep being served.
+
+    Args:
+        rows: Event iterator (see iter_export_rows())
+        fmt: One of EXPORT_FORMATS
+
+    Yields:
+        Encoded chunks, starting with the header for CSV
+    """
+    if fmt == "csv":
+        yield csv_header()
+
+    chunk: List[dict] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield encode_rows(chunk, fmt)
+            chunk = []
+            await asyncio.sleep(0)
+    if chunk:
+        yield encode_rows(chunk, fmt)
@@ -0,0 +1,443 @@
+"""Bulk import of historical events from JSONL, JSON or CSV files."""
+
+import binascii
+import csv
+import json
+import logging
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from ..models.events import EVENT_MODELS, CodeType
+from .distinct import DistinctTracker, HyperLogLog
+from .export import CSV_JSON_COLUMNS, SUMMARY_FIELDS
+from .rollup import DailyRollup
+
+logger = logging.getLogger(__name__)
+
+# Input formats: name -> file suffixes detected as that format
+IMPORT_FORMATS = {
+    "jsonl": (".jsonl", ".ndjson"),
+    "json": (".json",),
+    "csv": (".csv",),
+}
+
+# Records validated per chunk (one unit of work for a worker process)
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Stored fields besides the model fields kept from input records, so
+# exported compaction summaries and coalesced records import unchanged
+CARRIED_FIELDS = SUMMARY_FIELDS
+
+# Day sketches a compaction summary may carry in file_sketches
+CARRIED_SKETCHES = ("files", "ai_files")
+
+# Characters read per step when streaming a JSON array
+_JSON_READ_CHARS = 1 << 20
+
+
+def detect_format(path: Path) -> str:
+    """
+    Guess the input format of a file from its suffix.
+
+    Args:
+        path: Input file (a trailing .gz is ignored)
+
+    Returns:
+        One of IMPORT_FORMATS
+
+    Raises:
+        ValueError: If the suffix is not recognized
+    """
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes.pop()
+    for fmt, known in IMPORT_FORMATS.items():
+        if suffixes and suffixes[-1] in known:
+            return fmt
+    raise ValueError(f"Cannot tell the format of {path}, pass --format")
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[Any]:
+    """
+    Stream the records of an input file without loading it whole.
+
+    JSONL lines are passed on undecoded (workers decode them); JSON array
+    items and CSV rows are passed on as dictionaries.
+
+    Args:
+        stream: Text stream of the input
+        fmt: One of IMPORT_FORMATS
+
+    Yields:
+        Raw records in input order
+
+    Raises:
+        ValueError: If a JSON input is not an array of values
+    """
+    if fmt == "jsonl":
+        yield from stream
+    elif fmt == "json":
+        yield from _iter_json_array(stream)
+    elif fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        raise ValueError(f"Unknown import format '{fmt}'")
+
+
+def _iter_json_array(stream: IO[str]) -> Iterator[Any]:
+    """Decode the items of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def skip_whitespace() -> bool:
+        """Advance past whitespace, reading on; False at the end of input."""
+        nonlocal buffer, position, eof
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return True
+            if eof:
+                return False
+            buffer, position = stream.read(_JSON_READ_CHARS), 0
+            eof = not buffer
+
+    if not skip_whitespace() or buffer[position] != "[":
+        raise ValueError("JSON input must be an array of events")
+    position += 1
+    expect_item = True
+    while skip_whitespace():
+        char = buffer[position]
+        if char == "]" and expect_item is not None:
+            return
+        if char == "," and expect_item is False:
+            position += 1
+            expect_item = None  # an item must follow a comma
+            continue
+        if expect_item is False:
+            raise ValueError(f"Expected ',' or ']' in JSON input, got {char!r}")
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Malformed or truncated JSON input")
+                # The item continues past the buffer: read on and retry
+                chunk = stream.read(_JSON_READ_CHARS)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+        position = end
+        expect_item = False
+        yield item
+    raise ValueError("Truncated JSON input (missing ']')")
+
+
+def _csv_record(row: Dict[str, str]) -> Dict:
+    """Turn a CSV row (export column layout) into an event dictionary."""
+    record = {
+        column: value for column, value in row.items() if column and value not in ("", None)
+    }
+    for column in CSV_JSON_COLUMNS:
+        if column in record:
+            record[column] = json.loads(record[column])
+    metadata = record.pop("metadata", None)
+    # Exports derive the feature_name column from metadata
+    feature_name = record.pop("feature_name", None)
+    if feature_name and feature_name != "unknown":
+        metadata = {"feature_name": feature_name, **(metadata or {})}
+    if metadata is not None:
+        record["metadata"] = metadata
+    if "event_count" in record:
+        record["event_count"] = int(record["event_count"])
+        if record["event_count"] == 1:
+            del record["event_count"]
+    return record
+
+
+def validate_record(data: Any) -> Dict:
+    """
+    Validate a record against the model of its type and serialize it for storage.
+
+    Args:
+        data: Decoded record
+
+    Returns:
+        Event dictionary as storages write it
+
+    Raises:
+        ValueError: If the record is invalid
+    """
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    if data.get("timestamp") in (None, ""):
+        # Models default to the current time, which is wrong for history
+        raise ValueError("timestamp is required for imported events")
+    model = EVENT_MODELS[CodeType(data.get("type", CodeType.CODE.value))]
+    event = model.model_validate(data)
+    row = event.model_dump(mode="json")
+    row["timestamp"] = event.timestamp.isoformat()
+    for field in CARRIED_FIELDS:
+        if data.get(field) is not None:
+            row[field] = data[field]
+    _check_carried(row)
+    return row
+
+
+def _check_carried(row: Dict) -> None:
+    """
+    Check the carried fields of a record, so aggregating it cannot fail later.
+
+    Args:
+        row: Event dictionary with CARRIED_FIELDS copied from the input
+
+    Raises:
+        ValueError: If a carried field is malformed
+    """
+    event_count = row.get("event_count", 1)
+    if not isinstance(event_count, int) or isinstance(event_count, bool) or event_count < 1:
+        raise ValueError("event_count must be a positive integer")
+    if not isinstance(row.get("summary", False), bool):
+        raise ValueError("summary must be a boolean")
+    if "first_timestamp" in row:
+        try:
+            datetime.fromisoformat(row["first_timestamp"])
+        except (TypeError, ValueError):
+            raise ValueError("first_timestamp must be an ISO timestamp")
+
+    sketches = row.get("file_sketches")
+    if sketches is None:
+        return
+    if not isinstance(sketches, dict):
+        raise ValueError("file_sketches must be an object")
+    for name, data in sketches.items():
+        if name not in CARRIED_SKETCHES:
+            raise ValueError(f"file_sketches: unknown sketch '{name}'")
+        try:
+            HyperLogLog.unpack(data)
+        except (zlib.error, binascii.Error, KeyError, TypeError, ValueError):
+            raise ValueError(f"file_sketches.{name}: malformed sketch")
+
+
+def prepare_chunk(records: List[Any], fmt: str, first: int, aggregate: bool) -> Dict:
+    """
+    Decode and validate a chunk of records, and aggregate the valid ones.
+
+    Module-level so it can run in a worker process.
+
+    Args:
+        records: Raw records from read_records()
+        fmt: Input format
+        first: Number of the chunk's first record (line number for JSONL)
+        aggregate: Also build the sketches and rollup of the chunk
+
+    Returns:
+        Dictionary with rows (valid events, in input order), errors
+        ((record number, message) pairs), and distinct and rollup (None
+        unless aggregate)
+    """
+    rows, errors = [], []
+    distinct = DistinctTracker() if aggregate else None
+    rollup = DailyRollup() if aggregate else None
+    for number, record in enumerate(records, start=first):
+        try:
+            if fmt == "jsonl":
+                if not record.strip():
+                    continue
+                record = json.loads(record)
+            elif fmt == "csv":
+                record = _csv_record(record)
+            row = validate_record(record)
+        except ValidationError as e:
+            details = e.errors(include_url=False, include_context=False)
+            message = "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in details
+            )
+            errors.append((number, message))
+            continue
+        except (ValueError, TypeError) as e:
+            errors.append((number, str(e)))
+            continue
+        rows.append(row)
+        if aggregate:
+            distinct.observe(row)
+            rollup.observe(row)
+    return {"rows": rows, "errors": errors, "distinct": distinct, "rollup": rollup}
+
+
+def _chunks(records: Iterable[Any], size: int) -> Iterator[Tuple[int, List[Any]]]:
+    """Group records into (first record number, records) chunks."""
+    chunk: List[Any] = []
+    first = 1
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield first, chunk
+            first += len(chunk)
+            chunk = []
+    if chunk:
+        yield first, chunk
+
+
+class BulkImporter:
+    """
+    Streams validated events straight into storage, many at a time.
+
+    Chunks of records are decoded, validated with the event models and
+    aggregated into sketches and rollups in worker processes, while the
+    main process appends each finished chunk to storage with one
+    save_events() call, in input order. Per-chunk aggregates are merged
+    into the aggregates of the events already stored, so the aggregate
+    snapshot written at the end lets the backend start without rescanning
+    the history.
+
+    Meant to run with the backend stopped (from the CLI); the chunk's
+    aggregates stand in for the aggregator's listener, which stays cold.
+    """
+
+    def __init__(
+        self,
+        storage,
+        workers: int = 0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        aggregate: bool = True,
+    ):
+        """
+        Initialize importer.
+
+        Args:
+            storage: Storage events are saved to
+            workers: Worker processes (0 prepares chunks in this process)
+            chunk_size: Records per chunk
+            aggregate: Build sketches and rollups of imported events
+        """
+        if workers < 0:
+            raise ValueError("workers must not be negative")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.storage = storage
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.aggregate = aggregate
+        self.distinct = DistinctTracker()
+        self.rollup = DailyRollup()
+
+    def load_stored(self, snapshot: Optional[Dict]) -> int:
+        """
+        Aggregate the events stored before the import.
+
+        Uses the aggregate snapshot and only replays events stored after it
+        when the snapshot still matches the files; scans all events otherwise.
+
+        Args:
+            snapshot: Snapshot document (see SnapshotManager.load()), or None
+
+        Returns:
+            Number of stored events read
+        """
+        tail = None
+        if snapshot is not None:
+            try:
+                if self.storage.restore_state(snapshot["storage"]):
+                    distinct = DistinctTracker.from_dict(snapshot["aggregates"]["distinct"])
+                    rollup = DailyRollup.from_dict(snapshot["aggregates"]["rollup"])
+                    self.distinct, self.rollup = distinct, rollup
+                    tail = self.storage.iter_events_after(snapshot["storage"])
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Ignoring malformed snapshot")
+        if tail is None:
+            self.distinct, self.rollup = DistinctTracker(), DailyRollup()
+            tail = self.storage.get_all_events()
+
+        count = 0
+        for event in tail:
+            self.distinct.observe(event)
+            self.rollup.observe(event)
+            count += 1
+        return count
+
+    def run(
+        self,
+        records: Iterable[Any],
+        fmt: str,
+        progress: Optional[Callable[[Dict], None]] = None,
+    ) -> Dict:
+        """
+        Import records.
+
+        Invalid records are skipped and reported; valid records of the same
+        chunk are still imported.
+
+        Args:
+            records: Raw records from read_records()
+            fmt: Input format
+            progress: Called with running totals after every saved chunk
+
+        Returns:
+            Dictionary with read, imported and invalid counts, errors (first
+            100 as (record number, message)), seconds and events_per_second
+        """
+        started = time.perf_counter()
+        totals = {"read": 0, "imported": 0, "invalid": 0, "errors": []}
+
+        def save(prepared: Dict, size: int) -> None:
+            """Save one prepared chunk and merge its aggregates."""
+            if prepared["rows"]:
+                self.storage.save_events(prepared["rows"])
+            if self.aggregate:
+                self.distinct.merge(prepared["distinct"])
+                self.rollup.merge(prepared["rollup"])
+            totals["read"] += size
+            totals["imported"] += len(prepared["rows"])
+            totals["invalid"] += len(prepared["errors"])
+            room = 100 - len(totals["errors"])
+            totals["errors"].extend(prepared["errors"][:max(room, 0)])
+            if progress is not None:
+                progress(self._rates(totals, started))
+
+        chunks = _chunks(records, self.chunk_size)
+        if self.workers == 0:
+            for first, chunk in chunks:
+                save(prepare_chunk(chunk, fmt, first, self.aggregate), len(chunk))
+            return self._rates(totals, started)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            # Two chunks per worker in flight keeps workers busy while
+            # bounding memory; results are saved in submission order
+            pending: "deque[Tuple[Future, int]]" = deque()
+            for first, chunk in chunks:
+                pending.append(
+                    (pool.submit(prepare_chunk, chunk, fmt, first, self.aggregate), len(chunk))
+                )
+                if len(pending) >= 2 * self.workers:
+                    future, size = pending.popleft()
+                    save(future.result(), size)
+            while pending:
+                future, size = pending.popleft()
+                save(future.result(), size)
+        return self._rates(totals, started)
+
+    def aggregates(self) -> Dict:
+        """
+        Aggregates of stored and imported events, in the snapshot layout.
+
+        Returns:
+            Dictionary like MetricsAggregator.export_state()
+        """
+        return {"distinct": self.distinct.to_dict(), "rollup": self.rollup.to_dict()}
+
+    @staticmethod
+    def _rates(totals: Dict, started: float) -> Dict:
+        """Totals with elapsed seconds and throughput."""
+        seconds = time.perf_counter() - started
+        return {
+            **totals,
+            "seconds": round(seconds, 3),
+            "events_per_second": round(totals["imported"] / seconds) if seconds else 0,
+        }
@@ -0,0 +1,140 @@
+"""Cursor pagination over raw events in timestamp order."""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+from ..storage.timeline import Key, page
+from .export import parse_export_filters
+from .rollup import feature_name_of
+
+# Events per page by default and at most
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Page orders: name -> newest first
+ORDERS = {"desc": True, "asc": False}
+
+
+def encode_cursor(key: Key, order: str) -> str:
+    """
+    Encode a page key as an opaque cursor.
+
+    Args:
+        key: Key of the last event of a page
+        order: Page order the key was produced in
+
+    Returns:
+        URL-safe cursor string
+    """
+    payload = json.dumps({"k": list(key), "o": order}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str) -> Key:
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Args:
+        cursor: Cursor string
+        order: Page order of the request
+
+    Returns:
+        Page key
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for the other order
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key, cursor_order = payload["k"], payload["o"]
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError):
+        raise ValueError("Malformed cursor")
+    if (
+        not isinstance(key, list)
+        or len(key) < 3
+        or not all(isinstance(part, int) for part in key)
+    ):
+        raise ValueError("Malformed cursor")
+    if cursor_order != order:
+        raise ValueError(f"Cursor was issued for order '{cursor_order}'")
+    return tuple(key)
+
+
+def page_events(
+    storage,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    order: str = "desc",
+    types: Optional[List[str]] = None,
+    developer_ids: Optional[List[str]] = None,
+    sources: Optional[List[str]] = None,
+    languages: Optional[List[str]] = None,
+    feature_names: Optional[List[str]] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Dict:
+    """
+    Get one page of stored events matching filters, in timestamp order.
+
+    Pages are keyed by (timestamp, sequence), where the sequence orders
+    events with the same timestamp by shard, type and row. A cursor is the
+    key of a page's last event; the storage resumes right after it, so
+    events saved between requests appear on later pages (if they sort after
+    the cursor) and are never repeated. Compaction rewrites files and
+    renumbers rows, so cursors issued before it may skip or repeat events
+    with the cursor's timestamp.
+
+    Args:
+        storage: Storage to read from
+        limit: Maximum number of events (1 to MAX_PAGE_SIZE)
+        cursor: next_cursor of the previous page (None for the first page)
+        order: "desc" for newest first, "asc" for oldest first
+        types: Event types (default: all)
+        developer_ids: Developer IDs (default: all)
+        sources: Code sources (default: all)
+        languages: Programming languages (default: all)
+        feature_names: Feature names (default: all)
+        start_date: Events from this date
+        end_date: Events up to this date
+
+    Returns:
+        Dictionary with events, next_cursor (None after the last page), count
+        and keys (page key of every event, for merging pages of several stores)
+
+    Raises:
+        ValueError: If a filter, the limit, the order or the cursor is invalid
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Invalid order '{order}', expected asc or desc")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    event_types = parse_export_filters(types, sources)
+    after = decode_cursor(cursor, order) if cursor else None
+    # Keys of sharded storages carry the shard after the timestamp
+    if after is not None and len(after) != (4 if hasattr(storage, "shards") else 3):
+        raise ValueError("Cursor does not match this storage")
+
+    wanted_features = set(feature_names or [])
+    rows = page(
+        storage.page_sources(
+            event_types,
+            after,
+            ORDERS[order],
+            developer_id=developer_ids or None,
+            start_date=start_date,
+            end_date=end_date,
+            source=sources or None,
+            language=languages or None,
+        ),
+        limit,
+        ORDERS[order],
+        (lambda event: feature_name_of(event) in wanted_features) if wanted_features else None,
+    )
+    return {
+        "events": [event for _, event in rows],
+        "count": len(rows),
+        "next_cursor": encode_cursor(rows[-1][0], order) if len(rows) == limit else None,
+        "keys": [list(key) for key, _ in rows],
+    }
@@ -0,0 +1,240 @@
+"""Mergeable partial aggregates computed per storage shard or cluster node."""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from .distinct import HyperLogLog
+from .rollup import feature_name_of
+
+# {type: {source: lines}}
+LocTotals = Dict[str, Dict[str, int]]
+
+
+def add_event(totals: LocTotals, event: dict) -> None:
+    """
+    Add an event's lines to LOC totals.
+
+    Args:
+        totals: Totals to update
+        event: Event dictionary
+    """
+    by_source = totals.setdefault(event.get("type", "code"), {})
+    source = event.get("source")
+    by_source[source] = by_source.get(source, 0) + event.get("lines", 0)
+
+
+def merge_totals(into: LocTotals, other: LocTotals) -> LocTotals:
+    """
+    Add LOC totals into another set of totals.
+
+    Args:
+        into: Totals updated in place
+        other: Totals to add
+
+    Returns:
+        The updated `into`
+    """
+    for event_type, by_source in other.items():
+        target = into.setdefault(event_type, {})
+        for source, lines in by_source.items():
+            target[source] = target.get(source, 0) + lines
+    return into
+
+
+def team_partial(
+    storage,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Dict:
+    """
+    LOC totals for the whole storage and per developer.
+
+    Args:
+        storage: Storage (or shard) to aggregate
+        start_date: Start date for filtering
+        end_date: End date for filtering
+
+    Returns:
+        {"team": totals, "developers": {developer_id: totals}}
+    """
+    team: LocTotals = {}
+    developers: Dict[str, LocTotals] = {}
+    for event in storage.get_all_events(None, start_date, end_date):
+        add_event(team, event)
+        developer_id = event.get("developer_id")
+        if developer_id:
+            add_event(developers.setdefault(developer_id, {}), event)
+    return {"team": team, "developers": developers}
+
+
+def merge_team(partials: Iterable[Dict]) -> Dict:
+    """Merge team partials (LOC totals, and distinct sketches if present)."""
+    merged = {"team": {}, "developers": {}}
+    sketches: Dict[str, list] = {}
+    for partial in partials:
+        merge_totals(merged["team"], partial["team"])
+        for developer_id, totals in partial["developers"].items():
+            merge_totals(merged["developers"].setdefault(developer_id, {}), totals)
+        for dimension, sketch in partial.get("distinct", {}).items():
+            sketches.setdefault(dimension, []).append(sketch)
+    if sketches:
+        merged["distinct"] = {
+            dimension: HyperLogLog.union(parts) for dimension, parts in sketches.items()
+        }
+    return merged
+
+
+def daily_partial(
+    storage,
+    developer_id: Optional[str],
+    start_date: datetime,
+    end_date: datetime,
+) -> Dict[str, LocTotals]:
+    """
+    LOC totals per day.
+
+    Args:
+        storage: Storage (or shard) to aggregate
+        developer_id: Optional developer ID to filter
+        start_date: Start date for filtering
+        end_date: End date for filtering
+
+    Returns:
+        ISO date -> totals
+    """
+    days: Dict[str, LocTotals] = {}
+    for event in storage.get_all_events(developer_id, start_date, end_date):
+        day = datetime.fromisoformat(event["timestamp"]).date().isoformat()
+        add_event(days.setdefault(day, {}), event)
+    return days
+
+
+def merge_daily(partials: Iterable[Dict[str, LocTotals]]) -> Dict[str, LocTotals]:
+    """Merge daily_partial() results."""
+    merged: Dict[str, LocTotals] = {}
+    for partial in partials:
+        for day, totals in partial.items():
+            merge_totals(merged.setdefault(day, {}), totals)
+    return merged
+
+
+def feature_partial(storage) -> Dict[str, Dict]:
+    """
+    Per-feature LOC counts and last update.
+
+    Args:
+        storage: Storage (or shard) to aggregate
+
+    Returns:
+        Feature name -> feature entry as returned by feature metrics
+    """
+    features: Dict[str, Dict] = {}
+    for event in storage.get_all_events():
+        feature_name = feature_name_of(event)
+        entry = features.get(feature_name)
+        if entry is None:
+            entry = {
+                "feature_name": feature_name,
+                "total_loc": 0,
+                "code_loc": 0,
+                "test_loc": 0,
+                "doc_loc": 0,
+                "event_count": 0,
+                "last_updated": None,
+            }
+            features[feature_name] = entry
+
+        lines = event.get("lines", 0)
+        entry["total_loc"] += lines
+        # Compacted summary records stand for event_count events
+        entry["event_count"] += event.get("event_count", 1)
+
+        # Track by type
+        event_type = event.get("type", "code")
+        if event_type == "code":
+            entry["code_loc"] += lines
+        elif event_type == "test":
+            entry["test_loc"] += lines
+        elif event_type == "documentation":
+            entry["doc_loc"] += lines
+
+        # Track last updated timestamp
+        event_timestamp = event.get("timestamp", "")
+        if event_timestamp and (
+            entry["last_updated"] is None or event_timestamp > entry["last_updated"]
+        ):
+            entry["last_updated"] = event_timestamp
+    return features
+
+
+def merge_features(partials: Iterable[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Merge feature_partial() results."""
+    merged: Dict[str, Dict] = {}
+    for partial in partials:
+        for feature_name, entry in partial.items():
+            target = merged.get(feature_name)
+            if target is None:
+                merged[feature_name] = dict(entry)
+                continue
+            for key in ("total_loc", "code_loc", "test_loc", "doc_loc", "event_count"):
+                target[key] += entry[key]
+            if entry["last_updated"] and (
+                target["last_updated"] is None
+                or entry["last_updated"] > target["last_updated"]
+            ):
+                target["last_updated"] = entry["last_updated"]
+    return merged
+
+
+def merge_trends(partials: Iterable[Dict]) -> Dict:
+    """Merge trend partials (daily totals, and developer sketches if present)."""
+    partials = list(partials)
+    merged = {"days": merge_daily(partial["days"] for partial in partials)}
+    sketches: Dict[str, list] = {}
+    for partial in partials:
+        for day, sketch in partial.get("active_developers", {}).items():
+            sketches.setdefault(day, []).append(sketch)
+    if any("active_developers" in partial for partial in partials):
+        merged["active_developers"] = {
+            day: HyperLogLog.union(parts) for day, parts in sketches.items()
+        }
+    return merged
+
+
+def _encode_sketches(partial: Dict, key: str) -> Dict:
+    """Copy of a partial with the sketches under `key` base64-encoded."""
+    if key not in partial:
+        return partial
+    encoded = dict(partial)
+    encoded[key] = {name: sketch.encode() for name, sketch in partial[key].items()}
+    return encoded
+
+
+def _decode_sketches(partial: Dict, key: str) -> Dict:
+    """Copy of a partial with the sketches under `key` decoded."""
+    if key not in partial:
+        return partial
+    decoded = dict(partial)
+    decoded[key] = {
+        name: HyperLogLog.decode(data) for name, data in partial[key].items()
+    }
+    return decoded
+
+
+def encode_team(partial: Dict) -> Dict:
+    """JSON-compatible form of a team partial."""
+    return _encode_sketches(partial, "distinct")
+
+
+def decode_team(partial: Dict) -> Dict:
+    """Team partial from its JSON form."""
+    return _decode_sketches(partial, "distinct")
+
+
+def encode_trends(partial: Dict) -> Dict:
+    """JSON-compatible form of a trends partial."""
+    return _encode_sketches(partial, "active_developers")
+
+
+def decode_trends(partial: Dict) -> Dict:
+    """Trends partial from its JSON form."""
+    return _decode_sketches(partial, "active_developers")
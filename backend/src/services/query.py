@@ -0,0 +1,251 @@
+"""Generic group-by aggregation over event dimensions."""
+
+from datetime import datetime, time
+from pathlib import PurePosixPath
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from ..models.events import CodeSource, CodeType
+from ..storage.json_storage import JSONStorage
+from .rollup import ROLLUP_DIMENSIONS, DailyRollup, feature_name_of
+
+# Hard cap on the number of groups a single query may build
+MAX_GROUPS = 10000
+
+# Label of the group that absorbs everything beyond the group cap
+OVERFLOW_GROUP = "__other__"
+
+
+def _file_extension(event: dict) -> Optional[str]:
+    suffix = PurePosixPath(event.get("file_path") or "").suffix.lower()
+    return suffix or None
+
+
+def _event_date(event: dict) -> Optional[str]:
+    timestamp = event.get("timestamp")
+    return timestamp[:10] if timestamp else None
+
+
+# Dimension name -> value extractor for raw events
+DIMENSIONS: Dict[str, Callable[[dict], Optional[str]]] = {
+    "date": _event_date,
+    "month": lambda e: (_event_date(e) or "")[:7] or None,
+    "developer_id": lambda e: e.get("developer_id"),
+    "type": lambda e: e.get("type", "code"),
+    "source": lambda e: e.get("source"),
+    "language": lambda e: e.get("language"),
+    "file_extension": _file_extension,
+    "test_framework": lambda e: e.get("test_framework"),
+    "doc_type": lambda e: e.get("doc_type"),
+    "feature_name": feature_name_of,
+}
+
+MEASURES = (
+    "lines",
+    "events",
+    "ai_lines",
+    "completion_lines",
+    "agent_lines",
+    "manual_lines",
+    "ai_percentage",
+)
+
+# Accumulator slots: lines, events, completion, agent, manual
+_SOURCE_SLOTS = {
+    CodeSource.COMPLETION.value: 2,
+    CodeSource.AGENT.value: 3,
+    CodeSource.MANUAL.value: 4,
+}
+
+# Dimensions answerable from the daily rollup ("month" derives from "date")
+_ROLLUP_ANSWERABLE = set(ROLLUP_DIMENSIONS) | {"month"}
+
+
+class QueryEngine:
+    """Single-pass group-by aggregation over events or the daily rollup."""
+
+    def __init__(self, storage: JSONStorage, rollup: Optional[DailyRollup] = None):
+        """
+        Initialize query engine.
+
+        Args:
+            storage: Event storage instance
+            rollup: Optional daily rollup used when it can answer a query
+        """
+        self.storage = storage
+        self.rollup = rollup
+
+    def run(
+        self,
+        group_by: List[str],
+        measures: Optional[List[str]] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> Dict:
+        """
+        Aggregate measures grouped by dimensions.
+
+        Args:
+            group_by: Dimension names to group by
+            measures: Measure names to return (default: lines and events)
+            filters: Dimension name -> accepted values (equality, OR within a dimension)
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            limit: Maximum number of rows returned (largest groups first)
+
+        Returns:
+            Dictionary with result rows and execution details
+
+        Raises:
+            ValueError: If a dimension or measure is unknown
+        """
+        measures = measures or ["lines", "events"]
+        filters = filters or {}
+
+        unknown = [d for d in list(group_by) + list(filters) if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}")
+        unknown = [m for m in measures if m not in MEASURES]
+        if unknown:
+            raise ValueError(f"Unknown measure(s): {', '.join(unknown)}")
+
+        accepted = {dim: set(values) for dim, values in filters.items()}
+
+        if self._can_use_rollup(group_by, accepted, start_date, end_date):
+            plan = "rollup"
+            groups, truncated = self._aggregate(
+                self._rollup_rows(start_date), group_by, accepted
+            )
+        else:
+            plan = "events"
+            groups, truncated = self._aggregate(
+                self._event_rows(accepted, start_date, end_date), group_by, accepted
+            )
+
+        # Largest groups first
+        ordered = sorted(groups.items(), key=lambda item: item[1][0], reverse=True)
+        rows = []
+        for key, acc in ordered[:limit]:
+            row = dict(zip(group_by, key))
+            row.update(self._measures(acc, measures))
+            rows.append(row)
+
+        return {
+            "group_by": group_by,
+            "measures": measures,
+            "filters": {dim: sorted(values) for dim, values in accepted.items()},
+            "period": {
+                "start": start_date.isoformat() if start_date else None,
+                "end": end_date.isoformat() if end_date else None,
+            },
+            "rows": rows,
+            "total_groups": len(groups),
+            "truncated": truncated,
+            "plan": plan,
+        }
+
+    def _can_use_rollup(
+        self,
+        group_by: List[str],
+        accepted: Dict[str, set],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> bool:
+        """Check whether the rollup alone can answer a query exactly."""
+        if self.rollup is None:
+            return False
+        if not set(group_by) | set(accepted) <= _ROLLUP_ANSWERABLE:
+            return False
+        # Rollup cells are whole days, so only day-aligned open-ended ranges match
+        if start_date and start_date.time() != time(0, 0):
+            return False
+        return end_date is None
+
+    def _rollup_rows(
+        self, start_date: Optional[datetime]
+    ) -> Iterable[Tuple[Callable[[str], Optional[str]], int, int]]:
+        """Yield (dimension getter, lines, events) per rollup cell."""
+        start = start_date.date() if start_date else None
+        for values, lines, events in self.rollup.iter_cells(start):
+            values["month"] = values["date"][:7]
+            yield values.get, lines, events
+
+    def _event_rows(
+        self,
+        accepted: Dict[str, set],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> Iterable[Tuple[Callable[[str], Optional[str]], int, int]]:
+        """Yield (dimension getter, lines, events) per raw event."""
+        # Push type and date filters down to storage, indexed fields to its bitmaps
+        known_types = {t.value for t in CodeType}
+        event_types = [
+            CodeType(t) for t in accepted.get("type", known_types) if t in known_types
+        ]
+
+        for event_type in event_types:
+            events = self.storage.load_events(
+                event_type,
+                accepted.get("developer_id"),
+                start_date,
+                end_date,
+                source=accepted.get("source"),
+                language=accepted.get("language"),
+            )
+            for event in events:
+                get = lambda dim, e=event: DIMENSIONS[dim](e)
+                yield get, event.get("lines", 0), event.get("event_count", 1)
+
+    def _aggregate(
+        self,
+        rows: Iterable[Tuple[Callable[[str], Optional[str]], int, int]],
+        group_by: List[str],
+        accepted: Dict[str, set],
+    ) -> Tuple[Dict[Tuple, list], bool]:
+        """
+        Fold rows into per-group accumulators in a single pass.
+
+        Groups beyond MAX_GROUPS are merged into one overflow group so totals
+        stay correct while memory stays bounded.
+        """
+        groups: Dict[Tuple, list] = {}
+        overflow_key = tuple(OVERFLOW_GROUP for _ in group_by)
+        truncated = False
+
+        for get, lines, events in rows:
+            if any(get(dim) not in values for dim, values in accepted.items()):
+                continue
+
+            key = tuple(get(dim) for dim in group_by)
+            acc = groups.get(key)
+            if acc is None:
+                if len(groups) >= MAX_GROUPS:
+                    truncated = True
+                    key = overflow_key
+                    acc = groups.get(key)
+                if acc is None:
+                    acc = [0, 0, 0, 0, 0]
+                    groups[key] = acc
+
+            acc[0] += lines
+            acc[1] += events
+            slot = _SOURCE_SLOTS.get(get("source"))
+            if slot is not None:
+                acc[slot] += lines
+
+        return groups, truncated
+
+    def _measures(self, acc: list, measures: List[str]) -> Dict:
+        """Compute requested measures from an accumulator."""
+        lines, events, completion, agent, manual = acc
+        ai_lines = completion + agent
+        values = {
+            "lines": lines,
+            "events": events,
+            "ai_lines": ai_lines,
+            "completion_lines": completion,
+            "agent_lines": agent,
+            "manual_lines": manual,
+            "ai_percentage": round(ai_lines / lines * 100, 2) if lines > 0 else 0.0,
+        }
+        return {m: values[m] for m in measures}
@@ -0,0 +1,159 @@
+"""Cache of serialized, optionally gzip-compressed metrics responses."""
+
+import gzip
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from ..instrumentation import record_cache
+
+# Bodies smaller than this are sent uncompressed (gzip overhead outweighs the savings)
+GZIP_MIN_BYTES = 1024
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Whether an Accept-Encoding header allows a gzip response.
+
+    Args:
+        accept_encoding: Header value (None if absent)
+
+    Returns:
+        True if gzip (or *) is listed without q=0
+    """
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip() not in ("gzip", "*"):
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class _Entry:
+    """Serialized response body with its gzip variant and their validators."""
+
+    __slots__ = ("version", "created", "body", "gzipped", "etag", "gzip_etag")
+
+    def __init__(self, version: Hashable, body: bytes):
+        self.version = version
+        self.created = time.monotonic()
+        self.body = body
+        self.gzipped = (
+            gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        )
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+        # Strong ETags must differ between representations (RFC 9110 8.8.3)
+        self.gzip_etag = f'"{digest}-gz"'
+
+
+class ResponseCache:
+    """
+    LRU cache of final JSON response bytes per request.
+
+    Entries are keyed by path and query parameters and tagged with the data
+    version they were built from; an entry is reused while the version is
+    unchanged (or, with ``max_staleness``, for that many seconds after it
+    changed). Each entry keeps the encoded body, its gzip-compressed
+    variant and an ETag for each, so a hit costs no JSON encoding or
+    compression: clients sending ``Accept-Encoding: gzip`` get the
+    compressed bytes, and ``If-None-Match`` with the ETag of the variant
+    they would get gets an empty 304.
+    """
+
+    def __init__(
+        self,
+        version: Callable[[], Hashable],
+        max_entries: int = 256,
+        max_staleness: float = 0.0,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            version: Returns the current data version (any hashable value
+                that changes whenever the stored data changes)
+            max_entries: Responses kept (0 disables caching)
+            max_staleness: Seconds an entry built from an older data
+                version may still be served (0 serves only exact versions)
+        """
+        self.version = version
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+
+    def clear(self) -> None:
+        """Drop all cached responses (after files were rewritten)."""
+        self._entries.clear()
+
+    def respond(
+        self,
+        request: Request,
+        build: Callable[[], Dict],
+        extra: Tuple = (),
+    ) -> Response:
+        """
+        Serve a request from the cache, building and caching the payload on a miss.
+
+        Errors raised by `build` propagate and nothing is cached.
+
+        Args:
+            request: Incoming request (path, query and negotiation headers)
+            build: Computes the response payload
+            extra: Further key components, for payloads that also depend on
+                something besides the query and data (e.g. the current time)
+
+        Returns:
+            JSON response, gzip-encoded if accepted, or 304 if not modified
+        """
+        # Parameter order is kept: repeated parameters like group_by are ordered
+        key = (request.url.path, tuple(request.query_params.multi_items()), *extra)
+        version = self.version()
+        entry = self._entries.get(key)
+        if entry is not None and (
+            entry.version == version
+            or time.monotonic() - entry.created < self.max_staleness
+        ):
+            self._entries.move_to_end(key)
+            record_cache("response", hit=True)
+        else:
+            record_cache("response", hit=False)
+            entry = _Entry(version, self._encode(build()))
+            if self.max_entries > 0:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        gzipped = entry.gzipped is not None and accepts_gzip(
+            request.headers.get("accept-encoding")
+        )
+        etag = entry.gzip_etag if gzipped else entry.etag
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+            return Response(entry.gzipped, media_type="application/json", headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _encode(payload: Dict) -> bytes:
+        """Encode a payload the way FastAPI's JSONResponse does."""
+        return json.dumps(
+            jsonable_encoder(payload),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -0,0 +1,152 @@
+"""Per-day rollup of event counters."""
+
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Dimensions kept by the rollup, in key order
+ROLLUP_DIMENSIONS = ("date", "developer_id", "type", "source", "language", "feature_name")
+
+
+def feature_name_of(event: dict) -> str:
+    """
+    Extract the feature name of an event the same way feature metrics do.
+
+    Args:
+        event: Event dictionary
+
+    Returns:
+        Feature name, or "unknown" if the event has none
+    """
+    metadata = event.get("metadata") or {}
+    feature_name = metadata.get("feature_name") if isinstance(metadata, dict) else None
+    return feature_name or "unknown"
+
+
+def rollup_key(event: dict) -> Optional[Tuple]:
+    """
+    Rollup cell key of an event, in ROLLUP_DIMENSIONS order.
+
+    Args:
+        event: Event dictionary as stored
+
+    Returns:
+        Key tuple (the date as a date), or None if the timestamp is invalid
+    """
+    try:
+        day = datetime.fromisoformat(event["timestamp"]).date()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return (
+        day,
+        event.get("developer_id"),
+        event.get("type", "code"),
+        event.get("source"),
+        event.get("language"),
+        feature_name_of(event),
+    )
+
+
+class DailyRollup:
+    """
+    Pre-aggregated line and event counts per ROLLUP_DIMENSIONS key.
+
+    Each cell holds ``[lines, events]`` for one (date, developer, type, source,
+    language, feature) combination, so queries over those dimensions never
+    touch raw events.
+    """
+
+    def __init__(self):
+        """Initialize an empty rollup."""
+        self.cells: Dict[Tuple, list] = {}
+
+    def observe(self, event: dict) -> None:
+        """
+        Add an event to its rollup cell.
+
+        Args:
+            event: Event dictionary as stored
+        """
+        key = rollup_key(event)
+        if key is None:
+            return
+
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = [0, 0]
+            self.cells[key] = cell
+        cell[0] += event.get("lines", 0)
+        cell[1] += event.get("event_count", 1)
+
+    def merge(self, other: "DailyRollup") -> None:
+        """
+        Add the cells of another rollup (e.g. built from another batch of events).
+
+        Args:
+            other: Rollup to fold into this one
+        """
+        for key, (lines, events) in other.cells.items():
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [lines, events]
+            else:
+                cell[0] += lines
+                cell[1] += events
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the rollup for a snapshot.
+
+        Returns:
+            JSON-compatible dictionary with one row per cell
+        """
+        return {
+            "cells": [
+                [day.isoformat(), *rest, lines, events]
+                for (day, *rest), (lines, events) in self.cells.items()
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DailyRollup":
+        """
+        Restore a rollup serialized with to_dict().
+
+        Args:
+            data: Serialized rollup
+
+        Returns:
+            Restored rollup
+        """
+        rollup = cls()
+        width = len(ROLLUP_DIMENSIONS)
+        for row in data["cells"]:
+            key: List = list(row[:width])
+            key[0] = date.fromisoformat(key[0])
+            rollup.cells[tuple(key)] = [row[width], row[width + 1]]
+        return rollup
+
+    def iter_cells(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[Tuple[Dict, int, int]]:
+        """
+        Iterate rollup cells within an inclusive date range.
+
+        Args:
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Yields:
+            Tuples of (dimension values, lines, events)
+        """
+        for key, (lines, events) in self.cells.items():
+            day = key[0]
+            if start and day < start:
+                continue
+            if end and day > end:
+                continue
+            values = dict(zip(ROLLUP_DIMENSIONS, key))
+            values["date"] = day.isoformat()
+            yield values, lines, events
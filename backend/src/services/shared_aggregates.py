@@ -0,0 +1,668 @@
+"""
+Distinct sketches and daily rollup shared by worker processes.
+
+With several uvicorn workers each process would otherwise build and hold its
+own copy of the aggregates, and copies drift apart between syncs. Here one
+worker, elected through a file lock, writes them into a
+``multiprocessing.shared_memory`` region and every worker (the writer
+included) answers from that region, so memory stays flat as workers are
+added and all workers return the same numbers.
+
+Region layout (little-endian):
+
+    header     magic, sequence, precision, days / day capacity,
+               cells / cell capacity, string bytes / string capacity
+    day table  day ordinal per day slot
+    sketches   registers per day slot and distinct dimension
+    cells      day ordinal, string ids of the other rollup dimensions, lines, events
+    strings    length-prefixed UTF-8 strings; a string's id is its offset
+
+The writer makes the sequence odd while it changes the region and even again
+when done; readers copy what they need and retry if the sequence moved
+(a seqlock), so reads never wait for a lock. A region that runs out of
+capacity is replaced by a larger one: a small control region holds the
+generation of the current data region, which readers follow.
+"""
+
+import hashlib
+import logging
+import struct
+import sys
+import threading
+from array import array
+from datetime import date
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .distinct import DEFAULT_PRECISION, DistinctTracker, HyperLogLog
+from .rollup import ROLLUP_DIMENSIONS, DailyRollup
+
+logger = logging.getLogger(__name__)
+
+# Control region: magic, generation of the current data region (0: none yet)
+_CONTROL = struct.Struct("<8sQ")
+_CONTROL_MAGIC = b"LOCCTL01"
+
+# Data region header: magic, sequence, then precision and used/capacity of
+# day slots, cells and string bytes
+_HEADER = struct.Struct("<8sQ7I")
+_DATA_MAGIC = b"LOCAGG01"
+_SEQUENCE = struct.Struct("<Q")
+_SEQUENCE_AT = 8
+
+# Rollup cell: day ordinal, string ids of the other dimensions, lines, events
+_CELL = struct.Struct(f"<i{len(ROLLUP_DIMENSIONS) - 1}Iqq")
+_LENGTH = struct.Struct("<H")
+
+# String id of None
+_NONE = 0xFFFFFFFF
+
+# Smallest capacities of a data region; regions are sized for twice their content
+MIN_DAYS = 64
+MIN_CELLS = 4096
+MIN_STRING_BYTES = 64 * 1024
+
+# Attempts of a read that finds the region being written before giving up.
+# Reads run on the event loop, so they retry right away and never sleep.
+READ_ATTEMPTS = 100
+
+# Python 3.13 can attach shared memory without the resource tracker
+_UNTRACKED = sys.version_info >= (3, 13)
+
+
+class AggregatesUnavailable(RuntimeError):
+    """Shared aggregates are not published yet or could not be read consistently."""
+
+
+def _open_region(name: str, size: int = 0) -> shared_memory.SharedMemory:
+    """
+    Create (size > 0) or attach a shared memory region that outlives this process.
+
+    The resource tracker would unlink regions when the process that created or
+    attached them exits, while other workers still use them.
+    """
+    if _UNTRACKED:
+        return shared_memory.SharedMemory(name, create=size > 0, size=size, track=False)
+    region = shared_memory.SharedMemory(name, create=size > 0, size=size)
+    resource_tracker.unregister(region._name, "shared_memory")
+    return region
+
+
+def _unlink_region(name: str) -> None:
+    """Remove a region's name; processes mapping it keep it until they let go."""
+    try:
+        region = _open_region(name)
+    except FileNotFoundError:
+        return
+    if not _UNTRACKED:
+        # unlink() unregisters from the resource tracker, which must know the name
+        resource_tracker.register(region._name, "shared_memory")
+    region.unlink()
+    region.close()
+
+
+def _layout(
+    precision: int, day_capacity: int, cell_capacity: int, string_capacity: int
+) -> Tuple[int, int, int, int, int]:
+    """Offsets of the day table, sketches, cells and strings, and the region size."""
+    day_table = _HEADER.size
+    sketches = day_table + 4 * day_capacity
+    cells = sketches + day_capacity * len(DistinctTracker.DIMENSIONS) * (1 << precision)
+    strings = cells + cell_capacity * _CELL.size
+    return day_table, sketches, cells, strings, strings + string_capacity
+
+
+def _encoded(value: str) -> bytes:
+    """Length-prefixed UTF-8 form of a string in the string table."""
+    data = value.encode("utf-8")[:0xFFFF]
+    return _LENGTH.pack(len(data)) + data
+
+
+class SharedAggregates:
+    """
+    Distinct sketches and rollup cells in shared memory.
+
+    Offers the read interface of DistinctTracker (merged(), day_sketches())
+    and DailyRollup (iter_cells()) to every process; only the process holding
+    the writer lock may publish() or update().
+    """
+
+    DIMENSIONS = DistinctTracker.DIMENSIONS
+
+    def __init__(self, name: str, lock_path: Path, precision: int = DEFAULT_PRECISION):
+        """
+        Initialize access to shared aggregates (nothing is attached yet).
+
+        Args:
+            name: Shared memory name prefix (short: macOS allows 31 characters)
+            lock_path: File locked by the writer process
+            precision: HyperLogLog precision of published sketches
+        """
+        self.name = name
+        self.lock_path = Path(lock_path)
+        self.precision = precision
+
+        self._control: Optional[shared_memory.SharedMemory] = None
+        # Attached data region, its generation and the strings decoded from it
+        self._region: Optional[shared_memory.SharedMemory] = None
+        self._generation = 0
+        self._strings: Dict[int, Optional[str]] = {_NONE: None}
+        self._attach_lock = threading.Lock()
+
+        # Writer only: the open lock file and slots of the current region
+        self._lock_file = None
+        self._day_slots: Dict[int, int] = {}
+        self._cell_slots: Dict[Tuple, int] = {}
+        self._string_ids: Dict[str, int] = {}
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of every distinct estimate."""
+        return 1.04 / (1 << self.precision) ** 0.5
+
+    @property
+    def is_writer(self) -> bool:
+        """Whether this process holds the writer lock."""
+        return self._lock_file is not None
+
+    def try_acquire_writer(self) -> bool:
+        """
+        Become the writer unless another process is.
+
+        The lock is released by release_writer() or when the process exits,
+        so a surviving worker takes over from a writer that died.
+
+        Returns:
+            True if this process is the writer
+        """
+        import fcntl
+
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "a+b")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info("Writing shared aggregates %s", self.name)
+        return True
+
+    def release_writer(self) -> None:
+        """Let another process become the writer (the published region stays)."""
+        if self._lock_file is None:
+            return
+        self._day_slots.clear()
+        self._cell_slots.clear()
+        self._string_ids.clear()
+        self._lock_file.close()
+        self._lock_file = None
+
+    def close(self) -> None:
+        """Release the writer lock and detach from the regions."""
+        self.release_writer()
+        with self._attach_lock:
+            self._region = self._control = None
+            self._generation = 0
+            self._strings = {_NONE: None}
+
+    @property
+    def published(self) -> bool:
+        """Whether a writer has published aggregates (possibly by an earlier run)."""
+        return self._attach() is not None
+
+    @property
+    def sequence(self) -> int:
+        """Number that changes whenever the published aggregates change."""
+        attached = self._attach()
+        if attached is None:
+            return 0
+        region, _ = attached
+        return self._generation << 32 | _SEQUENCE.unpack_from(region.buf, _SEQUENCE_AT)[0]
+
+    def _control_region(self, create: bool) -> Optional[shared_memory.SharedMemory]:
+        """Attach (or create) the control region."""
+        if self._control is None:
+            try:
+                self._control = _open_region(f"{self.name}-ctl")
+            except FileNotFoundError:
+                if not create:
+                    return None
+                try:
+                    self._control = _open_region(f"{self.name}-ctl", _CONTROL.size)
+                    _CONTROL.pack_into(self._control.buf, 0, _CONTROL_MAGIC, 0)
+                except FileExistsError:
+                    self._control = _open_region(f"{self.name}-ctl")
+        return self._control
+
+    def _attach(self) -> Optional[Tuple[shared_memory.SharedMemory, Dict]]:
+        """
+        Attach the current data region, following the control region.
+
+        Returns:
+            (region, strings decoded from it), or None if nothing was published
+        """
+        with self._attach_lock:
+            control = self._control_region(create=False)
+            if control is None:
+                return None
+            magic, generation = _CONTROL.unpack_from(control.buf)
+            if magic != _CONTROL_MAGIC or not generation:
+                return None
+            if generation != self._generation:
+                try:
+                    region = _open_region(f"{self.name}-{generation}")
+                except FileNotFoundError:
+                    # Replaced again meanwhile; the next attempt follows
+                    return None
+                if bytes(region.buf[:8]) != _DATA_MAGIC:
+                    return None
+                # Older regions are released once no read uses them any more
+                self._region, self._generation, self._strings = region, generation, {_NONE: None}
+            return self._region, self._strings
+
+    def _read(self, copy: Callable, decode: Optional[Callable] = None):
+        """
+        Copy data out of the current region consistently.
+
+        Args:
+            copy: Called with (region buffer, header fields); must copy what it
+                reads (no views of the buffer may outlive the call)
+            decode: Called with (copied data, region buffer, strings cache) once
+                the copy is known to be consistent; may read the immutable
+                string table
+
+        Returns:
+            Result of decode, or of copy if decode is None
+
+        Raises:
+            AggregatesUnavailable: If nothing is published yet, or the writer
+                kept changing the region during READ_ATTEMPTS attempts
+        """
+        for _ in range(READ_ATTEMPTS):
+            attached = self._attach()
+            if attached is None:
+                raise AggregatesUnavailable(f"Shared aggregates {self.name} are not published yet")
+            region, strings = attached
+            buf = region.buf
+            sequence = _SEQUENCE.unpack_from(buf, _SEQUENCE_AT)[0]
+            if sequence & 1:
+                continue
+            try:
+                data = copy(buf, _HEADER.unpack_from(buf)[2:])
+            except (struct.error, ValueError, IndexError):
+                # Torn by the writer, unless the sequence did not move
+                data = None
+            if _SEQUENCE.unpack_from(buf, _SEQUENCE_AT)[0] == sequence:
+                if data is None:
+                    raise ValueError(f"Shared aggregates {self.name} are corrupt")
+                return data if decode is None else decode(data, buf, strings)
+        raise AggregatesUnavailable(f"Shared aggregates {self.name} are being written")
+
+    @staticmethod
+    def _select_days(buf, header: Tuple, start: Optional[date], end: Optional[date]):
+        """Day ordinals and slots of the header's days within an inclusive range."""
+        precision, days, day_capacity, _, cell_capacity, _, string_capacity = header
+        day_table, sketches, *_ = _layout(precision, day_capacity, cell_capacity, string_capacity)
+        ordinals = array("i", bytes(buf[day_table : day_table + 4 * days]))
+        first = start.toordinal() if start else -(2**31)
+        last = end.toordinal() if end else 2**31 - 1
+        return [
+            (ordinal, slot) for slot, ordinal in enumerate(ordinals) if first <= ordinal <= last
+        ], sketches
+
+    def _sketch_at(self, header: Tuple, sketches: int, slot: int, dimension: int) -> int:
+        """Offset of the registers of a day slot's sketch."""
+        size = 1 << header[0]
+        return sketches + (slot * len(self.DIMENSIONS) + dimension) * size
+
+    def merged(
+        self,
+        dimension: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> HyperLogLog:
+        """
+        Merge the day sketches of a dimension over an inclusive date range.
+
+        Args:
+            dimension: One of DIMENSIONS
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Returns:
+            Merged sketch
+        """
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unknown distinct dimension: {dimension}")
+        index = self.DIMENSIONS.index(dimension)
+
+        def copy(buf, header):
+            slots, sketches = self._select_days(buf, header, start, end)
+            size = 1 << header[0]
+            registers = [
+                buf[at : at + size]
+                for at in (self._sketch_at(header, sketches, slot, index) for _, slot in slots)
+            ]
+            try:
+                if len(registers) == 1:
+                    return header[0], bytearray(registers[0])
+                return header[0], bytearray(map(max, *registers) if registers else size)
+            finally:
+                for view in registers:
+                    view.release()
+
+        precision, registers = self._read(copy)
+        sketch = HyperLogLog(precision)
+        sketch.registers = registers
+        return sketch
+
+    def day_sketches(
+        self,
+        dimension: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Dict[date, HyperLogLog]:
+        """
+        Get copies of the day sketches of a dimension within an inclusive date range.
+
+        Args:
+            dimension: One of DIMENSIONS
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Returns:
+            Day -> sketch
+        """
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unknown distinct dimension: {dimension}")
+        index = self.DIMENSIONS.index(dimension)
+
+        def copy(buf, header):
+            slots, sketches = self._select_days(buf, header, start, end)
+            size = 1 << header[0]
+            result = {}
+            for ordinal, slot in slots:
+                at = self._sketch_at(header, sketches, slot, index)
+                sketch = HyperLogLog(header[0])
+                sketch.registers = bytearray(buf[at : at + size])
+                result[date.fromordinal(ordinal)] = sketch
+            return result
+
+        return self._read(copy)
+
+    def iter_cells(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[Tuple[Dict, int, int]]:
+        """
+        Iterate rollup cells within an inclusive date range.
+
+        Args:
+            start: First day to include (None for unbounded)
+            end: Last day to include (None for unbounded)
+
+        Yields:
+            Tuples of (dimension values, lines, events)
+        """
+        first = start.toordinal() if start else -(2**31)
+        last = end.toordinal() if end else 2**31 - 1
+
+        def copy(buf, header):
+            precision, _, day_capacity, cells, cell_capacity, _, string_capacity = header
+            _, _, cells_at, strings_at, _ = _layout(
+                precision, day_capacity, cell_capacity, string_capacity
+            )
+            records = bytes(buf[cells_at : cells_at + cells * _CELL.size])
+            return strings_at, [
+                record for record in _CELL.iter_unpack(records) if first <= record[0] <= last
+            ]
+
+        def decode(data, buf, strings):
+            strings_at, records = data
+            # Strings are decoded once per region and cached
+            for string_id in {string_id for record in records for string_id in record[1:-2]}:
+                if string_id not in strings:
+                    at = strings_at + string_id
+                    (length,) = _LENGTH.unpack_from(buf, at)
+                    strings[string_id] = str(
+                        buf[at + _LENGTH.size : at + _LENGTH.size + length], "utf-8", "replace"
+                    )
+            days = {
+                ordinal: date.fromordinal(ordinal).isoformat()
+                for ordinal in {record[0] for record in records}
+            }
+            name = strings.__getitem__
+            # A dict display is much faster than dict(zip(ROLLUP_DIMENSIONS, ...))
+            return [
+                (
+                    {
+                        "date": days[ordinal],
+                        "developer_id": name(developer_id),
+                        "type": name(event_type),
+                        "source": name(source),
+                        "language": name(language),
+                        "feature_name": name(feature_name),
+                    },
+                    lines,
+                    events,
+                )
+                for (
+                    ordinal,
+                    developer_id,
+                    event_type,
+                    source,
+                    language,
+                    feature_name,
+                    lines,
+                    events,
+                ) in records
+            ]
+
+        yield from self._read(copy, decode)
+
+    def publish(self, distinct: DistinctTracker, rollup: DailyRollup) -> None:
+        """
+        Write complete aggregates into a new region and make it current.
+
+        Readers switch to the new region on their next read; the previous one
+        is unlinked and freed once no process maps it any more.
+
+        Args:
+            distinct: Sketches to publish
+            rollup: Rollup to publish
+        """
+        if not self.is_writer:
+            raise RuntimeError("Only the writer process publishes shared aggregates")
+
+        strings = {value for key in rollup.cells for value in key[1:] if value is not None}
+        string_bytes = sum(len(_encoded(value)) for value in strings)
+        capacities = (
+            max(MIN_DAYS, 2 * len(distinct.buckets)),
+            max(MIN_CELLS, 2 * len(rollup.cells)),
+            max(MIN_STRING_BYTES, 2 * string_bytes),
+        )
+        size = _layout(distinct.precision, *capacities)[-1]
+
+        control = self._control_region(create=True)
+        _, previous = _CONTROL.unpack_from(control.buf)
+        generation = previous + 1
+        name = f"{self.name}-{generation}"
+        try:
+            region = _open_region(name, size)
+        except FileExistsError:
+            # Left behind by a writer that died while publishing
+            _unlink_region(name)
+            region = _open_region(name, size)
+
+        _HEADER.pack_into(
+            region.buf,
+            0,
+            _DATA_MAGIC,
+            0,
+            distinct.precision,
+            0,
+            capacities[0],
+            0,
+            capacities[1],
+            0,
+            capacities[2],
+        )
+        self._day_slots.clear()
+        self._cell_slots.clear()
+        self._string_ids.clear()
+        self._write(region.buf, distinct.buckets, rollup.cells)
+
+        _CONTROL.pack_into(control.buf, 0, _CONTROL_MAGIC, generation)
+        if previous:
+            _unlink_region(f"{self.name}-{previous}")
+        with self._attach_lock:
+            self._region, self._generation, self._strings = region, generation, {_NONE: None}
+        self.precision = distinct.precision
+
+    def update(self, distinct: DistinctTracker, rollup: DailyRollup, keys: Iterable[Tuple]) -> None:
+        """
+        Copy changed cells and the sketches of their days into the current region.
+
+        Publishes a larger region instead when the current one is full.
+
+        Args:
+            distinct: Sketches, as published before plus new events
+            rollup: Rollup, as published before plus new events
+            keys: Rollup keys of the new events
+        """
+        if not self.is_writer:
+            raise RuntimeError("Only the writer process updates shared aggregates")
+        keys = set(keys)
+        days = {key[0] for key in keys}
+        buf = self._region.buf
+        used_days, day_capacity, used_cells, cell_capacity, used_strings, string_capacity = (
+            _HEADER.unpack_from(buf)[3:]
+        )
+        new_strings = {
+            value
+            for key in keys
+            if key not in self._cell_slots
+            for value in key[1:]
+            if value is not None and value not in self._string_ids
+        }
+        if (
+            used_days + sum(1 for day in days if day.toordinal() not in self._day_slots)
+            > day_capacity
+            or used_cells + sum(1 for key in keys if key not in self._cell_slots) > cell_capacity
+            or used_strings + sum(len(_encoded(value)) for value in new_strings)
+            > string_capacity
+        ):
+            self.publish(distinct, rollup)
+            return
+
+        sequence = _SEQUENCE.unpack_from(buf, _SEQUENCE_AT)[0]
+        _SEQUENCE.pack_into(buf, _SEQUENCE_AT, sequence + 1)
+        try:
+            self._write(
+                buf,
+                {day: distinct.buckets[day] for day in days},
+                {key: rollup.cells[key] for key in keys},
+            )
+        finally:
+            _SEQUENCE.pack_into(buf, _SEQUENCE_AT, sequence + 2)
+
+    def _write(
+        self,
+        buf,
+        buckets: Dict[date, Dict[str, HyperLogLog]],
+        cells: Dict[Tuple, List[int]],
+    ) -> None:
+        """Write day sketches and cells into a region with room for them."""
+        (
+            _,
+            _,
+            precision,
+            used_days,
+            day_capacity,
+            used_cells,
+            cell_capacity,
+            used_strings,
+            string_capacity,
+        ) = _HEADER.unpack_from(buf)
+        day_table, sketches, cells_at, strings_at, _ = _layout(
+            precision, day_capacity, cell_capacity, string_capacity
+        )
+        size = 1 << precision
+
+        for day, day_sketches in buckets.items():
+            ordinal = day.toordinal()
+            slot = self._day_slots.get(ordinal)
+            if slot is None:
+                slot = self._day_slots[ordinal] = used_days
+                struct.pack_into("<i", buf, day_table + 4 * slot, ordinal)
+                used_days += 1
+            for index, dimension in enumerate(self.DIMENSIONS):
+                at = sketches + (slot * len(self.DIMENSIONS) + index) * size
+                buf[at : at + size] = day_sketches[dimension].registers
+
+        for key, (lines, events) in cells.items():
+            ids = []
+            for value in key[1:]:
+                if value is None:
+                    ids.append(_NONE)
+                    continue
+                string_id = self._string_ids.get(value)
+                if string_id is None:
+                    encoded = _encoded(value)
+                    string_id = self._string_ids[value] = used_strings
+                    buf[strings_at + used_strings : strings_at + used_strings + len(encoded)] = (
+                        encoded
+                    )
+                    used_strings += len(encoded)
+                ids.append(string_id)
+            slot = self._cell_slots.get(key)
+            if slot is None:
+                slot = self._cell_slots[key] = used_cells
+                used_cells += 1
+            _CELL.pack_into(
+                buf, cells_at + slot * _CELL.size, key[0].toordinal(), *ids, lines, events
+            )
+
+        _HEADER.pack_into(
+            buf,
+            0,
+            _DATA_MAGIC,
+            _SEQUENCE.unpack_from(buf, _SEQUENCE_AT)[0],
+            precision,
+            used_days,
+            day_capacity,
+            used_cells,
+            cell_capacity,
+            used_strings,
+            string_capacity,
+        )
+
+
+def create_shared_aggregates(data_dir: Path) -> SharedAggregates:
+    """
+    Create access to the shared aggregates of a data directory.
+
+    Workers serving the same data directory find the same region, named
+    after the directory's resolved path.
+
+    Args:
+        data_dir: Storage data directory (holds the writer lock file)
+
+    Returns:
+        Shared aggregates (attached on first use)
+
+    Raises:
+        ValueError: If the platform has no fcntl file locks (e.g. Windows)
+    """
+    try:
+        # Only needed here, so the module still imports where it is missing
+        import fcntl  # noqa: F401
+    except ImportError:
+        raise ValueError("METRICS_SHARED_AGGREGATES needs fcntl file locks (not on Windows)")
+    digest = hashlib.blake2b(
+        str(Path(data_dir).resolve()).encode("utf-8"), digest_size=5
+    ).hexdigest()
+    return SharedAggregates(f"locagg-{digest}", Path(data_dir) / "aggregates.lock")
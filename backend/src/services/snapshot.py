@@ -0,0 +1,214 @@
+"""Versioned snapshots of in-memory aggregates for fast startup."""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from ..instrumentation import SNAPSHOT_BYTES, SNAPSHOT_REPLAYED, SNAPSHOT_SECONDS
+from .aggregator import MetricsAggregator
+
+# Bump whenever the snapshot layout changes; other versions are ignored
+SNAPSHOT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotManager:
+    """
+    Checkpoints aggregator sketches, rollups and storage indexes to disk.
+
+    Each snapshot records the storage positions it covers (row counts for
+    JSON, byte offsets for JSONL). On startup the snapshot is loaded and only
+    events stored after those positions are replayed, instead of re-reading
+    the whole history. Snapshots with another format version or backend, or
+    whose positions no longer match the files, are ignored and the aggregator
+    falls back to its full history scan.
+
+    Snapshots are captured and written in a worker thread. The positions are
+    taken under the storage's write locks, under which saves also update the
+    aggregates, so they cover exactly the rows the aggregates were built from.
+    """
+
+    def __init__(self, aggregator: MetricsAggregator, path: Path):
+        """
+        Initialize snapshot manager.
+
+        Args:
+            aggregator: Aggregator whose state is checkpointed
+            path: Snapshot file (gzip-compressed JSON)
+        """
+        self.aggregator = aggregator
+        self.storage = aggregator.storage
+        self.path = Path(path)
+        # Whether events arrived since the last checkpoint
+        self._dirty = True
+        # Checkpoints share the temporary file; one at a time
+        self._checkpointing = asyncio.Lock()
+        self.storage.subscribe(self._on_event_saved)
+
+    def _on_event_saved(self, event: Dict) -> None:
+        """Mark the snapshot as outdated."""
+        self._dirty = True
+
+    def capture(self) -> Optional[Dict]:
+        """
+        Capture aggregator and storage state at one consistent point.
+
+        Holds the write locks of the storage (of every shard), so saves wait
+        until both are captured. Storage state is taken first: it indexes rows
+        other processes appended, which the aggregator then knows it missed.
+
+        Returns:
+            Snapshot document, or None if the aggregator is not warm yet or
+            lacks rows written by another process (it is rebuilt instead)
+        """
+        with ExitStack() as stack:
+            for partition in getattr(self.storage, "shards", [self.storage]):
+                stack.enter_context(partition.write_lock)
+            storage_state = self.storage.snapshot_state()
+            aggregates = self.aggregator.export_state()
+            if aggregates is None:
+                return None
+            # Events saved from here on are not covered
+            self._dirty = False
+        return {
+            "version": SNAPSHOT_VERSION,
+            "backend": type(self.storage).__name__,
+            "created_at": datetime.now().isoformat(),
+            "storage": storage_state,
+            "aggregates": aggregates,
+        }
+
+    def write(self, snapshot: Dict) -> int:
+        """
+        Write a snapshot atomically (temporary file, fsync, rename).
+
+        Args:
+            snapshot: Snapshot document from capture()
+
+        Returns:
+            Size of the snapshot file in bytes
+        """
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, self.path)
+        size = self.path.stat().st_size
+        SNAPSHOT_BYTES.set(size)
+        return size
+
+    async def checkpoint(self, force: bool = False) -> bool:
+        """
+        Capture and write a snapshot in a worker thread.
+
+        Args:
+            force: Write even if no events arrived since the last checkpoint
+
+        Returns:
+            True if a snapshot was written
+        """
+        async with self._checkpointing:
+            if not (self._dirty or force):
+                return False
+            with SNAPSHOT_SECONDS.time(phase="capture"):
+                snapshot = await asyncio.to_thread(self.capture)
+            if snapshot is None:
+                return False
+            try:
+                with SNAPSHOT_SECONDS.time(phase="write"):
+                    await asyncio.to_thread(self.write, snapshot)
+            except OSError:
+                self._dirty = True
+                raise
+            return True
+
+    async def run_periodically(self, interval: float) -> None:
+        """
+        Checkpoint every `interval` seconds until cancelled.
+
+        Args:
+            interval: Seconds between checkpoints
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.checkpoint()
+            except OSError:
+                logger.exception("Snapshot checkpoint failed")
+
+    def load(self) -> Optional[Dict]:
+        """
+        Read the snapshot file if it exists and has a compatible layout.
+
+        Returns:
+            Snapshot document, or None if there is no usable snapshot
+        """
+        try:
+            with gzip.open(self.path, "rb") as f:
+                snapshot = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError):
+            logger.warning("Ignoring unreadable snapshot %s", self.path)
+            return None
+
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.warning("Ignoring snapshot with unsupported version")
+            return None
+        if snapshot.get("backend") != type(self.storage).__name__:
+            logger.warning("Ignoring snapshot taken with another storage backend")
+            return None
+        return snapshot
+
+    def restore(self) -> Dict:
+        """
+        Load the snapshot and replay events stored after it.
+
+        Returns:
+            Dictionary with restored flag, replayed event count and seconds taken
+        """
+        started = time.perf_counter()
+        result = {"restored": False, "replayed": 0}
+
+        snapshot = self.load()
+        if snapshot is not None:
+            try:
+                if self.storage.restore_state(snapshot["storage"]):
+                    result["replayed"] = self.aggregator.restore_state(
+                        snapshot["aggregates"],
+                        self.storage.iter_events_after(snapshot["storage"]),
+                    )
+                    result["restored"] = True
+                    self._dirty = result["replayed"] > 0
+                else:
+                    logger.warning("Snapshot does not match stored events, rebuilding")
+            except (KeyError, TypeError, ValueError):
+                logger.exception("Ignoring malformed snapshot")
+
+        elapsed = time.perf_counter() - started
+        SNAPSHOT_SECONDS.observe(elapsed, phase="restore")
+        SNAPSHOT_REPLAYED.set(result["replayed"])
+        result["seconds"] = round(elapsed, 3)
+        return result
+
+
+def create_snapshot_manager(aggregator: MetricsAggregator) -> SnapshotManager:
+    """
+    Create the snapshot manager for an aggregator.
+
+    Args:
+        aggregator: Aggregator whose state is checkpointed
+
+    Returns:
+        Manager writing ``snapshot.json.gz`` in the storage directory
+    """
+    return SnapshotManager(aggregator, aggregator.storage.data_dir / "snapshot.json.gz")
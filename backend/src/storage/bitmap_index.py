@@ -0,0 +1,205 @@
+"""Bitmap indexes over event rows of a storage segment."""
+
+import base64
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Event fields with one bitmap per distinct value
+INDEXED_FIELDS = ("developer_id", "source", "type", "language")
+
+# Filter value: a single value or any of several values
+FilterValue = Union[str, Iterable[str]]
+
+_NONZERO_BYTE = re.compile(b"[^\x00]")
+
+
+class BitmapIndex:
+    """
+    Per-segment bitmap index using Python ints as bitsets.
+
+    Bit ``i`` of the bitmap for ``(field, value)`` is set when row ``i`` of the
+    segment has that value. Combined filters are bitwise AND (across fields)
+    and OR (across values of one field), so rows are selected before any of
+    them is decoded.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.bitmaps: Dict[str, Dict[Optional[str], int]] = {
+            field: {} for field in INDEXED_FIELDS
+        }
+        self.row_count = 0
+
+    @classmethod
+    def build(cls, events: Iterable[dict]) -> "BitmapIndex":
+        """
+        Build an index over rows in order.
+
+        Args:
+            events: Event dictionaries; row ids are their positions
+
+        Returns:
+            Populated index
+        """
+        # Collect bits in bytearrays first; OR-ing into growing ints is quadratic
+        buffers: Dict[str, Dict[Optional[str], bytearray]] = {
+            field: {} for field in INDEXED_FIELDS
+        }
+        row_count = 0
+        for row_id, event in enumerate(events):
+            byte, bit = divmod(row_id, 8)
+            for field in INDEXED_FIELDS:
+                value = event.get(field)
+                buffer = buffers[field].get(value)
+                if buffer is None:
+                    buffer = bytearray()
+                    buffers[field][value] = buffer
+                if len(buffer) <= byte:
+                    buffer.extend(bytes(byte - len(buffer) + 1))
+                buffer[byte] |= 1 << bit
+            row_count = row_id + 1
+
+        index = cls()
+        index.row_count = row_count
+        for field, values in buffers.items():
+            for value, buffer in values.items():
+                index.bitmaps[field][value] = int.from_bytes(buffer, "little")
+        return index
+
+    def add(self, event: dict) -> int:
+        """
+        Append a row to the index.
+
+        Args:
+            event: Event dictionary of the new row
+
+        Returns:
+            Row id assigned to the event
+        """
+        row_id = self.row_count
+        bit = 1 << row_id
+        for field in INDEXED_FIELDS:
+            value = event.get(field)
+            values = self.bitmaps[field]
+            values[value] = values.get(value, 0) | bit
+        self.row_count += 1
+        return row_id
+
+    def extend(self, events: List[dict]) -> None:
+        """
+        Append many rows at once.
+
+        Cheaper than repeated add() calls, which each copy the growing ints.
+
+        Args:
+            events: Event dictionaries of the new rows, in order
+        """
+        chunk = BitmapIndex.build(events)
+        shift = self.row_count
+        for field, values in chunk.bitmaps.items():
+            target = self.bitmaps[field]
+            for value, bitmap in values.items():
+                target[value] = target.get(value, 0) | (bitmap << shift)
+        self.row_count += chunk.row_count
+
+    def to_dict(self) -> Dict:
+        """
+        Serialize the index for a snapshot.
+
+        Returns:
+            JSON-compatible dictionary (bitmaps as base64 little-endian bytes)
+        """
+        return {
+            "row_count": self.row_count,
+            "bitmaps": {
+                field: [
+                    [value, base64.b64encode(
+                        bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+                    ).decode("ascii")]
+                    for value, bitmap in values.items()
+                ]
+                for field, values in self.bitmaps.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BitmapIndex":
+        """
+        Restore an index serialized with to_dict().
+
+        Args:
+            data: Serialized index
+
+        Returns:
+            Restored index
+        """
+        index = cls()
+        index.row_count = data["row_count"]
+        for field in INDEXED_FIELDS:
+            for value, encoded in data["bitmaps"].get(field, []):
+                index.bitmaps[field][value] = int.from_bytes(
+                    base64.b64decode(encoded), "little"
+                )
+        return index
+
+    def values(self, field: str) -> List[Optional[str]]:
+        """
+        List distinct values of an indexed field.
+
+        Args:
+            field: Indexed field name
+
+        Returns:
+            Distinct values present in the segment
+        """
+        return list(self.bitmaps[field])
+
+    def select(self, rows: Optional[int] = None, **filters: Optional[FilterValue]) -> int:
+        """
+        Compute the bitmap of rows matching all filters.
+
+        Args:
+            rows: Only consider rows below this number (a reader's committed
+                rows, while a writer may be adding more); None for all rows
+            **filters: Indexed field -> value or collection of values;
+                None means no filter on that field
+
+        Returns:
+            Bitmap of matching rows
+        """
+        result = (1 << (self.row_count if rows is None else min(rows, self.row_count))) - 1
+        for field, wanted in filters.items():
+            if wanted is None:
+                continue
+            values = self.bitmaps[field]
+            if isinstance(wanted, str):
+                matched = values.get(wanted, 0)
+            else:
+                matched = 0
+                for value in wanted:
+                    matched |= values.get(value, 0)
+            result &= matched
+            if not result:
+                break
+        return result
+
+    @staticmethod
+    def iter_rows(bitmap: int) -> Iterator[int]:
+        """
+        Iterate row ids set in a bitmap in ascending order.
+
+        Args:
+            bitmap: Bitmap of rows
+
+        Yields:
+            Row ids
+        """
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        # Let the regex engine skip runs of empty bytes
+        for match in _NONZERO_BYTE.finditer(data):
+            byte_index = match.start()
+            byte = data[byte_index]
+            base = byte_index * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
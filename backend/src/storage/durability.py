@@ -0,0 +1,236 @@
+"""fsync policies for event writes."""
+
+import os
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+from typing import IO, Optional, Set
+from ..instrumentation import FSYNC_LATENCY
+
+
+class DurabilityMode(str, Enum):
+    """
+    When written events are forced to stable storage.
+
+    Loss windows on power failure or kernel crash (a crash of the backend
+    process alone never loses acknowledged events, they are already in the
+    OS page cache):
+
+    - ``always``: fsync before every save returns; nothing acknowledged is lost.
+    - ``group``: fsync once per ``group_size`` events, and at the latest
+      ``group_delay`` seconds after a write; up to ``group_size - 1`` events
+      and at most ``group_delay`` seconds of writes can be lost.
+    - ``interval``: a background thread fsyncs every ``interval`` seconds; up
+      to ``interval`` seconds of writes can be lost.
+    - ``none``: rely on OS writeback; everything written since the kernel last
+      flushed dirty pages (about 30 s with Linux defaults) can be lost.
+    """
+
+    ALWAYS = "always"
+    GROUP = "group"
+    INTERVAL = "interval"
+    NONE = "none"
+
+
+def _fsync_path(path: Path) -> None:
+    """fsync a file or directory by path."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DurabilityPolicy:
+    """
+    Applies a DurabilityMode to the files written by a storage backend.
+
+    Storages call commit() with the still-open file after each write (and
+    replaced() after an atomic rename); the policy either fsyncs right away
+    or remembers the path for a later group or background sync.
+    """
+
+    def __init__(
+        self,
+        mode: DurabilityMode = DurabilityMode.NONE,
+        group_size: int = 32,
+        group_delay: float = 0.05,
+        interval: float = 1.0,
+    ):
+        """
+        Initialize policy.
+
+        Args:
+            mode: Durability mode
+            group_size: Events per fsync in group mode
+            group_delay: Longest delay of a group-mode fsync in seconds
+            interval: Seconds between fsyncs in interval mode
+        """
+        self.mode = DurabilityMode(mode)
+        self.group_size = max(1, group_size)
+        self.group_delay = group_delay
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._dirty: Set[Path] = set()
+        self._pending = 0
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def loss_window(self) -> str:
+        """Human-readable bound on writes lost by a power failure."""
+        if self.mode is DurabilityMode.ALWAYS:
+            return "none"
+        if self.mode is DurabilityMode.GROUP:
+            return f"up to {self.group_size - 1} events / {self.group_delay}s"
+        if self.mode is DurabilityMode.INTERVAL:
+            return f"up to {self.interval}s"
+        return "OS writeback delay (~30s)"
+
+    def commit(self, f: IO, path: Path, created: bool = False, events: int = 1) -> None:
+        """
+        Apply the policy to a write that has just been made.
+
+        Args:
+            f: Open file the event was written to
+            path: Final path of the written file
+            created: Whether the write created the file
+            events: Number of events the write holds (counted towards group_size)
+        """
+        if self.mode is DurabilityMode.NONE:
+            return
+
+        if self.mode is DurabilityMode.ALWAYS:
+            self._sync_file(f)
+            if created:
+                self._sync_paths({path.parent})
+            return
+
+        with self._lock:
+            self._dirty.add(path)
+            if created:
+                self._dirty.add(path.parent)
+            self._pending += events
+            group_full = (
+                self.mode is DurabilityMode.GROUP and self._pending >= self.group_size
+            )
+        self._ensure_flusher()
+        if group_full:
+            self._sync_file(f)
+            self.flush()
+
+    def commit_rewrite(self, f: IO) -> None:
+        """
+        fsync a rewritten temporary file before it is renamed into place.
+
+        Done in every mode: the new file replaces rows that may already be on
+        disk, and a rename that reaches the disk before the data would leave
+        an empty or partial file after a crash. The mode applies only to the
+        directory entry, see replaced().
+
+        Args:
+            f: Open temporary file
+        """
+        self._sync_file(f)
+
+    def replaced(self, path: Path) -> None:
+        """
+        Apply the policy to a file atomically renamed into place.
+
+        The renamed file itself must have gone through commit() or
+        commit_rewrite() first.
+
+        Args:
+            path: Final path of the renamed file
+        """
+        if self.mode is DurabilityMode.NONE:
+            return
+
+        if self.mode is DurabilityMode.ALWAYS:
+            self._sync_paths({path.parent})
+            return
+
+        with self._lock:
+            # The deferred sync must hit the new inode and its directory entry
+            self._dirty.update((path, path.parent))
+
+    def flush(self) -> None:
+        """fsync every file written since the last sync."""
+        with self._lock:
+            paths = self._dirty
+            self._dirty = set()
+            self._pending = 0
+        self._sync_paths(paths)
+
+    def close(self) -> None:
+        """Stop the background flusher and sync outstanding writes."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        # Later writes start a new flusher
+        self._stop.clear()
+        self.flush()
+
+    def _sync_file(self, f: IO) -> None:
+        """Flush Python buffers and fsync an open file."""
+        start = time.perf_counter()
+        f.flush()
+        os.fsync(f.fileno())
+        FSYNC_LATENCY.observe(time.perf_counter() - start, mode=self.mode.value)
+
+    def _sync_paths(self, paths: Set[Path]) -> None:
+        """fsync files and directories by path (files first)."""
+        for path in sorted(paths, key=lambda p: p.is_dir()):
+            start = time.perf_counter()
+            try:
+                _fsync_path(path)
+            except FileNotFoundError:
+                continue
+            FSYNC_LATENCY.observe(time.perf_counter() - start, mode=self.mode.value)
+
+    def _ensure_flusher(self) -> None:
+        """Start the background flusher thread on first use."""
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="fsync-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        """Periodically sync dirty files until closed."""
+        period = self.group_delay if self.mode is DurabilityMode.GROUP else self.interval
+        while not self._stop.wait(period):
+            if self._dirty:
+                self.flush()
+
+
+def create_durability_policy() -> DurabilityPolicy:
+    """
+    Create the durability policy from environment settings.
+
+    METRICS_DURABILITY selects the mode (default: none), METRICS_GROUP_COMMIT_SIZE,
+    METRICS_GROUP_COMMIT_DELAY and METRICS_FSYNC_INTERVAL tune it.
+
+    Returns:
+        Configured policy
+    """
+    mode = os.getenv("METRICS_DURABILITY", DurabilityMode.NONE.value)
+    try:
+        mode = DurabilityMode(mode)
+    except ValueError:
+        choices = ", ".join(m.value for m in DurabilityMode)
+        raise ValueError(f"Unknown METRICS_DURABILITY '{mode}', expected one of {choices}")
+
+    return DurabilityPolicy(
+        mode,
+        group_size=int(os.getenv("METRICS_GROUP_COMMIT_SIZE", "32")),
+        group_delay=float(os.getenv("METRICS_GROUP_COMMIT_DELAY", "0.05")),
+        interval=float(os.getenv("METRICS_FSYNC_INTERVAL", "1.0")),
+    )
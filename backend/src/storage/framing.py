@@ -0,0 +1,169 @@
+"""Checksummed blocks of JSONL rows."""
+
+import json
+import zlib
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Every block starts with a header line of this form, followed by its rows:
+# {"_frame": 1, "rows": <row count>, "crc32": <CRC-32 of the rows' bytes>}
+FRAME_PREFIX = b'{"_frame": '
+
+# Rows per block when whole files are written at once
+FRAME_ROWS = 1000
+
+
+def frame_header(lines: List[bytes]) -> bytes:
+    """
+    Header line of a block.
+
+    Args:
+        lines: Encoded rows of the block, each ending in a newline
+
+    Returns:
+        Encoded header line
+    """
+    crc = 0
+    for line in lines:
+        crc = zlib.crc32(line, crc)
+    return b'{"_frame": 1, "rows": %d, "crc32": %d}\n' % (len(lines), crc)
+
+
+def framed(
+    lines: Iterable[bytes], rows_per_block: int = FRAME_ROWS
+) -> Iterator[Tuple[bytes, bool]]:
+    """
+    Group encoded rows into blocks.
+
+    Args:
+        lines: Encoded rows
+        rows_per_block: Rows per block
+
+    Yields:
+        (line, is_row) pairs, each block's header before its rows
+    """
+    block: List[bytes] = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= rows_per_block:
+            yield frame_header(block), False
+            yield from ((row, True) for row in block)
+            block = []
+    if block:
+        yield frame_header(block), False
+        yield from ((row, True) for row in block)
+
+
+def _parse_header(line: bytes) -> Optional[Tuple[int, int]]:
+    """(row count, checksum) of a header line, None if it is damaged."""
+    try:
+        header = json.loads(line)
+        rows, crc = header["rows"], header["crc32"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(rows, int) or not isinstance(crc, int) or rows < 1:
+        return None
+    return rows, crc
+
+
+class BlockReader:
+    """
+    Verifies the blocks of a file from its lines, without decoding rows.
+
+    Lines are fed in file order. Rows of a block are released once the
+    block is complete and its row count and checksum match; a damaged block
+    (wrong checksum, cut short by the next header, or a garbled header) is
+    dropped as a whole and reported. Lines before the first header are
+    unframed rows of files written before blocks existed and are released
+    unchecked; lines outside any block after it are reported as damage too.
+    """
+
+    def __init__(self, on_damage: Callable[[int, int], None], framed: bool = False):
+        """
+        Initialize reader.
+
+        Args:
+            on_damage: Called with (position of the first line, number of
+                lines) of every damaged stretch
+            framed: Earlier lines of the file (not fed) contained a block
+        """
+        self.on_damage = on_damage
+        self.framed = framed
+        # Open block: position of its header, expected rows and checksum
+        self._start: Optional[int] = None
+        self._expected = (0, 0)
+        self._crc = 0
+        self._rows: List[Tuple[int, bytes]] = []
+        # Damaged lines outside blocks: [position of the first, count]
+        self._stray: Optional[List[int]] = None
+
+    def feed(self, position: int, line: bytes) -> List[Tuple[int, bytes]]:
+        """
+        Process the next complete line.
+
+        Args:
+            position: Position of the line (byte offset or line number)
+            line: The line, including its newline
+
+        Returns:
+            (position, line) of the rows released by this line
+        """
+        if line.startswith(FRAME_PREFIX):
+            self._drop_open()
+            self._flush_stray()
+            self.framed = True
+            header = _parse_header(line)
+            if header is None:
+                # Rows up to the next header cannot be verified
+                self._stray = [position, 1]
+            else:
+                self._start, self._expected = position, header
+                self._crc, self._rows = 0, []
+            return []
+
+        if self._start is not None:
+            self._rows.append((position, line))
+            self._crc = zlib.crc32(line, self._crc)
+            if len(self._rows) < self._expected[0]:
+                return []
+            start, rows = self._start, self._rows
+            self._start, self._rows = None, []
+            if self._crc == self._expected[1]:
+                return rows
+            self.on_damage(start, len(rows) + 1)
+            return []
+
+        if not self.framed:
+            return [(position, line)]
+        if self._stray is None:
+            self._stray = [position, 0]
+        self._stray[1] += 1
+        return []
+
+    def finish(self, complete: bool) -> Optional[int]:
+        """
+        Handle the end of the lines read so far.
+
+        Args:
+            complete: No more lines will be appended (e.g. a sealed segment),
+                so a block still open is damaged
+
+        Returns:
+            Header position of a block still waiting for rows, to read again
+            from once more lines were appended; None otherwise
+        """
+        if complete:
+            self._drop_open()
+        self._flush_stray()
+        return self._start
+
+    def _drop_open(self) -> None:
+        """Report the open block as damaged (it was cut short)."""
+        if self._start is not None:
+            self.on_damage(self._start, len(self._rows) + 1)
+            self._start, self._rows = None, []
+
+    def _flush_stray(self) -> None:
+        """Report damaged lines collected outside blocks."""
+        if self._stray is not None:
+            self.on_damage(*self._stray)
+            self._stray = None
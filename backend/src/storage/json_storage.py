@@ -1,9 +1,17 @@
 """JSON file storage for events."""
 
 import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 from ..models.events import (
     CodeInsertionEvent,
     TestGenerationEvent,
@@ -11,17 +19,107 @@ from ..models.events import (
     CodeType,
     Event,
 )
+from ..instrumentation import (
+    DAMAGED_BLOCKS,
+    PARSE_LATENCY,
+    ROWS_RETURNED,
+    ROWS_SCANNED,
+    SAVE_BYTES,
+    SAVE_LATENCY,
+    record_cache,
+)
+from .bitmap_index import BitmapIndex, FilterValue
+from .durability import DurabilityPolicy
+from .timeline import Key, Timeline, keyed_rows, time_range
+
+logger = logging.getLogger(__name__)
+
+# Start of a top-level array item in files written with indent=2
+_ITEM_START = re.compile(r"\n  \{")
+
+
+def salvage_array(text: str) -> Tuple[List[dict], List[int]]:
+    """
+    Decode a JSON array of events, skipping damaged items.
+
+    Items of a damaged file are decoded one by one; after an item that does
+    not decode, decoding resumes at the next line that starts an item in
+    the layout the storage writes.
+
+    Args:
+        text: File contents
+
+    Returns:
+        Tuple of (decoded events, character offsets of the damaged stretches)
+    """
+    try:
+        events = json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    else:
+        if isinstance(events, list):
+            return events, []
+        return [], [0]
+
+    decoder = json.JSONDecoder()
+    events, damaged = [], []
+    position = text.find("[") + 1
+    if not position:
+        return [], [0]
+    while position < len(text):
+        # Skip separators between items
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text) or text[position] == "]":
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+            if isinstance(item, dict):
+                events.append(item)
+            continue
+        except json.JSONDecodeError:
+            damaged.append(position)
+        match = _ITEM_START.search(text, position + 1)
+        if match is None:
+            break
+        position = match.start() + 1
+    return events, damaged
+
+
+class _Segment:
+    """Decoded rows of one event file together with their bitmap index."""
+
+    def __init__(
+        self, rows: List[dict], signature: Optional[Tuple[int, int]], damaged: int = 0
+    ):
+        self.rows = rows
+        self.index = BitmapIndex.build(rows)
+        self.timeline = Timeline()
+        for row in rows:
+            self.timeline.append(row)
+        # (mtime_ns, size) of the file the rows were read from
+        self.signature = signature
+        # Damaged stretches skipped while reading; the file is copied aside
+        # before it is rewritten without them
+        self.damaged = damaged
+        # Rows readers may see: set once index and timeline hold them too
+        self.committed = len(rows)
 
 
 class JSONStorage:
     """Storage layer using JSON files (array format)."""
 
-    def __init__(self, data_dir: Optional[Path] = None):
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        durability: Optional[DurabilityPolicy] = None,
+    ):
         """
         Initialize JSON storage.
 
         Args:
             data_dir: Directory to store JSON files. Defaults to backend/logs
+            durability: fsync policy for writes. Defaults to OS-buffered
         """
         if data_dir is None:
             # Default to backend/logs directory (relative to this file)
@@ -38,6 +136,51 @@ class JSONStorage:
             CodeType.DOCUMENTATION: self.data_dir / "documentation.json",
         }
 
+        self.durability = durability or DurabilityPolicy()
+
+        # Decoded rows and indexes per event type, reused while files are unchanged
+        self._segments: Dict[CodeType, _Segment] = {}
+
+        # Held while files are rewritten. Readers never wait for it: they read
+        # the rows committed so far.
+        self._lock = threading.RLock()
+
+        # Callbacks notified with each saved event dict (ingest-side indexes)
+        self._listeners: List[Callable[[dict], None]] = []
+        # Times a file was found changed by another process, whose rows the
+        # listeners never saw
+        self.external_changes = 0
+
+    @property
+    def write_lock(self) -> threading.RLock:
+        """
+        Lock writers of this storage hold.
+
+        Hold it to read rows and rewrite them with replace_rows() without
+        losing events appended in between. Listeners are notified of saved
+        events while it is held, so their state matches the stored rows.
+        """
+        return self._lock
+
+    def subscribe(self, listener: Callable[[dict], None]) -> None:
+        """
+        Register a callback invoked with every event saved to this storage.
+
+        Args:
+            listener: Callable receiving the serialized event dictionary
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event_dict: dict) -> None:
+        """
+        Notify subscribed listeners about a newly saved event.
+
+        Args:
+            event_dict: Serialized event dictionary
+        """
+        for listener in self._listeners:
+            listener(event_dict)
+
     def save_event(self, event: Event) -> None:
         """
         Save an event to the appropriate JSON file.
@@ -45,96 +188,485 @@ class JSONStorage:
         Args:
             event: Event to save
         """
-        file_path = self.files[event.type]
+        self.save_events([event])
+
+    def save_events(self, events: List[Union[Event, dict]]) -> None:
+        """
+        Save several events, rewriting each affected JSON file once.
+
+        Args:
+            events: Events to save, or records already serialized the
+                same way (e.g. coalesced events)
+        """
+        by_type: Dict[CodeType, List[dict]] = {}
+        for event in events:
+            if isinstance(event, dict):
+                event_dict = event
+            else:
+                # Convert event to dict, handling datetime serialization
+                event_dict = event.model_dump(mode="json")
+                event_dict["timestamp"] = event.timestamp.isoformat()
+            by_type.setdefault(CodeType(event_dict["type"]), []).append(event_dict)
 
-        # Convert event to dict, handling datetime serialization
-        event_dict = event.model_dump()
-        event_dict["timestamp"] = event_dict["timestamp"].isoformat()
+        for event_type, event_dicts in by_type.items():
+            file_path = self.files[event_type]
+            started = time.perf_counter()
 
-        # Read existing events
-        events = self._load_events_from_file(file_path)
+            with self._lock:
+                # Reuse cached rows instead of re-reading the file
+                segment = self._segment(event_type)
+                self._keep_damaged(event_type)
 
-        # Append new event
-        events.append(event_dict)
+                # Rewrite atomically so a crash never leaves a truncated array behind
+                tmp_path = file_path.with_name(file_path.name + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(segment.rows + event_dicts, f, indent=2, ensure_ascii=False)
+                    self.durability.commit_rewrite(f)
+                os.replace(tmp_path, file_path)
+                self.durability.replaced(file_path)
 
-        # Write back to file
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(events, f, indent=2, ensure_ascii=False)
+                # Keep the cache and index in step with the file just written
+                segment.rows.extend(event_dicts)
+                segment.index.extend(event_dicts)
+                for event_dict in event_dicts:
+                    segment.timeline.append(event_dict)
+                segment.signature = self._file_signature(file_path)
+                # Publish the rows to readers
+                segment.committed = len(segment.rows)
+                # Under the lock, so holders see stored rows and listeners agree
+                for event_dict in event_dicts:
+                    self._notify(event_dict)
 
-    def _load_events_from_file(self, file_path: Path) -> List[dict]:
+            SAVE_LATENCY.observe(
+                time.perf_counter() - started, backend="json", type=event_type.value
+            )
+            SAVE_BYTES.observe(segment.signature[1], backend="json", type=event_type.value)
+
+    def close(self) -> None:
+        """Sync outstanding writes according to the durability policy."""
+        self.durability.close()
+
+    def read_rows(self, event_type: CodeType) -> List[dict]:
         """
-        Load events from a JSON file.
+        Get every stored row of a type in file order, without filtering.
 
         Args:
-            file_path: Path to JSON file
+            event_type: Type of events
 
         Returns:
-            List of event dictionaries
+            List of stored rows
+        """
+        segment = self._segment(event_type)
+        return segment.rows[: segment.committed]
+
+    def replace_rows(self, event_type: CodeType, rows: List[dict]) -> int:
         """
-        if not file_path.exists():
-            return []
+        Atomically replace all stored rows of a type (used by compaction).
+
+        Args:
+            event_type: Type of events
+            rows: New rows, in the order to store them
+
+        Returns:
+            Size of the new file in bytes
+        """
+        file_path = self.files[event_type]
+        with self._lock:
+            self._keep_damaged(event_type)
+            tmp_path = file_path.with_name(file_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2, ensure_ascii=False)
+                self.durability.commit_rewrite(f)
+            os.replace(tmp_path, file_path)
+            self.durability.replaced(file_path)
+
+            # Reload rows and index on next access
+            self._segments.pop(event_type, None)
+            return file_path.stat().st_size
+
+    def verify(self, repair: bool = False) -> List[Dict]:
+        """
+        Check every file for damage, optionally rewriting damaged ones.
+
+        JSON arrays carry no checksums, so files are decoded (with the
+        salvaging reader) to find damaged stretches.
+
+        Args:
+            repair: Rewrite damaged files with their intact events (the
+                damaged file is copied aside first)
+
+        Returns:
+            One report per file: file, rows, damaged (character offsets)
+            and repaired
+        """
+        report = []
+        for event_type, file_path in self.files.items():
+            with self._lock:
+                rows, damaged = self._load_events_from_file(file_path)
+                repaired = bool(damaged) and repair
+                if repaired:
+                    segment = _Segment(rows, self._file_signature(file_path), len(damaged))
+                    self._segments[event_type] = segment
+                    self.replace_rows(event_type, rows)
+            report.append(
+                {
+                    "file": str(file_path),
+                    "rows": len(rows),
+                    "damaged": [{"at": offset} for offset in damaged],
+                    "repaired": repaired,
+                }
+            )
+        return report
+
+    def _keep_damaged(self, event_type: CodeType) -> None:
+        """Copy a file that was read with damage aside before it is rewritten."""
+        segment = self._segments.get(event_type)
+        if segment is None or not segment.damaged:
+            return
+        file_path = self.files[event_type]
+        backup = file_path.with_name(f"{file_path.name}.damaged-{datetime.now():%Y%m%dT%H%M%S}")
+        shutil.copyfile(file_path, backup)
+        logger.warning("Kept a copy of damaged %s as %s", file_path, backup.name)
+        segment.damaged = 0
+
+    @staticmethod
+    def _file_signature(file_path: Path) -> Optional[Tuple[int, int]]:
+        """Return (mtime_ns, size) of a file, or None if it does not exist."""
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _segment(self, event_type: CodeType) -> _Segment:
+        """
+        Get cached rows and index for an event type, reloading on file change.
+
+        While a writer of this storage is rewriting the file (it updates the
+        cached rows itself) the segment is returned as it is; read only its
+        committed rows.
+
+        Args:
+            event_type: Type of events
+
+        Returns:
+            Segment with decoded rows and bitmap index
+        """
+        file_path = self.files[event_type]
+        segment = self._segments.get(event_type)
+        if segment is not None and segment.signature == self._file_signature(file_path):
+            record_cache("segment", hit=True)
+            return segment
+        if not self._lock.acquire(blocking=segment is None):
+            return segment
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                events = json.load(f)
-                if not isinstance(events, list):
-                    # If file contains single object or invalid format, return empty list
-                    return []
-                return events
-        except (json.JSONDecodeError, IOError) as e:
-            # If file is corrupted or empty, return empty list
-            return []
+            # The file may have changed while waiting
+            signature = self._file_signature(file_path)
+            segment = self._segments.get(event_type)
+            if segment is None or segment.signature != signature:
+                if segment is not None:
+                    # Rewrites by this storage update or drop the cached segment
+                    self.external_changes += 1
+                record_cache("segment", hit=False)
+                with PARSE_LATENCY.time(backend="json", type=event_type.value):
+                    rows, damaged = self._load_events_from_file(file_path)
+                if damaged:
+                    DAMAGED_BLOCKS.inc(len(damaged), backend="json", type=event_type.value)
+                    logger.warning(
+                        "Skipped %d damaged stretch(es) of %s; %d events were read",
+                        len(damaged),
+                        file_path,
+                        len(rows),
+                    )
+                segment = _Segment(rows, signature, len(damaged))
+                self._segments[event_type] = segment
+            else:
+                record_cache("segment", hit=True)
+            return segment
+        finally:
+            self._lock.release()
+
+    def signature(self) -> Tuple:
+        """
+        Cheap token that changes whenever an event file changes.
+
+        Also covers writes by other processes, which the cached rows may not
+        reflect yet.
+
+        Returns:
+            Hashable token (mtime and size of every file)
+        """
+        return tuple(self._file_signature(path) for path in self.files.values())
+
+    @staticmethod
+    def _row_fingerprint(rows: List[dict], count: int) -> int:
+        """CRC32 of the last of the first `count` rows, identifying the prefix."""
+        if not count:
+            return 0
+        return zlib.crc32(json.dumps(rows[count - 1], sort_keys=True).encode("utf-8"))
+
+    def snapshot_state(self) -> Dict[str, Dict]:
+        """
+        Capture the number of rows covered in each file.
+
+        JSON arrays have to be decoded in full on startup anyway, so indexes
+        are rebuilt while parsing and only positions are recorded.
+
+        Returns:
+            Per event type: row count and prefix fingerprint
+        """
+        state = {}
+        for event_type in self.files:
+            segment = self._segment(event_type)
+            state[event_type.value] = {
+                "rows": segment.committed,
+                "fingerprint": self._row_fingerprint(segment.rows, segment.committed),
+            }
+        return state
+
+    def restore_state(self, state: Dict[str, Dict]) -> bool:
+        """
+        Check that the files still start with the rows a snapshot covered.
+
+        Args:
+            state: Output of snapshot_state()
+
+        Returns:
+            True if the snapshot matches the files
+        """
+        for event_type in self.files:
+            entry = state.get(event_type.value)
+            if entry is None:
+                return False
+            segment = self._segment(event_type)
+            rows = segment.rows
+            count = entry["rows"]
+            if segment.committed < count or (
+                self._row_fingerprint(rows, count) != entry["fingerprint"]
+            ):
+                return False
+        return True
+
+    def iter_events_after(self, state: Dict[str, Dict]) -> Iterator[dict]:
+        """
+        Iterate events appended after the positions of a snapshot.
+
+        Args:
+            state: Output of snapshot_state()
+
+        Yields:
+            Event dictionaries stored after the snapshot
+        """
+        for event_type in self.files:
+            segment = self._segment(event_type)
+            yield from segment.rows[state[event_type.value]["rows"] : segment.committed]
+
+    def _load_events_from_file(self, file_path: Path) -> Tuple[List[dict], List[int]]:
+        """
+        Load events from a JSON file, salvaging the intact events of a damaged one.
+
+        Args:
+            file_path: Path to JSON file
+
+        Returns:
+            Tuple of (event dictionaries, offsets of the damaged stretches skipped)
+        """
+        try:
+            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return [], []
+        if not text.strip():
+            return [], []
+        return salvage_array(text)
 
     def load_events(
         self,
         event_type: CodeType,
-        developer_id: Optional[str] = None,
+        developer_id: Optional[FilterValue] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
     ) -> List[dict]:
         """
         Load events from JSON file with optional filtering.
 
+        Developer, source and language filters accept a value or a collection
+        of values and are resolved through the bitmap index. Returned events
+        are shared with the cache and must be treated as read-only.
+
         Args:
             event_type: Type of events to load
             developer_id: Filter by developer ID
             start_date: Filter events after this date
             end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
 
         Returns:
             List of event dictionaries
         """
-        file_path = self.files[event_type]
-        events = self._load_events_from_file(file_path)
+        segment = self._segment(event_type)
+        # Rows a concurrent writer appends from here on are not read
+        rows, count = segment.rows, segment.committed
+
+        if developer_id or source or language:
+            bitmap = segment.index.select(
+                rows=count,
+                developer_id=developer_id or None,
+                source=source or None,
+                language=language or None,
+            )
+            events = [rows[row_id] for row_id in BitmapIndex.iter_rows(bitmap)]
+        else:
+            events = rows[:count]
+
+        ROWS_SCANNED.inc(len(events), backend="json", type=event_type.value)
+
+        if not (start_date or end_date):
+            ROWS_RETURNED.inc(len(events), backend="json", type=event_type.value)
+            return events
 
-        # Apply filters
+        # Filter by date range
         filtered_events = []
         for event in events:
-            # Filter by developer_id
-            if developer_id and event.get("developer_id") != developer_id:
+            try:
+                event_timestamp = datetime.fromisoformat(event["timestamp"])
+                if start_date and event_timestamp < start_date:
+                    continue
+                if end_date and event_timestamp > end_date:
+                    continue
+            except (KeyError, ValueError):
+                # Skip events with invalid timestamps
                 continue
 
-            # Filter by date range
+            filtered_events.append(event)
+
+        ROWS_RETURNED.inc(len(filtered_events), backend="json", type=event_type.value)
+        return filtered_events
+
+    def iter_events(
+        self,
+        event_type: CodeType,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> Iterator[dict]:
+        """
+        Iterate events of a type lazily, in storage order.
+
+        Takes the same filters as load_events() but builds no result list
+        (used for exports). Events are shared with the cache and must be
+        treated as read-only.
+
+        Args:
+            event_type: Type of events to iterate
+            developer_id: Filter by developer ID
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Yields:
+            Event dictionaries
+        """
+        segment = self._segment(event_type)
+        rows, count = segment.rows, segment.committed
+        if developer_id or source or language:
+            bitmap = segment.index.select(
+                rows=count,
+                developer_id=developer_id or None,
+                source=source or None,
+                language=language or None,
+            )
+            events = (rows[row_id] for row_id in BitmapIndex.iter_rows(bitmap))
+        else:
+            events = islice(rows, count)
+
+        for event in events:
             if start_date or end_date:
                 try:
                     event_timestamp = datetime.fromisoformat(event["timestamp"])
-                    if start_date and event_timestamp < start_date:
-                        continue
-                    if end_date and event_timestamp > end_date:
-                        continue
-                except (KeyError, ValueError):
-                    # Skip events with invalid timestamps
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if start_date and event_timestamp < start_date:
                     continue
+                if end_date and event_timestamp > end_date:
+                    continue
+            yield event
 
-            filtered_events.append(event)
+    def page_sources(
+        self,
+        event_types: List[CodeType],
+        after: Optional[Key] = None,
+        descending: bool = True,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> List[Iterator]:
+        """
+        Keyed row sources for paging events in timestamp order.
 
-        return filtered_events
+        Keys are (timestamp, type, row); see storage.timeline.page(). Each
+        source starts right after the cursor key, so later pages do not
+        revisit earlier rows.
+
+        Args:
+            event_types: Types of events to page through
+            after: Key of the last event of the previous page (None for the first page)
+            descending: Newest events first
+            developer_id: Filter by developer ID
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Returns:
+            One source per event type
+        """
+        start, end = time_range(start_date, end_date)
+        sources = []
+        for event_type in event_types:
+            segment = self._segment(event_type)
+            rows, count = segment.rows, segment.committed
+            bitmap = (
+                segment.index.select(
+                    rows=count,
+                    developer_id=developer_id or None,
+                    source=source or None,
+                    language=language or None,
+                )
+                if developer_id or source or language or count < len(segment.timeline)
+                else None
+            )
+            sources.append(
+                keyed_rows(
+                    segment.timeline,
+                    (list(CodeType).index(event_type),),
+                    0,
+                    lambda wanted, rows=rows: {row: rows[row] for row in wanted},
+                    start,
+                    end,
+                    after,
+                    descending,
+                    bitmap,
+                )
+            )
+        return sources
 
     def get_all_events(
         self,
-        developer_id: Optional[str] = None,
+        developer_id: Optional[FilterValue] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
     ) -> List[dict]:
         """
         Get all events across all types.
@@ -143,13 +675,17 @@ class JSONStorage:
             developer_id: Filter by developer ID
             start_date: Filter events after this date
             end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
 
         Returns:
             List of all event dictionaries
         """
         all_events = []
         for event_type in CodeType:
-            events = self.load_events(event_type, developer_id, start_date, end_date)
+            events = self.load_events(
+                event_type, developer_id, start_date, end_date, source, language
+            )
             all_events.extend(events)
 
         # Sort by timestamp
@@ -1,9 +1,23 @@
 """JSONL file storage for events."""
 
+import base64
+import bz2
+import functools
+import gzip
 import json
+import logging
+import lzma
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from ..models.events import (
     CodeInsertionEvent,
     TestGenerationEvent,
@@ -11,18 +25,150 @@ from ..models.events import (
     CodeType,
     Event,
 )
+from ..instrumentation import (
+    DAMAGED_BLOCKS,
+    PARSE_LATENCY,
+    ROWS_RETURNED,
+    ROWS_SCANNED,
+    SAVE_BYTES,
+    SAVE_LATENCY,
+    record_cache,
+)
+from .bitmap_index import BitmapIndex, FilterValue
+from .durability import DurabilityPolicy
+from .framing import FRAME_PREFIX, BlockReader, frame_header, framed
+from .timeline import Key, Timeline, keyed_rows, time_range
+
+logger = logging.getLogger(__name__)
+
+# Bytes before a snapshot position checksummed to detect rewritten files
+FINGERPRINT_BYTES = 4096
+
+# Rows decoded before they are folded into the bitmap index in one go
+INDEX_CHUNK_ROWS = 50_000
+
+# Codecs for sealed segments: name -> (file name suffix, opener; None for plain files)
+CODECS = {
+    "none": ("", None),
+    "gzip": (".gz", functools.partial(gzip.open, compresslevel=6)),
+    "lzma": (".xz", lzma.open),
+    "bz2": (".bz2", bz2.open),
+}
+CODEC_BY_SUFFIX = {suffix: codec for codec, (suffix, _) in CODECS.items()}
+
+# Errors raised when a compressed segment is damaged
+DECOMPRESS_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError)
+
+
+def _in_range(
+    event: dict, start_date: Optional[datetime], end_date: Optional[datetime]
+) -> bool:
+    """Whether an event's timestamp lies within a date range (False if invalid)."""
+    try:
+        event_timestamp = datetime.fromisoformat(event["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        # Skip rows with invalid timestamps
+        return False
+    if start_date and event_timestamp < start_date:
+        return False
+    if end_date and event_timestamp > end_date:
+        return False
+    return True
+
+
+def _stat_signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Return (inode, mtime_ns, size) of a path, or None if it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class _Segment:
+    """
+    Row positions of one JSONL file together with their bitmap index and timeline.
+
+    Positions are byte offsets in plain files and line numbers in compressed
+    segments, which can only be read as a stream.
+    """
+
+    def __init__(
+        self,
+        inode: Optional[int] = None,
+        path: Optional[Path] = None,
+        codec: str = "none",
+    ):
+        self.inode = inode
+        self.path = path
+        self.codec = codec
+        self.offsets = array("q")
+        self.index = BitmapIndex()
+        self.timeline = Timeline()
+        # Bytes of the file covered by offsets and index
+        self.size = 0
+        # Whether a checksummed block was seen (later unframed lines are damage)
+        self.framed = False
+        # Rows readers may see: set once offsets, index and timeline hold them
+        self.committed = 0
+
+
+class _SegmentView:
+    """
+    Rows of a segment committed when a read started, and the file holding them.
+
+    The file is opened when the view is taken, so the rows stay readable
+    while a writer appends to, seals or replaces the file.
+    """
+
+    def __init__(self, segment: _Segment, rows: int, f):
+        self.segment = segment
+        self.rows = rows
+        self.file = f
+
+    def select(
+        self,
+        developer_id: Optional[FilterValue],
+        source: Optional[FilterValue],
+        language: Optional[FilterValue],
+    ) -> int:
+        """Bitmap of the view's rows matching the indexed filters."""
+        return self.segment.index.select(
+            rows=self.rows,
+            developer_id=developer_id or None,
+            source=source or None,
+            language=language or None,
+        )
+
+    def close(self) -> None:
+        """Close the view's file."""
+        self.file.close()
 
 
 class JSONLStorage:
     """Storage layer using JSONL files."""
 
-    def __init__(self, data_dir: Optional[Path] = None):
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        durability: Optional[DurabilityPolicy] = None,
+        segment_bytes: int = 0,
+        segment_codec: str = "gzip",
+    ):
         """
         Initialize JSONL storage.
 
         Args:
             data_dir: Directory to store JSONL files. Defaults to backend/logs
+            durability: fsync policy for writes. Defaults to OS-buffered
+            segment_bytes: Seal a file once it grows past this size (0 never seals)
+            segment_codec: Codec of automatically sealed segments (see CODECS)
         """
+        if segment_codec not in CODECS:
+            raise ValueError(
+                f"Unknown segment codec '{segment_codec}', expected one of {', '.join(CODECS)}"
+            )
+
         if data_dir is None:
             # Default to backend/logs directory (relative to this file)
             backend_dir = Path(__file__).parent.parent.parent
@@ -38,6 +184,73 @@ class JSONLStorage:
             CodeType.DOCUMENTATION: self.data_dir / "documentation.jsonl",
         }
 
+        self.durability = durability or DurabilityPolicy()
+        self.segment_bytes = segment_bytes
+        self.segment_codec = segment_codec
+
+        # Row offsets and indexes per event type, extended as files grow
+        self._segments: Dict[CodeType, _Segment] = {}
+
+        # Held while files or segments change (writes, seals, rewrites, indexing).
+        # Readers never wait for it: they read the rows committed so far.
+        self._lock = threading.RLock()
+        # Held while sealed segments are rewritten (compressed, compacted,
+        # repaired); taken before _lock, which is only held to swap files in
+        self._segment_lock = threading.RLock()
+        # Background threads sealing full active files, per event type
+        self._sealers: Dict[CodeType, threading.Thread] = {}
+
+        # Sealed segments per event type in sequence order, found by listing
+        # the data directory again whenever its mtime changes
+        self._sealed: Dict[CodeType, List[_Segment]] = {t: [] for t in self.files}
+        self._sealed_mtime: Optional[int] = None
+
+        # Callbacks notified with each saved event dict (ingest-side indexes)
+        self._listeners: List[Callable[[dict], None]] = []
+        # Times an active file was found appended to, replaced or truncated by
+        # another process, whose rows the listeners never saw
+        self.external_changes = 0
+
+    @property
+    def write_lock(self) -> threading.RLock:
+        """
+        Lock writers of this storage hold.
+
+        Hold it to read rows and rewrite them with replace_rows() without
+        losing events appended in between. Listeners are notified of saved
+        events while it is held, so their state matches the stored rows.
+        """
+        return self._lock
+
+    @property
+    def segment_lock(self) -> threading.RLock:
+        """
+        Lock held while sealed segments are rewritten.
+
+        Hold it to read a sealed segment and rewrite it with replace_rows()
+        without a background seal compressing it in between.
+        """
+        return self._segment_lock
+
+    def subscribe(self, listener: Callable[[dict], None]) -> None:
+        """
+        Register a callback invoked with every event saved to this storage.
+
+        Args:
+            listener: Callable receiving the serialized event dictionary
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event_dict: dict) -> None:
+        """
+        Notify subscribed listeners about a newly saved event.
+
+        Args:
+            event_dict: Serialized event dictionary
+        """
+        for listener in self._listeners:
+            listener(event_dict)
+
     def save_event(self, event: Event) -> None:
         """
         Save an event to the appropriate JSONL file.
@@ -45,87 +258,1247 @@ class JSONLStorage:
         Args:
             event: Event to save
         """
-        file_path = self.files[event.type]
+        self.save_events([event])
+
+    def save_events(self, events: List[Union[Event, dict]]) -> None:
+        """
+        Save several events with one append per affected JSONL file.
+
+        Args:
+            events: Events to save, or records already serialized the
+                same way (e.g. coalesced events)
+        """
+        by_type: Dict[CodeType, List[dict]] = {}
+        for event in events:
+            if isinstance(event, dict):
+                event_dict = event
+            else:
+                # Convert event to dict, handling datetime serialization
+                event_dict = event.model_dump(mode="json")
+                event_dict["timestamp"] = event.timestamp.isoformat()
+            by_type.setdefault(CodeType(event_dict["type"]), []).append(event_dict)
+
+        for event_type, event_dicts in by_type.items():
+            file_path = self.files[event_type]
+            started = time.perf_counter()
+
+            lines = [(json.dumps(d) + "\n").encode("utf-8") for d in event_dicts]
+            # One checksummed block per write, so damage stays contained
+            header = frame_header(lines)
+            data = header + b"".join(lines)
+
+            with self._lock:
+                # Append to JSONL file
+                with open(file_path, "a+b") as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    if offset:
+                        f.seek(offset - 1)
+                        if f.read(1) != b"\n":
+                            # End a torn last line so it cannot swallow this block's header
+                            offset += f.write(b"\n")
+                    f.write(data)
+                    f.flush()
+                    # Appends land at the end of the file, after any block another
+                    # process (e.g. another uvicorn worker) appended since the seek
+                    offset = f.tell() - len(data)
+                    self.durability.commit(
+                        f, file_path, created=offset == 0, events=len(event_dicts)
+                    )
+                    inode = os.fstat(f.fileno()).st_ino
+
+                # Index the rows directly if the segment was up to date before the
+                # write (a segment of a file that did not exist yet has no inode)
+                segment = self._segments.get(event_type)
+                if (
+                    segment is not None
+                    and segment.size == offset
+                    and segment.inode in (None, inode)
+                ):
+                    segment.inode = inode
+                    segment.framed = True
+                    segment.size += len(header)
+                    for line in lines:
+                        segment.offsets.append(segment.size)
+                        segment.size += len(line)
+                    segment.index.extend(event_dicts)
+                    for event_dict in event_dicts:
+                        segment.timeline.append(event_dict)
+                    # Publish the rows to readers
+                    segment.committed = len(segment.offsets)
+                # Under the lock, so holders see stored rows and listeners agree
+                for event_dict in event_dicts:
+                    self._notify(event_dict)
+
+            SAVE_LATENCY.observe(
+                time.perf_counter() - started, backend="jsonl", type=event_type.value
+            )
+            SAVE_BYTES.observe(len(data), backend="jsonl", type=event_type.value)
+
+            if self.segment_bytes and offset + len(data) >= self.segment_bytes:
+                self._seal_in_background(event_type)
+
+    def _seal_in_background(self, event_type: CodeType) -> None:
+        """
+        Seal a full active file in a background thread.
+
+        Compressing a segment takes time proportional to its size; saves only
+        start the thread (unless one is already sealing the type) and return.
+
+        Args:
+            event_type: Type of events
+        """
+        with self._lock:
+            sealer = self._sealers.get(event_type)
+            if sealer is not None and sealer.is_alive():
+                return
+            sealer = threading.Thread(
+                target=self._run_sealer,
+                args=(event_type,),
+                name=f"seal-{event_type.value}",
+                daemon=True,
+            )
+            self._sealers[event_type] = sealer
+        sealer.start()
+
+    def _run_sealer(self, event_type: CodeType) -> None:
+        """Seal the active file of a type (see _seal_in_background())."""
+        try:
+            self.seal(event_type)
+        except OSError:
+            logger.exception("Sealing the %s segment failed", event_type.value)
+
+    def close(self) -> None:
+        """Wait for background seals and sync outstanding writes."""
+        for sealer in list(self._sealers.values()):
+            sealer.join()
+        self.durability.close()
+
+    def read_rows(self, event_type: CodeType, segment: Optional[Path] = None) -> List[dict]:
+        """
+        Get every stored row of a file in file order, without filtering.
+
+        Args:
+            event_type: Type of events
+            segment: Sealed segment to read (see sealed_segments()); None for
+                the active file
+
+        Returns:
+            List of stored rows (lines that cannot be decoded are skipped)
+        """
+        source = self._segment(event_type) if segment is None else self._sealed_at(
+            event_type, segment
+        )
+        if not source.offsets:
+            return []
+        return list(self._segment_rows(source, range(len(source.offsets))))
+
+    def replace_rows(
+        self, event_type: CodeType, rows: List[dict], segment: Optional[Path] = None
+    ) -> int:
+        """
+        Atomically replace all stored rows of a file (used by compaction).
+
+        Args:
+            event_type: Type of events
+            rows: New rows, in the order to store them
+            segment: Sealed segment to replace (written with its own codec);
+                None for the active file
+
+        Returns:
+            Size of the new file in bytes
+        """
+        lines = (
+            line for line, _ in framed((json.dumps(row) + "\n").encode("utf-8") for row in rows)
+        )
+        if segment is not None:
+            with self._segment_lock, self._lock:
+                codec = self._sealed_at(event_type, segment).codec
+                return self._write_segment(segment, lines, codec, always_sync=True)
+
+        with self._lock:
+            file_path = self.files[event_type]
+            size = self._write_segment(file_path, lines, "none", always_sync=True)
+            # Re-index the new file on next access
+            self._segments.pop(event_type, None)
+            return size
+
+    def sealed_segments(self, event_type: CodeType) -> List[Path]:
+        """
+        Paths of the sealed segments of a type, oldest first.
+
+        Args:
+            event_type: Type of events
+
+        Returns:
+            Segment file paths
+        """
+        return [segment.path for segment in self._sealed_segments(event_type)]
+
+    def seal(self, event_type: CodeType, codec: Optional[str] = None) -> Optional[Path]:
+        """
+        Seal the active file of a type into a read-only segment.
+
+        The active file is renamed to the next segment name (so its row
+        offsets and index carry over) and, unless the codec is "none",
+        compressed into a new file that replaces the renamed one once it is
+        complete and synced. The next write starts a new active file.
+
+        Args:
+            event_type: Type of events
+            codec: Codec of the segment (defaults to the storage's segment codec)
+
+        Returns:
+            Path of the sealed segment, or None if the active file has no rows
+        """
+        codec = codec or self.segment_codec
+        if codec not in CODECS:
+            raise ValueError(f"Unknown segment codec '{codec}'")
+
+        with self._segment_lock:
+            with self._lock:
+                segment = self._segment(event_type)
+                if not segment.offsets:
+                    return None
+
+                file_path = self.files[event_type]
+                sealed = self._sealed_segments(event_type)
+                number = self._segment_number(event_type, sealed[-1].path) + 1 if sealed else 1
+                plain_path = self.data_dir / f"{file_path.stem}.{number:06d}{file_path.suffix}"
+                os.rename(file_path, plain_path)
+                self.durability.replaced(plain_path)
+                self._segments.pop(event_type, None)
+
+                segment.path = plain_path
+                self._sealed[event_type].append(segment)
+
+            if codec != "none":
+                # Compressed outside _lock: saves go on into the new active file
+                segment = self._compress(event_type, segment, codec)
+            return segment.path
+
+    def recompress(self, event_type: CodeType, segment: Path, codec: str) -> Path:
+        """
+        Rewrite a sealed segment with another codec.
+
+        Args:
+            event_type: Type of events
+            segment: Sealed segment path (see sealed_segments())
+            codec: New codec
+
+        Returns:
+            Path of the rewritten segment
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown segment codec '{codec}'")
+        with self._segment_lock:
+            source = self._sealed_at(event_type, segment)
+            if source.codec == codec:
+                return source.path
+            return self._compress(event_type, source, codec).path
+
+    def verify(self, repair: bool = False) -> List[Dict]:
+        """
+        Check the block checksums of every file without decoding rows.
+
+        Args:
+            repair: Rewrite files with damaged blocks keeping only intact
+                rows (damaged lines are moved to a ``.damaged-<time>`` file
+                next to them)
+
+        Returns:
+            One report per file (active files and sealed segments): file,
+            rows, unverified (unframed rows written before blocks existed),
+            damaged ({"at": position, "lines": count} per stretch; byte
+            offsets, line numbers in compressed segments; count None if a
+            compressed segment cannot be decompressed from there on),
+            repaired and kept
+        """
+        with self._segment_lock, self._lock:
+            names = os.listdir(self.data_dir)
+            report = []
+            for event_type, file_path in self.files.items():
+                paths = self._segment_paths(event_type, names)
+                if file_path.exists():
+                    paths.append(file_path)
+                for path in paths:
+                    codec = "none" if path == file_path else self._codec_of(path)
+                    entry = self._verify_file(path, codec)
+                    entry["repaired"] = bool(entry["damaged"]) and repair
+                    if entry["repaired"]:
+                        entry["kept"] = str(self._repair_file(path, codec, entry["damaged"]))
+                    report.append(entry)
+            if repair:
+                # Files were replaced; index them again on next access
+                self._segments.clear()
+                self._sealed_mtime = None
+            return report
+
+    def _verify_file(self, path: Path, codec: str) -> Dict:
+        """Scan one file's blocks (see verify())."""
+        compressed = codec != "none"
+        damaged: List[Dict] = []
+        blocks = BlockReader(lambda start, count: damaged.append({"at": start, "lines": count}))
+        rows = unverified = position = 0
+        with self._open(_Segment(path=path, codec=codec)) as f:
+            try:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        blocks.finish(True)
+                        damaged.append({"at": position, "lines": 1})
+                        break
+                    released = blocks.feed(position, line)
+                    rows += len(released)
+                    if not blocks.framed:
+                        unverified += len(released)
+                    position += 1 if compressed else len(line)
+                else:
+                    blocks.finish(True)
+            except DECOMPRESS_ERRORS:
+                blocks.finish(True)
+                damaged.append({"at": position, "lines": None})
+        return {
+            "file": str(path),
+            "rows": rows,
+            "unverified": unverified,
+            "damaged": damaged,
+        }
+
+    def _repair_file(self, path: Path, codec: str, damaged: List[Dict]) -> Path:
+        """
+        Rewrite a file without its damaged lines.
+
+        Args:
+            path: File to repair
+            codec: Codec of the file
+            damaged: Damaged stretches found by _verify_file()
+
+        Returns:
+            Path of the file holding the damaged lines
+        """
+        compressed = codec != "none"
+        kept_path = path.with_name(f"{path.name}.damaged-{datetime.now():%Y%m%dT%H%M%S}")
+        if damaged[-1]["lines"] is None:
+            # Undecompressable data cannot be split into lines; keep the whole file
+            shutil.copyfile(path, kept_path)
+        stretches = iter(damaged)
+        stretch = next(stretches, None)
+
+        with self._open(_Segment(path=path, codec=codec)) as f, open(kept_path, "ab") as kept:
+
+            def intact() -> Iterator[bytes]:
+                nonlocal stretch
+                position = remaining = 0
+                try:
+                    for line in f:
+                        if stretch is not None and position == stretch["at"]:
+                            if stretch["lines"] is None:
+                                return
+                            remaining = stretch["lines"]
+                            stretch = next(stretches, None)
+                        if remaining or not line.endswith(b"\n"):
+                            remaining = max(remaining - 1, 0)
+                            kept.write(line if line.endswith(b"\n") else line + b"\n")
+                        elif not line.startswith(FRAME_PREFIX):
+                            yield line
+                        position += 1 if compressed else len(line)
+                except DECOMPRESS_ERRORS:
+                    return
+
+            # The open handle keeps reading the old file once it is replaced
+            lines = (line for line, _ in framed(intact()))
+            self._write_segment(path, lines, codec, always_sync=True)
+        logger.warning("Repaired %s; damaged lines were moved to %s", path, kept_path.name)
+        return kept_path
+
+    def _compress(self, event_type: CodeType, source: _Segment, codec: str) -> _Segment:
+        """
+        Write the rows of a segment to a file with another codec and drop the source.
+
+        The caller holds _segment_lock. The new file is written without
+        holding _lock, which is only taken to swap it in for the source.
+
+        Args:
+            event_type: Type of events in the segment
+            source: Indexed sealed segment
+            codec: Codec of the new file
+
+        Returns:
+            Segment of the new file, sharing the source's index and timeline
+        """
+        name = source.path.name
+        suffix = CODECS[source.codec][0]
+        base = name[: -len(suffix)] if suffix else name
+        target_path = source.path.with_name(base + CODECS[codec][0])
+        offsets = array("q")
+
+        def encode() -> Iterator[bytes]:
+            position = number = 0
+            rows = self._segment_rows(source, range(len(source.offsets)))
+            for line, is_row in framed((json.dumps(row) + "\n").encode("utf-8") for row in rows):
+                if is_row:
+                    offsets.append(position if codec == "none" else number)
+                position += len(line)
+                number += 1
+                yield line
+
+        tmp_path = self._write_temporary(target_path, encode(), codec, always_sync=True)
+        with self._lock:
+            # Listing the directory takes _lock, so it never sees both files
+            os.replace(tmp_path, target_path)
+            self.durability.replaced(target_path)
+            os.unlink(source.path)
+
+            target = _Segment(target_path.stat().st_ino, target_path, codec)
+            target.offsets = offsets
+            target.index = source.index
+            target.timeline = source.timeline
+            target.size = target_path.stat().st_size
+            target.committed = len(offsets)
+            sealed = self._sealed[event_type]
+            for position, segment in enumerate(sealed):
+                if segment.path == source.path:
+                    sealed[position] = target
+        return target
+
+    def _write_segment(
+        self, path: Path, lines: Iterable[bytes], codec: str, always_sync: bool = False
+    ) -> int:
+        """
+        Atomically write lines to a file (temporary file + rename).
+
+        Args:
+            path: Final path of the file
+            lines: Encoded lines
+            codec: Codec to compress with
+            always_sync: fsync before the rename whatever the durability
+                mode, for files that replace data which is deleted afterwards
+
+        Returns:
+            Size of the new file in bytes
+        """
+        tmp_path = self._write_temporary(path, lines, codec, always_sync)
+        os.replace(tmp_path, path)
+        self.durability.replaced(path)
+        return path.stat().st_size
+
+    def _write_temporary(
+        self, path: Path, lines: Iterable[bytes], codec: str, always_sync: bool = False
+    ) -> Path:
+        """
+        Write lines to the temporary file that is later renamed to `path`.
+
+        Args:
+            path: Final path of the file
+            lines: Encoded lines
+            codec: Codec to compress with
+            always_sync: See _write_segment()
+
+        Returns:
+            Path of the temporary file
+        """
+        opener = CODECS[codec][1]
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as raw:
+            f = opener(raw, "wb") if opener else raw
+            for line in lines:
+                f.write(line)
+            if opener:
+                f.close()
+            if always_sync:
+                raw.flush()
+                os.fsync(raw.fileno())
+            self.durability.commit(raw, path, created=True)
+        return tmp_path
+
+    def _segment_number(self, event_type: CodeType, path: Path) -> int:
+        """Sequence number in a sealed segment's file name."""
+        file_path = self.files[event_type]
+        return int(path.name[len(file_path.stem) + 1 :].split(".", 1)[0])
+
+    def _sealed_at(self, event_type: CodeType, path: Path) -> _Segment:
+        """Indexed sealed segment of a type by path."""
+        for segment in self._sealed_segments(event_type):
+            if segment.path == Path(path):
+                return segment
+        raise ValueError(f"Not a sealed segment: {path}")
+
+    def _sealed_segments(self, event_type: CodeType) -> List[_Segment]:
+        """
+        Get the indexed sealed segments of a type, oldest first.
+
+        Segments are immutable once complete, so the directory is only listed
+        again after its mtime changed (a segment was sealed, rewritten or
+        removed, possibly by another process) and only new or replaced files
+        are indexed. While a writer of this storage is busy (possibly sealing)
+        the segments known so far are returned instead.
+
+        Args:
+            event_type: Type of events
+
+        Returns:
+            Sealed segments in sequence order
+        """
+        mtime = self.data_dir.stat().st_mtime_ns
+        if mtime == self._sealed_mtime:
+            return self._sealed[event_type]
+        if not self._lock.acquire(blocking=self._sealed_mtime is None):
+            return self._sealed[event_type]
+
+        try:
+            names = os.listdir(self.data_dir)
+            for kind in self.files:
+                known = {segment.path: segment for segment in self._sealed[kind]}
+                self._sealed[kind] = [
+                    self._index_sealed(kind, path, known.get(path))
+                    for path in self._segment_paths(kind, names)
+                ]
+            self._sealed_mtime = mtime
+        finally:
+            self._lock.release()
+        return self._sealed[event_type]
+
+    def _segment_paths(self, event_type: CodeType, names: List[str]) -> List[Path]:
+        """
+        Pick the sealed segment files of a type from directory entries.
+
+        Args:
+            event_type: Type of events
+            names: File names in the data directory
+
+        Returns:
+            One path per segment number, in sequence order
+        """
+        file_path = self.files[event_type]
+        pattern = re.compile(
+            rf"{re.escape(file_path.stem)}\.(\d{{6}}){re.escape(file_path.suffix)}(\.\w+)?"
+        )
+        candidates: Dict[int, List[Path]] = {}
+        for name in names:
+            match = pattern.fullmatch(name)
+            if match and (match.group(2) or "") in CODEC_BY_SUFFIX:
+                candidates.setdefault(int(match.group(1)), []).append(self.data_dir / name)
+
+        # An interrupted seal or recompress can leave the old file next to the
+        # new one; the new one is only renamed into place once complete, so
+        # prefer a compressed file and then the newest
+        return [
+            max(
+                candidates[number],
+                key=lambda p: (p.suffix != file_path.suffix, p.stat().st_mtime_ns),
+            )
+            for number in sorted(candidates)
+        ]
+
+    @staticmethod
+    def _codec_of(path: Path) -> str:
+        """Codec of a sealed segment file, from its name."""
+        return CODEC_BY_SUFFIX["" if path.suffix == ".jsonl" else path.suffix]
+
+    def _index_sealed(
+        self, event_type: CodeType, path: Path, known: Optional[_Segment]
+    ) -> _Segment:
+        """
+        Index a sealed segment unless a known segment already covers the file.
+
+        Args:
+            event_type: Type of events
+            path: Segment file path
+            known: Segment previously indexed for the same path
+
+        Returns:
+            Indexed segment
+        """
+        stat = path.stat()
+        codec = self._codec_of(path)
+        if known is not None and known.inode == stat.st_ino and (
+            known.size == stat.st_size or codec != "none"
+        ):
+            return known
+
+        segment = _Segment(stat.st_ino, path, codec)
+        with PARSE_LATENCY.time(backend="jsonl", type=event_type.value), self._open(segment) as f:
+            position = self._index_lines(segment, f, 0, event_type, complete=True)
+        segment.size = stat.st_size if codec != "none" else position
+        return segment
+
+    def _open(self, segment: _Segment):
+        """Open a segment file for reading, decompressing as a stream."""
+        opener = CODECS[segment.codec][1]
+        return opener(segment.path, "rb") if opener else open(segment.path, "rb")
+
+    def _index_lines(
+        self,
+        segment: _Segment,
+        f,
+        position: int,
+        event_type: CodeType,
+        complete: bool = False,
+    ) -> int:
+        """
+        Index the complete rows read from an open file.
+
+        Blocks are verified before their rows are decoded; damaged blocks
+        are skipped and reported, the rest of the file stays readable.
+
+        Args:
+            segment: Segment to extend
+            f: File positioned at `position`
+            position: Byte offset (line number for compressed segments) of
+                the first line read, at a block boundary
+            event_type: Type of events (for reporting)
+            complete: The file is sealed, so an unfinished last block is damaged
+
+        Returns:
+            Position after the last complete block (or unframed line)
+        """
+        compressed = segment.codec != "none"
+
+        def report(start: int, count: int) -> None:
+            DAMAGED_BLOCKS.inc(backend="jsonl", type=event_type.value)
+            unit = "line" if compressed else "byte"
+            logger.warning(
+                "Skipping damaged block of %d line(s) in %s at %s %d",
+                count,
+                segment.path,
+                unit,
+                start,
+            )
+
+        blocks = BlockReader(report, segment.framed)
+        pending = []
+        try:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written last line; index it once complete
+                    break
+                for row_position, row in blocks.feed(position, line):
+                    try:
+                        event = json.loads(row)
+                    except json.JSONDecodeError:
+                        event = None
+                    if isinstance(event, dict):
+                        segment.offsets.append(row_position)
+                        segment.timeline.append(event)
+                        pending.append(event)
+                        if len(pending) >= INDEX_CHUNK_ROWS:
+                            segment.index.extend(pending)
+                            pending = []
+                position += 1 if compressed else len(line)
+        except DECOMPRESS_ERRORS:
+            if not compressed:
+                raise
+            blocks.finish(True)
+            DAMAGED_BLOCKS.inc(backend="jsonl", type=event_type.value)
+            logger.warning(
+                "Skipping the rest of %s from line %d, which cannot be decompressed",
+                segment.path,
+                position,
+            )
+        segment.index.extend(pending)
+        segment.committed = len(segment.offsets)
+        segment.framed = blocks.framed
+        # A block still being written is read again from its header next time
+        resume = blocks.finish(complete)
+        return position if resume is None else resume
+
+    def _segment(self, event_type: CodeType) -> _Segment:
+        """
+        Get row offsets and index for an event type, indexing any new rows.
+
+        Appended rows are indexed incrementally from the last covered offset;
+        a replaced or truncated file is re-indexed from scratch. While a
+        writer of this storage is busy (it indexes the rows it writes itself)
+        the segment is returned as it is, with the rows committed so far.
+
+        Args:
+            event_type: Type of events
+
+        Returns:
+            Segment with row offsets and bitmap index
+        """
+        file_path = self.files[event_type]
+        segment = self._segments.get(event_type)
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            stat = None
+        if (
+            segment is not None
+            and stat is not None
+            and segment.inode == stat.st_ino
+            and segment.size == stat.st_size
+        ):
+            record_cache("segment", hit=True)
+            return segment
+        if not self._lock.acquire(blocking=segment is None):
+            return segment
+
+        try:
+            # Files may have changed while waiting
+            segment = self._segments.get(event_type)
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                segment = _Segment(path=file_path)
+                self._segments[event_type] = segment
+                return segment
+
+            if segment is None or segment.inode != stat.st_ino or stat.st_size < segment.size:
+                if segment is not None:
+                    # Seals and rewrites by this storage drop the segment
+                    self.external_changes += 1
+                segment = _Segment(stat.st_ino, file_path)
+                self._segments[event_type] = segment
+            elif stat.st_size > segment.size:
+                # Rows this storage appends are indexed as they are written
+                self.external_changes += 1
+
+            if stat.st_size == segment.size:
+                record_cache("segment", hit=True)
+                return segment
+
+            record_cache("segment", hit=False)
+            with PARSE_LATENCY.time(backend="jsonl", type=event_type.value), open(
+                file_path, "rb"
+            ) as f:
+                f.seek(segment.size)
+                segment.size = self._index_lines(segment, f, segment.size, event_type)
+            return segment
+        finally:
+            self._lock.release()
 
-        # Convert event to dict, handling datetime serialization
-        event_dict = event.model_dump()
-        event_dict["timestamp"] = event_dict["timestamp"].isoformat()
+    def _fingerprint(self, file_path: Path, size: int) -> int:
+        """CRC32 of the bytes just before `size`, identifying the covered prefix."""
+        if not size:
+            return 0
+        with open(file_path, "rb") as f:
+            f.seek(max(0, size - FINGERPRINT_BYTES))
+            return zlib.crc32(f.read(min(size, FINGERPRINT_BYTES)))
+
+    def _segment_state(self, segment: _Segment) -> Dict:
+        """Covered size, fingerprint, offsets, index and row timestamps of a segment."""
+        return {
+            "size": segment.size,
+            "fingerprint": self._fingerprint(segment.path, segment.size),
+            "offsets": base64.b64encode(segment.offsets.tobytes()).decode("ascii"),
+            "index": segment.index.to_dict(),
+            "times": base64.b64encode(segment.timeline.times.tobytes()).decode("ascii"),
+            "framed": segment.framed,
+        }
+
+    def _restore_segment(self, segment: _Segment, entry: Dict) -> bool:
+        """Install offsets, index and timestamps from a _segment_state() entry."""
+        if "times" not in entry:
+            # Snapshot from before timelines existed; index the files again
+            return False
+        segment.offsets.frombytes(base64.b64decode(entry["offsets"]))
+        segment.index = BitmapIndex.from_dict(entry["index"])
+        segment.timeline.times.frombytes(base64.b64decode(entry["times"]))
+        segment.size = entry["size"]
+        segment.framed = entry.get("framed", False)
+        segment.committed = len(segment.offsets)
+        return segment.index.row_count == len(segment.offsets) == len(segment.timeline)
+
+    def snapshot_state(self) -> Dict[str, Dict]:
+        """
+        Capture row offsets, indexes and covered byte positions of all files.
 
-        # Append to JSONL file
-        with open(file_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event_dict) + "\n")
+        Returns:
+            Per event type: covered size, prefix fingerprint, offsets and index
+            of the active file, plus the same for each sealed segment
+        """
+        state = {}
+        for event_type in self.files:
+            state[event_type.value] = {
+                **self._segment_state(self._segment(event_type)),
+                "sealed": [
+                    {"name": segment.path.name, **self._segment_state(segment)}
+                    for segment in self._sealed_segments(event_type)
+                ],
+            }
+        return state
+
+    def restore_state(self, state: Dict[str, Dict]) -> bool:
+        """
+        Install offsets and indexes captured by snapshot_state().
+
+        Nothing is installed unless the sealed segments are still the ones
+        the snapshot covered and every active file still starts with the
+        bytes the snapshot covered; rows appended since are indexed on next
+        access.
+
+        Args:
+            state: Output of snapshot_state()
+
+        Returns:
+            True if the snapshot matched the files and was installed
+        """
+        segments = {}
+        sealed = {}
+        mtime = self.data_dir.stat().st_mtime_ns
+        names = os.listdir(self.data_dir)
+        for event_type, file_path in self.files.items():
+            entry = state.get(event_type.value)
+            if entry is None:
+                return False
+
+            # Snapshots from before sealed segments existed cover none
+            sealed_entries = entry.get("sealed", [])
+            paths = self._segment_paths(event_type, names)
+            if [path.name for path in paths] != [e["name"] for e in sealed_entries]:
+                return False
+            sealed[event_type] = []
+            for path, sealed_entry in zip(paths, sealed_entries):
+                stat = path.stat()
+                if stat.st_size < sealed_entry["size"] or (
+                    self._fingerprint(path, sealed_entry["size"]) != sealed_entry["fingerprint"]
+                ):
+                    return False
+                segment = _Segment(stat.st_ino, path, self._codec_of(path))
+                if not self._restore_segment(segment, sealed_entry):
+                    return False
+                sealed[event_type].append(segment)
+
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                if entry["size"]:
+                    return False
+                continue
+            if stat.st_size < entry["size"] or (
+                self._fingerprint(file_path, entry["size"]) != entry["fingerprint"]
+            ):
+                return False
+
+            segment = _Segment(stat.st_ino, file_path)
+            if not self._restore_segment(segment, entry):
+                return False
+            segments[event_type] = segment
+
+        with self._lock:
+            self._segments.update(segments)
+            self._sealed.update(sealed)
+            self._sealed_mtime = mtime
+        return True
+
+    def iter_events_after(self, state: Dict[str, Dict]) -> Iterator[dict]:
+        """
+        Iterate events appended after the positions of a snapshot.
+
+        Args:
+            state: Output of snapshot_state()
+
+        Yields:
+            Event dictionaries stored after the snapshot
+        """
+        for event_type, file_path in self.files.items():
+            segment = self._segment(event_type)
+            start = bisect_left(segment.offsets, state[event_type.value]["size"])
+            if start < len(segment.offsets):
+                yield from self._read_rows(file_path, segment.offsets[start:])
+
+    def signature(self) -> Tuple:
+        """
+        Cheap token that changes whenever an event file changes.
+
+        Also covers writes by other processes: the active files are compared
+        by inode, mtime and size, sealed segments through the data
+        directory's mtime.
+
+        Returns:
+            Hashable token
+        """
+        return tuple(
+            _stat_signature(path) for path in (self.data_dir, *self.files.values())
+        )
+
+    def tail_position(self) -> Dict[str, List]:
+        """
+        Capture the position after the rows stored so far, for iter_appended().
+
+        Much cheaper than snapshot_state(), so it can be taken every few
+        seconds: rows appended by other processes are indexed, but only their
+        count is captured.
+
+        Returns:
+            Per event type: [sealed segment names, active file inode, committed rows]
+        """
+        position = {}
+        for event_type in self.files:
+            segment = self._segment(event_type)
+            position[event_type.value] = [
+                [sealed.path.name for sealed in self._sealed_segments(event_type)],
+                segment.inode,
+                segment.committed,
+            ]
+        return position
+
+    def iter_appended(
+        self, until: Dict[str, List], since: Optional[Dict[str, List]] = None
+    ) -> Optional[Iterator[dict]]:
+        """
+        Iterate the rows stored between two tail_position() results.
+
+        Args:
+            until: Later position
+            since: Earlier position, or None for every row stored before `until`
+
+        Returns:
+            Iterator of event dictionaries, or None if files were sealed or
+            rewritten in between (the rows must then be read in full again)
+        """
+        reads: List[Tuple[_Segment, range, object]] = []
+        opened = False
+        try:
+            for event_type in self.files:
+                names, inode, rows = until[event_type.value]
+                if since is None:
+                    sealed = self._sealed_segments(event_type)
+                    if [segment.path.name for segment in sealed] != names:
+                        return None
+                    spans = [(segment, range(segment.committed)) for segment in sealed]
+                    start = 0
+                else:
+                    if since[event_type.value][:2] != [names, inode]:
+                        return None
+                    spans = []
+                    start = since[event_type.value][2]
+                segment = self._segment(event_type)
+                if segment.inode != inode or not start <= rows <= segment.committed:
+                    return None
+                spans.append((segment, range(start, rows)))
+
+                for segment, span in spans:
+                    if not span:
+                        continue
+                    reads.append((segment, span, open(segment.path, "rb")))
+                    if os.fstat(reads[-1][2].fileno()).st_ino != segment.inode:
+                        # Another file took the path since the segment was indexed
+                        return None
+            opened = True
+        except FileNotFoundError:
+            return None
+        finally:
+            if not opened:
+                for _, _, f in reads:
+                    f.close()
+        return self._iter_reads(reads)
+
+    def _iter_reads(self, reads: List[Tuple[_Segment, range, object]]) -> Iterator[dict]:
+        """Decode (segment, rows, open file) spans in order, closing the files."""
+        try:
+            for segment, rows, f in reads:
+                yield from self._segment_rows(segment, rows, f)
+        finally:
+            for _, _, f in reads:
+                f.close()
+
+    def _segment_rows(
+        self, segment: _Segment, rows: Iterable[int], f=None
+    ) -> Iterator[dict]:
+        """
+        Decode rows of a segment by row number.
+
+        Args:
+            segment: Indexed segment
+            rows: Ascending row numbers
+            f: The segment's file opened in binary mode (e.g. by a read view);
+                opened by path if None
+
+        Yields:
+            Event dictionaries
+        """
+        if f is None:
+            with open(segment.path, "rb") as f:
+                yield from self._segment_rows(segment, rows, f)
+            return
+
+        if segment.codec == "none":
+            for row in rows:
+                f.seek(segment.offsets[row])
+                yield json.loads(f.readline())
+            return
+
+        # Compressed segments are decompressed as a stream, skipping unselected lines
+        lines = (segment.offsets[row] for row in rows)
+        wanted = next(lines, None)
+        if wanted is None:
+            return
+        f.seek(0)
+        with CODECS[segment.codec][1](f, "rb") as stream:
+            for number, line in enumerate(stream):
+                if number == wanted:
+                    yield json.loads(line)
+                    wanted = next(lines, None)
+                    if wanted is None:
+                        return
+
+    def _read_rows(self, file_path: Path, offsets: Iterator[int]) -> Iterator[dict]:
+        """
+        Decode the rows starting at the given byte offsets.
+
+        Args:
+            file_path: Path to JSONL file
+            offsets: Ascending row byte offsets
+
+        Yields:
+            Event dictionaries
+        """
+        with open(file_path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def _views(self, event_type: CodeType) -> List[_SegmentView]:
+        """
+        Take a read view of the rows of a type committed so far.
+
+        The view is a manifest of the sealed segments and the active file,
+        each with its committed row count and an open file. Reads through
+        it are consistent however long they take: rows appended later are
+        not seen, and sealed or rewritten files stay readable. Taking a view
+        does not wait for writers, unless a file was replaced between
+        listing the segments and opening them (a seal or rewrite finishing).
+
+        Args:
+            event_type: Type of events
+
+        Returns:
+            Views of the segments holding rows, oldest first; close them
+            when done
+        """
+        try:
+            return self._take_views(event_type)
+        except FileNotFoundError:
+            with self._lock:
+                return self._take_views(event_type)
+
+    def _take_views(self, event_type: CodeType) -> List[_SegmentView]:
+        """Open the files of a type's segments (see _views())."""
+        views: List[_SegmentView] = []
+        try:
+            for segment in self._sealed_segments(event_type) + [self._segment(event_type)]:
+                rows = segment.committed
+                if not rows:
+                    continue
+                views.append(_SegmentView(segment, rows, open(segment.path, "rb")))
+                if os.fstat(views[-1].file.fileno()).st_ino != segment.inode:
+                    # Another file took the path since the segment was indexed
+                    raise FileNotFoundError(segment.path)
+        except BaseException:
+            for view in views:
+                view.close()
+            raise
+        return views
 
     def load_events(
         self,
         event_type: CodeType,
-        developer_id: Optional[str] = None,
+        developer_id: Optional[FilterValue] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
     ) -> List[dict]:
         """
         Load events from JSONL file with optional filtering.
 
+        Developer, source and language filters accept a value or a collection
+        of values and are resolved through the bitmap index, so only matching
+        rows are read and decoded. Sealed segments come first, compressed
+        ones decompressed as a stream.
+
         Args:
             event_type: Type of events to load
             developer_id: Filter by developer ID
             start_date: Filter events after this date
             end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
 
         Returns:
             List of event dictionaries
         """
-        file_path = self.files[event_type]
-
-        if not file_path.exists():
-            return []
+        views = self._views(event_type)
+        try:
+            return self._load(
+                views, event_type, developer_id, start_date, end_date, source, language
+            )
+        finally:
+            for view in views:
+                view.close()
 
+    def _load(
+        self,
+        views: List[_SegmentView],
+        event_type: CodeType,
+        developer_id: Optional[FilterValue],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        source: Optional[FilterValue],
+        language: Optional[FilterValue],
+    ) -> List[dict]:
+        """Load the matching events of a type's read views (see load_events())."""
         events = []
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
+        scanned = 0
+        with PARSE_LATENCY.time(backend="jsonl", type=event_type.value):
+            for event in self._scan(views, developer_id, source, language):
+                scanned += 1
+                if _in_range(event, start_date, end_date):
+                    events.append(event)
 
-                try:
-                    event = json.loads(line)
+        ROWS_SCANNED.inc(scanned, backend="jsonl", type=event_type.value)
+        ROWS_RETURNED.inc(len(events), backend="jsonl", type=event_type.value)
+        return events
 
-                    # Apply filters
-                    if developer_id and event.get("developer_id") != developer_id:
-                        continue
+    def iter_events(
+        self,
+        event_type: CodeType,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> Iterator[dict]:
+        """
+        Iterate events of a type lazily, in storage order.
 
-                    event_timestamp = datetime.fromisoformat(event["timestamp"])
-                    if start_date and event_timestamp < start_date:
-                        continue
-                    if end_date and event_timestamp > end_date:
-                        continue
+        Takes the same filters as load_events(), but rows are read and
+        decoded as they are consumed, so memory use does not grow with the
+        number of matching events (used for exports).
 
-                    events.append(event)
-                except (json.JSONDecodeError, KeyError, ValueError) as e:
-                    # Skip malformed lines
-                    continue
+        Args:
+            event_type: Type of events to iterate
+            developer_id: Filter by developer ID
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
 
-        return events
+        Yields:
+            Event dictionaries
+        """
+        views = self._views(event_type)
+        try:
+            for event in self._scan(views, developer_id, source, language):
+                if _in_range(event, start_date, end_date):
+                    yield event
+        finally:
+            for view in views:
+                view.close()
+
+    def _scan(
+        self,
+        views: List[_SegmentView],
+        developer_id: Optional[FilterValue],
+        source: Optional[FilterValue],
+        language: Optional[FilterValue],
+    ) -> Iterator[dict]:
+        """Decode the rows of read views that match the indexed filters."""
+        for view in views:
+            bitmap = view.select(developer_id, source, language)
+            yield from self._segment_rows(view.segment, BitmapIndex.iter_rows(bitmap), view.file)
+
+    def page_sources(
+        self,
+        event_types: List[CodeType],
+        after: Optional[Key] = None,
+        descending: bool = True,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> List[Iterator]:
+        """
+        Keyed row sources for paging events in timestamp order.
+
+        Keys are (timestamp, type, row), rows numbered across the sealed
+        segments and the active file of a type; see storage.timeline.page().
+        Each source starts right after the cursor key through the segment
+        timelines, so later pages neither rescan nor decode earlier rows.
+
+        Args:
+            event_types: Types of events to page through
+            after: Key of the last event of the previous page (None for the first page)
+            descending: Newest events first
+            developer_id: Filter by developer ID
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Returns:
+            One source per non-empty segment
+        """
+        start, end = time_range(start_date, end_date)
+        sources = []
+        for event_type in event_types:
+            base = 0
+            # The views' files are closed once the sources are released
+            for view in self._views(event_type):
+                bitmap = (
+                    view.select(developer_id, source, language)
+                    if developer_id or source or language or view.rows < len(view.segment.timeline)
+                    else None
+                )
+                sources.append(
+                    keyed_rows(
+                        view.segment.timeline,
+                        (list(CodeType).index(event_type),),
+                        base,
+                        lambda rows, view=view: dict(
+                            zip(rows, self._segment_rows(view.segment, rows, view.file))
+                        ),
+                        start,
+                        end,
+                        after,
+                        descending,
+                        bitmap,
+                    )
+                )
+                base += view.rows
+        return sources
 
     def get_all_events(
         self,
-        developer_id: Optional[str] = None,
+        developer_id: Optional[FilterValue] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
     ) -> List[dict]:
         """
         Get all events across all types.
 
+        Views of all types are taken before any is read, so rows saved while
+        the events are read are left out of every type.
+
         Args:
             developer_id: Filter by developer ID
             start_date: Filter events after this date
             end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
 
         Returns:
             List of all event dictionaries
         """
-        all_events = []
-        for event_type in CodeType:
-            events = self.load_events(event_type, developer_id, start_date, end_date)
-            all_events.extend(events)
+        views = {}
+        try:
+            for event_type in CodeType:
+                views[event_type] = self._views(event_type)
+            all_events = []
+            for event_type, type_views in views.items():
+                all_events.extend(
+                    self._load(
+                        type_views, event_type, developer_id, start_date, end_date, source, language
+                    )
+                )
+        finally:
+            for type_views in views.values():
+                for view in type_views:
+                    view.close()
 
         # Sort by timestamp
         all_events.sort(key=lambda x: x.get("timestamp", ""))
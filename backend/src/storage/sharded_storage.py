@@ -0,0 +1,447 @@
+"""Storage sharded by developer across several underlying stores."""
+
+import hashlib
+import heapq
+import itertools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
+from ..models.events import CodeType, Event
+from .bitmap_index import FilterValue
+from .durability import DurabilityPolicy
+from .jsonl_storage import JSONLStorage
+from .timeline import Key, narrow, prefixed
+
+# Storages opened by worker processes, keyed by (class, shard directory)
+_WORKER_SHARDS: Dict[Tuple[type, str], object] = {}
+
+
+def shard_index(developer_id: Optional[str], shards: int) -> int:
+    """
+    Stable shard number of a developer.
+
+    Args:
+        developer_id: Developer identifier
+        shards: Number of shards
+
+    Returns:
+        Shard number in ``range(shards)``
+    """
+    digest = hashlib.blake2b((developer_id or "").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def _run_in_worker(storage_cls: type, shard_dir: str, func: Callable, args: tuple):
+    """Run `func` against a shard storage kept open in a worker process."""
+    key = (storage_cls, shard_dir)
+    storage = _WORKER_SHARDS.get(key)
+    if storage is None:
+        storage = storage_cls(Path(shard_dir))
+        _WORKER_SHARDS[key] = storage
+    return func(storage, *args)
+
+
+class ShardedStorage:
+    """
+    Storage layer splitting events into shards by hash of developer_id.
+
+    Each shard is a regular JSON or JSONL storage in ``shard-NN`` under the
+    data directory. Loads filtered to one developer touch only that
+    developer's shard; other loads and map_shards() fan out to all shards in
+    parallel. With the ``process`` executor every shard gets its own worker
+    process (so its caches stay warm there) and work runs without the GIL;
+    results must then be picklable and small, such as partial aggregates.
+    """
+
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        shards: int = 4,
+        storage_cls: Type = JSONLStorage,
+        durability: Optional[DurabilityPolicy] = None,
+        executor: str = "thread",
+        **storage_options,
+    ):
+        """
+        Initialize sharded storage.
+
+        Args:
+            data_dir: Directory holding the shard directories. Defaults to backend/logs
+            shards: Number of shards
+            storage_cls: Storage class used for every shard
+            durability: fsync policy shared by all shards. Defaults to OS-buffered
+            executor: "thread" or "process" for fan-out work
+            **storage_options: Further keyword arguments for every shard storage
+                (worker processes only read, so they open shards without them)
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if executor not in ("thread", "process"):
+            raise ValueError("executor must be 'thread' or 'process'")
+
+        if data_dir is None:
+            # Default to backend/logs directory (relative to this file)
+            backend_dir = Path(__file__).parent.parent.parent
+            data_dir = backend_dir / "logs"
+
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.storage_cls = storage_cls
+        self.durability = durability or DurabilityPolicy()
+        self.executor = executor
+        self.shards = [
+            storage_cls(
+                self.data_dir / f"shard-{i:02d}", durability=self.durability, **storage_options
+            )
+            for i in range(shards)
+        ]
+
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: List[ProcessPoolExecutor] = []
+
+        # Callbacks notified with each saved event dict (ingest-side indexes)
+        self._listeners: List[Callable[[dict], None]] = []
+        for shard in self.shards:
+            shard.subscribe(self._notify)
+
+    def subscribe(self, listener: Callable[[dict], None]) -> None:
+        """
+        Register a callback invoked with every event saved to this storage.
+
+        Args:
+            listener: Callable receiving the serialized event dictionary
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event_dict: dict) -> None:
+        """
+        Notify subscribed listeners about a newly saved event.
+
+        Args:
+            event_dict: Serialized event dictionary
+        """
+        for listener in self._listeners:
+            listener(event_dict)
+
+    def shard_for(self, developer_id: Optional[str]):
+        """
+        Get the shard storing a developer's events.
+
+        Args:
+            developer_id: Developer identifier
+
+        Returns:
+            Shard storage
+        """
+        return self.shards[shard_index(developer_id, len(self.shards))]
+
+    def save_event(self, event: Event) -> None:
+        """
+        Save an event to its developer's shard.
+
+        Args:
+            event: Event to save
+        """
+        self.shard_for(event.developer_id).save_event(event)
+
+    def save_events(self, events: List[Union[Event, dict]]) -> None:
+        """
+        Save several events, one batched write per affected shard.
+
+        Args:
+            events: Events to save, or records already serialized
+        """
+        by_shard: Dict[int, List[Union[Event, dict]]] = {}
+        for event in events:
+            developer_id = event["developer_id"] if isinstance(event, dict) else event.developer_id
+            number = shard_index(developer_id, len(self.shards))
+            by_shard.setdefault(number, []).append(event)
+        for number, shard_events in by_shard.items():
+            self.shards[number].save_events(shard_events)
+
+    def close(self) -> None:
+        """Wait for background seals, sync outstanding writes and stop fan-out workers."""
+        for shard in self.shards:
+            shard.close()
+        self.durability.close()
+        if self._threads is not None:
+            self._threads.shutdown()
+            self._threads = None
+        for pool in self._processes:
+            pool.shutdown()
+        self._processes = []
+
+    def _executor_for(self, shard_number: int) -> Executor:
+        """Executor running fan-out work for a shard."""
+        if self.executor == "process":
+            if not self._processes:
+                # One worker per shard keeps each shard's caches in one process
+                self._processes = [
+                    ProcessPoolExecutor(max_workers=1) for _ in self.shards
+                ]
+            return self._processes[shard_number]
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=len(self.shards), thread_name_prefix="shard"
+            )
+        return self._threads
+
+    def map_shards(self, func: Callable, *args) -> List:
+        """
+        Run ``func(shard_storage, *args)`` on every shard in parallel.
+
+        Args:
+            func: Module-level function (picklable for the process executor)
+            *args: Extra arguments passed to func
+
+        Returns:
+            Results in shard order
+        """
+        if len(self.shards) == 1:
+            return [func(self.shards[0], *args)]
+
+        if self.executor == "process":
+            futures = [
+                self._executor_for(i).submit(
+                    _run_in_worker, self.storage_cls, str(shard.data_dir), func, args
+                )
+                for i, shard in enumerate(self.shards)
+            ]
+        else:
+            futures = [
+                self._executor_for(i).submit(func, shard, *args)
+                for i, shard in enumerate(self.shards)
+            ]
+        return [future.result() for future in futures]
+
+    def _shards_for(self, developer_id: Optional[FilterValue]) -> List:
+        """Shards that can hold events matching a developer filter."""
+        if not developer_id:
+            return self.shards
+        wanted = [developer_id] if isinstance(developer_id, str) else developer_id
+        numbers = sorted({shard_index(d, len(self.shards)) for d in wanted})
+        return [self.shards[n] for n in numbers]
+
+    def load_events(
+        self,
+        event_type: CodeType,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> List[dict]:
+        """
+        Load events of one type from the shards that can match.
+
+        Args:
+            event_type: Type of events to load
+            developer_id: Filter by developer ID (value or collection)
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Returns:
+            List of event dictionaries
+        """
+        events = []
+        for shard in self._shards_for(developer_id):
+            events.extend(
+                shard.load_events(
+                    event_type, developer_id, start_date, end_date, source, language
+                )
+            )
+        return events
+
+    def iter_events(
+        self,
+        event_type: CodeType,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> Iterator[dict]:
+        """
+        Iterate events of one type lazily, shard after shard.
+
+        Args:
+            event_type: Type of events to iterate
+            developer_id: Filter by developer ID (value or collection)
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Yields:
+            Event dictionaries
+        """
+        for shard in self._shards_for(developer_id):
+            yield from shard.iter_events(
+                event_type, developer_id, start_date, end_date, source, language
+            )
+
+    def page_sources(
+        self,
+        event_types: List[CodeType],
+        after: Optional[Key] = None,
+        descending: bool = True,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> List[Iterator]:
+        """
+        Keyed row sources of the shards that can match, for paging events.
+
+        Keys are (timestamp, shard, type, row); see storage.timeline.page().
+
+        Args:
+            event_types: Types of events to page through
+            after: Key of the last event of the previous page (None for the first page)
+            descending: Newest events first
+            developer_id: Filter by developer ID (value or collection)
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Returns:
+            Sources of every matching shard
+        """
+        selected = self._shards_for(developer_id)
+        sources = []
+        for number, shard in enumerate(self.shards):
+            if shard not in selected:
+                continue
+            for shard_source in shard.page_sources(
+                event_types,
+                narrow(after, number),
+                descending,
+                developer_id,
+                start_date,
+                end_date,
+                source,
+                language,
+            ):
+                sources.append(prefixed(shard_source, number))
+        return sources
+
+    def get_all_events(
+        self,
+        developer_id: Optional[FilterValue] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        source: Optional[FilterValue] = None,
+        language: Optional[FilterValue] = None,
+    ) -> List[dict]:
+        """
+        Get all events across all types and matching shards.
+
+        Args:
+            developer_id: Filter by developer ID
+            start_date: Filter events after this date
+            end_date: Filter events before this date
+            source: Filter by code source
+            language: Filter by programming language
+
+        Returns:
+            List of all event dictionaries, sorted by timestamp
+        """
+        per_shard = [
+            shard.get_all_events(developer_id, start_date, end_date, source, language)
+            for shard in self._shards_for(developer_id)
+        ]
+        if len(per_shard) == 1:
+            return per_shard[0]
+        # Each shard is already sorted; merge instead of re-sorting
+        return list(heapq.merge(*per_shard, key=lambda x: x.get("timestamp", "")))
+
+    @property
+    def external_changes(self) -> int:
+        """Times any shard found its files changed by another process."""
+        return sum(shard.external_changes for shard in self.shards)
+
+    def signature(self) -> Tuple:
+        """
+        Cheap token that changes whenever an event file of any shard changes.
+
+        Returns:
+            Hashable token
+        """
+        return tuple(shard.signature() for shard in self.shards)
+
+    def snapshot_state(self) -> Dict[str, Dict]:
+        """
+        Capture the positions covered in every shard.
+
+        Returns:
+            Per shard number: the shard's snapshot state
+        """
+        return {str(i): shard.snapshot_state() for i, shard in enumerate(self.shards)}
+
+    def restore_state(self, state: Dict[str, Dict]) -> bool:
+        """
+        Restore every shard from a snapshot taken with the same shard count.
+
+        Args:
+            state: Output of snapshot_state()
+
+        Returns:
+            True if the snapshot matched every shard
+        """
+        if len(state) != len(self.shards):
+            return False
+        return all(
+            str(i) in state and shard.restore_state(state[str(i)])
+            for i, shard in enumerate(self.shards)
+        )
+
+    def iter_events_after(self, state: Dict[str, Dict]) -> Iterator[dict]:
+        """
+        Iterate events appended to any shard after a snapshot.
+
+        Args:
+            state: Output of snapshot_state()
+
+        Yields:
+            Event dictionaries stored after the snapshot
+        """
+        for i, shard in enumerate(self.shards):
+            yield from shard.iter_events_after(state[str(i)])
+
+    def tail_position(self) -> Dict[str, Dict]:
+        """
+        Capture the position after the rows stored so far in every shard.
+
+        Returns:
+            Per shard number: the shard's tail position
+        """
+        return {str(i): shard.tail_position() for i, shard in enumerate(self.shards)}
+
+    def iter_appended(
+        self, until: Dict[str, Dict], since: Optional[Dict[str, Dict]] = None
+    ) -> Optional[Iterator[dict]]:
+        """
+        Iterate the rows stored in any shard between two tail_position() results.
+
+        Args:
+            until: Later position
+            since: Earlier position, or None for every row stored before `until`
+
+        Returns:
+            Iterator of event dictionaries, or None if files of a shard were
+            sealed or rewritten in between
+        """
+        reads = []
+        for i, shard in enumerate(self.shards):
+            rows = shard.iter_appended(until[str(i)], since and since[str(i)])
+            if rows is None:
+                for opened in reads:
+                    opened.close()
+                return None
+            reads.append(rows)
+        return itertools.chain.from_iterable(reads)
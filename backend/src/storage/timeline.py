@@ -0,0 +1,341 @@
+"""Timestamp order of stored rows, for keyset pagination."""
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Timestamp key of rows whose timestamp cannot be parsed; never paged
+INVALID = -(2**63)
+
+# Largest timestamp key
+LATEST = 2**63 - 1
+
+# Stands in for "every row" in cursor bounds (larger than any row number)
+UNBOUNDED = 2**62
+
+# Candidates decoded at least per round when a predicate may reject some
+DECODE_BATCH_ROWS = 256
+
+# A page key: (timestamp micros, *sequence), e.g. (ts, type, row) or (ts, shard, type, row)
+Key = Tuple[int, ...]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp_key(timestamp) -> int:
+    """
+    Microseconds since the epoch of an ISO timestamp.
+
+    Naive timestamps are taken as UTC, the way they are stored.
+
+    Args:
+        timestamp: ISO timestamp string (or datetime)
+
+    Returns:
+        Timestamp key, INVALID if it cannot be parsed
+    """
+    try:
+        parsed = (
+            timestamp if isinstance(timestamp, datetime) else datetime.fromisoformat(timestamp)
+        )
+    except (TypeError, ValueError):
+        return INVALID
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def time_range(
+    start_date: Optional[datetime], end_date: Optional[datetime]
+) -> Tuple[int, int]:
+    """
+    Timestamp keys bounding an inclusive date range.
+
+    Args:
+        start_date: Include events from this date (None for unbounded)
+        end_date: Include events up to this date (None for unbounded)
+
+    Returns:
+        Tuple of (smallest, largest) timestamp key
+    """
+    return (
+        timestamp_key(start_date) if start_date else INVALID + 1,
+        timestamp_key(end_date) if end_date else LATEST,
+    )
+
+
+def bound_for(after: Key, sequence: Tuple[int, ...]) -> int:
+    """
+    Translate a cursor key into a row bound for one timeline.
+
+    Rows of the timeline with the cursor's timestamp come before the cursor
+    if their (sequence..., row) is smaller than the cursor's.
+
+    Args:
+        after: Cursor key (timestamp, *sequence prefix, row)
+        sequence: Sequence prefix of the timeline's rows (e.g. (type,))
+
+    Returns:
+        Row number to compare rows with the cursor's timestamp against
+    """
+    cursor_prefix, cursor_row = tuple(after[1:-1]), after[-1]
+    if sequence < cursor_prefix:
+        return UNBOUNDED
+    if sequence > cursor_prefix:
+        return -1
+    return cursor_row
+
+
+class Timeline:
+    """
+    Row timestamps of one event file and their (timestamp, row) order.
+
+    Timestamps are appended as rows are indexed. The sorted order is built
+    on first use and then brought up to date by sorting only the new rows:
+    they are appended in place while rows keep arriving in timestamp order,
+    and merged into the overlapping end of the order otherwise. Paging never
+    reads earlier pages' rows again. Rows may be appended while readers walk
+    the timeline.
+    """
+
+    def __init__(self):
+        """Initialize an empty timeline."""
+        self.times = array("q")
+        self._order = array("q")
+        self._sorted = array("q")
+        # Readers bring the sorted order up to date one at a time
+        self._sync_lock = threading.Lock()
+
+    def append(self, event: dict) -> None:
+        """
+        Add the next row.
+
+        Args:
+            event: Event dictionary as stored
+        """
+        self.times.append(timestamp_key(event.get("timestamp")))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _sync(self) -> Tuple[array, array]:
+        """
+        Bring the sorted order up to date with appended rows.
+
+        Returns:
+            Tuple of (row order, sorted timestamps), consistent with each other
+        """
+        with self._sync_lock:
+            times = self.times
+            done = len(self._order)
+            # Rows appended while syncing are left to the next sync
+            count = len(times)
+            if done == count:
+                return self._order, self._sorted
+
+            # Stable, so rows with equal timestamps stay in row order
+            tail = sorted(range(done, count), key=times.__getitem__)
+            # Earlier rows with the tail's first timestamp stay ahead of it
+            cut = bisect_right(self._sorted, times[tail[0]])
+            if cut == done:
+                self._order.extend(tail)
+                self._sorted.extend(times[row] for row in tail)
+            else:
+                # Merge the tail into the rows it overlaps only, into new
+                # arrays: readers may still walk the current ones
+                merged = list(
+                    heapq.merge(
+                        zip(self._sorted[cut:], self._order[cut:]),
+                        ((times[row], row) for row in tail),
+                    )
+                )
+                order = self._order[:cut]
+                order.extend(row for _, row in merged)
+                keys = self._sorted[:cut]
+                keys.extend(key for key, _ in merged)
+                self._order, self._sorted = order, keys
+            return self._order, self._sorted
+
+    def walk(
+        self,
+        start: int,
+        end: int,
+        after: Optional[Tuple[int, int]],
+        descending: bool,
+        bitmap: Optional[int] = None,
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Iterate rows in (timestamp, row) order within a timestamp range.
+
+        Args:
+            start: Smallest timestamp key to include
+            end: Largest timestamp key to include
+            after: (timestamp, row bound): only rows strictly after it in
+                walk order are yielded (None to start at the beginning)
+            descending: Walk from newest to oldest
+            bitmap: Bitmap of rows to include (None for all rows)
+
+        Yields:
+            (timestamp key, row) pairs
+        """
+        order, keys = self._sync()
+        start = max(start, INVALID + 1)
+        positions = self._positions(order, keys, start, end, after, descending)
+        if bitmap is None:
+            for position in positions:
+                yield keys[position], order[position]
+            return
+
+        # Bytes once per walk, so each membership test is O(1)
+        bits = bitmap.to_bytes((len(order) + 7) // 8, "little")
+        for position in positions:
+            row = order[position]
+            if bits[row >> 3] >> (row & 7) & 1:
+                yield keys[position], row
+
+    @staticmethod
+    def _positions(
+        order: array,
+        keys: array,
+        start: int,
+        end: int,
+        after: Optional[Tuple[int, int]],
+        descending: bool,
+    ) -> Iterable[int]:
+        """Positions in the sorted order a walk visits (see walk())."""
+        if descending:
+            position = bisect_right(keys, end)
+            if after is not None:
+                cursor = bisect_left(keys, after[0])
+                while cursor < len(keys) and keys[cursor] == after[0] and order[cursor] < after[1]:
+                    cursor += 1
+                position = min(position, cursor)
+            return range(position - 1, bisect_left(keys, start) - 1, -1)
+        else:
+            position = bisect_left(keys, start)
+            if after is not None:
+                cursor = bisect_left(keys, after[0])
+                while cursor < len(keys) and keys[cursor] == after[0] and order[cursor] <= after[1]:
+                    cursor += 1
+                position = max(position, cursor)
+            return range(position, bisect_right(keys, end))
+
+
+def keyed_rows(
+    timeline: Timeline,
+    sequence: Tuple[int, ...],
+    base: int,
+    loader: Callable[[List[int]], Dict[int, dict]],
+    start: int,
+    end: int,
+    after: Optional[Key],
+    descending: bool,
+    bitmap: Optional[int] = None,
+) -> Iterator[Tuple[Key, Callable, int]]:
+    """
+    Walk one timeline as a page() source.
+
+    Args:
+        timeline: Timeline of an event file
+        sequence: Key components between timestamp and row (e.g. (type,))
+        base: Row number of the file's first row in the key (files of a
+            type are numbered consecutively)
+        loader: Decodes rows of the file, see page()
+        start: Smallest timestamp key to include
+        end: Largest timestamp key to include
+        after: Cursor key of the same layout, or None
+        descending: Walk from newest to oldest
+        bitmap: Bitmap of rows to include (None for all rows)
+
+    Yields:
+        (key, loader, row) triples in page order
+    """
+    bound = None if after is None else (after[0], bound_for(after, sequence) - base)
+    for timestamp, row in timeline.walk(start, end, bound, descending, bitmap):
+        yield (timestamp, *sequence, base + row), loader, row
+
+
+def narrow(after: Optional[Key], partition: int) -> Optional[Key]:
+    """
+    Translate a cursor key into the key layout of one partition.
+
+    Keys of partitioned stores (shards, cluster nodes) put the partition
+    right after the timestamp; rows of lower partitions with the cursor's
+    timestamp come before the cursor, those of higher partitions after it.
+
+    Args:
+        after: Cursor key (timestamp, partition, *rest), or None
+        partition: Partition number
+
+    Returns:
+        Cursor key (timestamp, *rest) for the partition, or None
+    """
+    if after is None:
+        return None
+    if partition == after[1]:
+        return (after[0], *after[2:])
+    fill = UNBOUNDED if partition < after[1] else -1
+    return (after[0], *([fill] * (len(after) - 2)))
+
+
+def prefixed(
+    source: Iterator[Tuple[Key, Callable, int]], partition: int
+) -> Iterator[Tuple[Key, Callable, int]]:
+    """Insert a partition number into the keys of a page() source."""
+    for key, loader, row in source:
+        yield (key[0], partition, *key[1:]), loader, row
+
+
+def page(
+    sources: Iterable[Iterator[Tuple[Key, Callable, int]]],
+    limit: int,
+    descending: bool,
+    predicate: Optional[Callable[[dict], bool]] = None,
+) -> List[Tuple[Key, dict]]:
+    """
+    Merge keyed row sources and decode one page of events.
+
+    Candidates are decoded in batches grouped by loader, so rows of one file
+    are read together (one pass for compressed segments). With a predicate,
+    batches hold at least DECODE_BATCH_ROWS candidates; those left over when
+    the page is full are dropped and walked again by the next page.
+
+    Args:
+        sources: Iterators of (key, loader, row) already in page order, where
+            loader(rows) returns {row: event} for ascending row numbers
+        limit: Maximum number of events
+        descending: Whether sources are ordered newest first
+        predicate: Further filter on decoded events (None accepts all)
+
+    Returns:
+        Up to `limit` (key, event) pairs in page order
+    """
+    merged = heapq.merge(*sources, key=lambda item: item[0], reverse=descending)
+    result: List[Tuple[Key, dict]] = []
+    while len(result) < limit:
+        wanted_rows = limit - len(result)
+        if predicate is not None:
+            wanted_rows = max(wanted_rows, DECODE_BATCH_ROWS)
+        batch = list(islice(merged, wanted_rows))
+        if not batch:
+            break
+
+        wanted: Dict[int, Tuple[Callable, List[int]]] = {}
+        for _, loader, row in batch:
+            wanted.setdefault(id(loader), (loader, []))[1].append(row)
+        decoded = {
+            loader_id: loader(sorted(rows)) for loader_id, (loader, rows) in wanted.items()
+        }
+
+        for key, loader, row in batch:
+            event = decoded[id(loader)].get(row)
+            if event is not None and (predicate is None or predicate(event)):
+                result.append((key, event))
+                if len(result) == limit:
+                    break
+    return result
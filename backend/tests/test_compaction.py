@@ -0,0 +1,82 @@
+"""Compaction keeps every reported metric unchanged."""
+
+from datetime import date, datetime
+
+import pytest
+
+from benchmarks.generator import EventGenerator
+from src.services.aggregator import MetricsAggregator
+from src.services.compaction import Compactor
+from src.storage.json_storage import JSONStorage
+from src.storage.jsonl_storage import JSONLStorage
+
+STORAGES = {"json": JSONStorage, "jsonl": JSONLStorage}
+
+END = datetime(2024, 6, 30, 18, 0)
+
+
+def report(storage) -> dict:
+    """Metrics of a freshly warmed aggregator over the stored events."""
+    aggregator = MetricsAggregator(storage)
+    out = {
+        "team": aggregator.get_team_metrics(),
+        "team_since": aggregator.get_team_metrics(datetime(2024, 3, 1), None),
+        "developer": aggregator.get_developer_metrics("dev-0003"),
+        "features": aggregator.get_features_metrics(100),
+    }
+    for group_by in (["date", "source"], ["file_extension"], ["feature_name", "developer_id"]):
+        result = aggregator.query(group_by, ["lines", "events", "ai_lines"], limit=100_000)
+        result.pop("plan")
+        result["rows"].sort(key=repr)
+        out["query " + ",".join(group_by)] = result
+    out["features"]["features"].sort(key=lambda feature: feature["feature_name"])
+    return out
+
+
+@pytest.mark.parametrize("backend", sorted(STORAGES))
+def test_compact_then_query_gives_equal_results(tmp_path, backend):
+    generator = EventGenerator(developers=8, days=120, features=10, seed=7, end=END)
+    getattr(generator, f"write_{backend}")(tmp_path, 4000)
+    before = report(STORAGES[backend](tmp_path))
+
+    result = Compactor(STORAGES[backend](tmp_path), retention_days=30).compact(
+        today=END.date()
+    )
+    assert result["rows_folded"] > result["summaries"] > 0
+    assert result["rows_after"] < result["rows_before"]
+
+    assert report(STORAGES[backend](tmp_path)) == before
+
+
+def test_compaction_is_idempotent(tmp_path):
+    EventGenerator(developers=4, days=60, seed=3, end=END).write_jsonl(tmp_path, 1000)
+    compactor = Compactor(JSONLStorage(tmp_path), retention_days=10)
+    compactor.compact(today=END.date())
+
+    again = Compactor(JSONLStorage(tmp_path), retention_days=10).compact(today=END.date())
+    assert again["rows_folded"] == again["summaries"]
+    assert again["bytes_after"] == again["bytes_before"]
+
+
+def test_summary_with_malformed_sketch_is_still_aggregated(tmp_path):
+    storage = JSONLStorage(tmp_path)
+    storage.save_events(
+        [
+            {
+                "type": "code",
+                "source": "manual",
+                "lines": 5,
+                "file_path": "a.py",
+                "language": "python",
+                "developer_id": "dev-1",
+                "timestamp": "2024-01-02T10:00:00",
+                "event_count": 3,
+                "summary": True,
+                "file_sketches": {"files": "AAAA"},
+            }
+        ]
+    )
+    team = MetricsAggregator(JSONLStorage(tmp_path)).get_team_metrics()
+    assert team["total_developers"] == 1
+    assert team["team_metrics"]["code"]["total_lines"] == 5
+    assert Compactor(storage).compact(today=date(2024, 6, 1))["rows_before"] == 1
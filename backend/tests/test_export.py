@@ -0,0 +1,47 @@
+"""CSV exports import back into the same stored events."""
+
+import io
+import json
+from datetime import datetime
+
+from benchmarks.generator import EventGenerator
+from src.services.compaction import Compactor
+from src.services.export import csv_header, encode_rows, iter_export_rows
+from src.services.importer import BulkImporter, read_records
+from src.storage.jsonl_storage import JSONLStorage
+
+END = datetime(2024, 6, 30, 18, 0)
+
+
+def stored(storage) -> list:
+    """Stored events without unset or default fields, in a comparable order."""
+    rows = [
+        {
+            key: value
+            for key, value in row.items()
+            if value is not None and (key, value) != ("event_count", 1)
+        }
+        for row in iter_export_rows(storage)
+    ]
+    return sorted(rows, key=lambda row: json.dumps(row, sort_keys=True))
+
+
+def test_csv_export_round_trips_summaries_and_coverage(tmp_path):
+    events = list(EventGenerator(developers=5, days=60, seed=5, end=END).iter_dicts(1500))
+    for number, event in enumerate(events):
+        if event["type"] == "test":
+            event["coverage"] = float(number % 100)
+    source = JSONLStorage(tmp_path / "source")
+    source.save_events(events)
+    Compactor(source, retention_days=20).compact(today=END.date())
+    rows = stored(source)
+    assert any(row.get("summary") for row in rows)
+    assert any("coverage" in row for row in rows)
+
+    exported = csv_header() + encode_rows(iter_export_rows(source), "csv")
+    target = JSONLStorage(tmp_path / "target")
+    result = BulkImporter(target).run(
+        read_records(io.StringIO(exported.decode("utf-8"), newline=""), "csv"), "csv"
+    )
+    assert result["invalid"] == 0
+    assert stored(target) == rows
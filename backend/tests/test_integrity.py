@@ -0,0 +1,69 @@
+"""Checksummed JSONL blocks: damage is detected, contained and repaired."""
+
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from benchmarks.generator import EventGenerator
+from src.models.events import CodeType
+from src.storage.framing import FRAME_PREFIX
+from src.storage.jsonl_storage import JSONLStorage
+
+BATCH = 50
+
+
+@pytest.fixture
+def events():
+    generated = EventGenerator(
+        developers=5, days=3, features=4, seed=1, end=datetime(2024, 6, 30)
+    ).iter_events(2000)
+    return [event for event in generated if event.type == CodeType.CODE][: 6 * BATCH]
+
+
+def stored(data_dir: Path) -> int:
+    return len(JSONLStorage(data_dir).load_events(CodeType.CODE))
+
+
+def damage_block(file_path: Path, block: int) -> None:
+    """Change one byte of a row inside a block, keeping the line structure."""
+    lines = file_path.read_bytes().split(b"\n")
+    headers = [i for i, line in enumerate(lines) if line.startswith(FRAME_PREFIX)]
+    row = headers[block] + 5
+    lines[row] = lines[row].replace(b"dev-", b"dev_", 1)
+    file_path.write_bytes(b"\n".join(lines))
+
+
+def test_damaged_block_is_detected_and_repaired(tmp_path, events):
+    storage = JSONLStorage(tmp_path)
+    for first in range(0, len(events), BATCH):
+        storage.save_events(events[first : first + BATCH])
+    file_path = storage.files[CodeType.CODE]
+    damage_block(file_path, 2)
+
+    # Only the damaged block is dropped from reads
+    assert stored(tmp_path) == len(events) - BATCH
+    report = {entry["file"]: entry for entry in JSONLStorage(tmp_path).verify()}
+    entry = report[str(file_path)]
+    assert len(entry["damaged"]) == 1
+    assert entry["damaged"][0]["lines"] == BATCH + 1
+    assert not entry["repaired"]
+
+    repaired = JSONLStorage(tmp_path).verify(repair=True)
+    entry = next(entry for entry in repaired if entry["file"] == str(file_path))
+    assert entry["repaired"]
+    kept = Path(entry["kept"]).read_bytes().splitlines()
+    assert len(kept) == BATCH + 1 and kept[0].startswith(FRAME_PREFIX)
+
+    assert not any(entry["damaged"] for entry in JSONLStorage(tmp_path).verify())
+    assert stored(tmp_path) == len(events) - BATCH
+
+
+def test_torn_last_line_does_not_swallow_next_write(tmp_path, events):
+    storage = JSONLStorage(tmp_path)
+    storage.save_events(events[:BATCH])
+    with open(storage.files[CodeType.CODE], "ab") as f:
+        f.write(b'{"partial": ')
+
+    storage.save_events(events[BATCH : 2 * BATCH])
+    assert stored(tmp_path) == 2 * BATCH
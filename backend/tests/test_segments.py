@@ -0,0 +1,28 @@
+"""Sealing full JSONL files into compressed segments."""
+
+from datetime import datetime
+
+from benchmarks.generator import EventGenerator
+from src.models.events import CodeType
+from src.storage.jsonl_storage import JSONLStorage
+
+
+def test_background_seal_keeps_every_row(tmp_path):
+    events = list(
+        EventGenerator(developers=5, days=10, seed=2, end=datetime(2024, 6, 30)).iter_events(3000)
+    )
+    storage = JSONLStorage(tmp_path, segment_bytes=100_000, segment_codec="gzip")
+    for first in range(0, len(events), 20):
+        storage.save_events(events[first : first + 20])
+        # Rows are readable while segments are sealed in the background
+        assert len(storage.get_all_events()) == first + len(events[first : first + 20])
+    storage.close()
+
+    segments = storage.sealed_segments(CodeType.CODE)
+    assert segments and all(path.suffix == ".gz" for path in segments)
+    assert not list(tmp_path.glob("*.tmp"))
+    reopened = JSONLStorage(tmp_path)
+    assert len(reopened.get_all_events()) == len(events)
+    assert sorted(event["timestamp"] for event in reopened.get_all_events()) == sorted(
+        event.timestamp.isoformat() for event in events
+    )
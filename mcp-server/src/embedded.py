@@ -0,0 +1,188 @@
+"""In-process backend used by the MCP server's --embedded mode."""
+
+import asyncio
+import importlib
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+# Both projects name their package "src", so the backend is imported under this alias
+BACKEND_PACKAGE = "loc_backend"
+
+# Default location of the backend project next to mcp-server/
+DEFAULT_BACKEND_DIR = Path(__file__).parent.parent.parent / "backend"
+
+
+def load_backend(backend_dir: Optional[Path] = None) -> ModuleType:
+    """
+    Import the backend package (``backend/src``) as ``loc_backend``.
+
+    Args:
+        backend_dir: Backend project directory. Defaults to ../backend
+
+    Returns:
+        The backend package module
+
+    Raises:
+        ImportError: If the backend package cannot be found
+    """
+    if BACKEND_PACKAGE in sys.modules:
+        return sys.modules[BACKEND_PACKAGE]
+
+    package_dir = Path(backend_dir or DEFAULT_BACKEND_DIR) / "src"
+    spec = importlib.util.spec_from_file_location(
+        BACKEND_PACKAGE,
+        package_dir / "__init__.py",
+        submodule_search_locations=[str(package_dir)],
+    )
+    if spec is None or not (package_dir / "__init__.py").exists():
+        raise ImportError(f"Backend package not found in {package_dir}")
+
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[BACKEND_PACKAGE] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[BACKEND_PACKAGE]
+        raise
+    return module
+
+
+class EmbeddedBackend:
+    """
+    The backend's storage and MetricsAggregator running inside the MCP server.
+
+    Storage, durability and snapshot settings are read from the same
+    METRICS_* environment variables as the backend, and events are written
+    in its on-disk format, so a full backend can later serve the same data
+    directory (but not at the same time as this process).
+
+    Calls read files and may scan the whole history, so they run in a worker
+    thread and keep the MCP transports and other sessions responsive. They
+    run one at a time, so storage and aggregates are never touched by two
+    calls at once (snapshots are captured under the storage's write lock).
+    """
+
+    def __init__(self, backend_dir: Optional[Path] = None):
+        """
+        Initialize embedded backend.
+
+        Args:
+            backend_dir: Backend project directory. Defaults to ../backend
+        """
+        load_backend(backend_dir)
+        dependencies = importlib.import_module(f"{BACKEND_PACKAGE}.dependencies")
+        events = importlib.import_module(f"{BACKEND_PACKAGE}.models.events")
+
+        self.storage = dependencies.storage
+        self.aggregator = dependencies.aggregator
+        self.snapshots = dependencies.snapshots
+        self.snapshot_interval = dependencies.SNAPSHOT_INTERVAL
+        self.event_models = events.EVENT_MODELS
+        self.code_type = events.CodeType
+        self._snapshot_task: Optional[asyncio.Task] = None
+        # Held by the call in progress (see _run())
+        self._lock = threading.Lock()
+
+    @property
+    def data_dir(self) -> Path:
+        """Directory holding the event files."""
+        return self.storage.data_dir
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """Run a storage or aggregator call in a worker thread, one call at a time."""
+
+        def locked():
+            with self._lock:
+                return func(*args)
+
+        return await asyncio.to_thread(locked)
+
+    async def start(self) -> None:
+        """Restore aggregates from the last snapshot and start checkpointing."""
+        if self.snapshot_interval > 0:
+            # Load the last snapshot and replay only the events stored after it
+            await self._run(self.snapshots.restore)
+            self._snapshot_task = asyncio.create_task(
+                self.snapshots.run_periodically(self.snapshot_interval)
+            )
+
+    async def stop(self) -> None:
+        """Write a final snapshot and sync outstanding writes."""
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+            await self.snapshots.checkpoint()
+        await self._run(self.storage.close)
+
+    def validate_event(self, event: Dict):
+        """
+        Validate an event given as a backend API payload.
+
+        Args:
+            event: Event dictionary
+
+        Returns:
+            Event model of the event's type
+
+        Raises:
+            ValueError: If the event is invalid
+        """
+        return self.event_models[self.code_type(event.get("type", "code"))].model_validate(event)
+
+    async def save_validated(self, models: List) -> None:
+        """
+        Save events already validated with validate_event().
+
+        Args:
+            models: Event models
+        """
+        await self._run(self.storage.save_events, models)
+
+    async def save_events(self, events: List[Dict]) -> None:
+        """
+        Validate and save events given as backend API payloads.
+
+        Args:
+            events: Event dictionaries
+
+        Raises:
+            ValueError: If an event is invalid (nothing is saved)
+        """
+        await self.save_validated([self.validate_event(event) for event in events])
+
+    async def features(self, limit: int) -> Dict:
+        """
+        Recent features with their LOC counts.
+
+        Args:
+            limit: Maximum number of features
+
+        Returns:
+            Same response as GET /api/metrics/features
+        """
+        return await self._run(self.aggregator.get_features_metrics, limit)
+
+    async def developer_metrics(self, developer_id: str) -> Dict:
+        """
+        Metrics for a developer.
+
+        Args:
+            developer_id: Developer identifier
+
+        Returns:
+            Same response as GET /api/metrics/developer/{developer_id}
+        """
+        return await self._run(self.aggregator.get_developer_metrics, developer_id)
+
+    async def team_metrics(self) -> Dict:
+        """
+        Team-wide metrics and leaderboard.
+
+        Returns:
+            Same response as GET /api/metrics/team
+        """
+        return await self._run(self.aggregator.get_team_metrics)
@@ -0,0 +1,198 @@
+"""TTL cache of the recent-features list with stale-while-revalidate."""
+
+import asyncio
+import copy
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+# Feature entry counter updated for each event type
+TYPE_FIELDS = {"code": "code_loc", "test": "test_loc", "documentation": "doc_loc"}
+
+
+def apply_event(payload: Dict, event: Dict, limit: int) -> bool:
+    """
+    Apply a tracked event to a features response in place.
+
+    Mirrors the backend: the event's feature gains its lines and becomes the
+    most recently updated one, and the list stays cut at `limit`.
+
+    Args:
+        payload: Features response ({"features", "total_features", "showing"})
+        event: Event payload as sent to the backend
+        limit: Limit the response was requested with
+
+    Returns:
+        False if the feature may exist beyond the cut-off of a truncated
+        list, so its totals are unknown and the payload was left unchanged
+    """
+    metadata = event.get("metadata") or {}
+    feature_name = metadata.get("feature_name") or "unknown"
+    features: List[Dict] = payload["features"]
+
+    entry = next((f for f in features if f["feature_name"] == feature_name), None)
+    if entry is None:
+        if payload["total_features"] > len(features):
+            return False
+        entry = {
+            "feature_name": feature_name,
+            "total_loc": 0,
+            "code_loc": 0,
+            "test_loc": 0,
+            "doc_loc": 0,
+            "event_count": 0,
+            "last_updated": None,
+        }
+        payload["total_features"] += 1
+    else:
+        features.remove(entry)
+
+    lines = event.get("lines", 0)
+    entry["total_loc"] += lines
+    entry["event_count"] += 1
+    field = TYPE_FIELDS.get(event.get("type", "code"))
+    if field:
+        entry[field] += lines
+    timestamp = event.get("timestamp")
+    if timestamp and (entry["last_updated"] is None or timestamp > entry["last_updated"]):
+        entry["last_updated"] = timestamp
+
+    features.insert(0, entry)
+    del features[limit:]
+    payload["showing"] = len(features)
+    return True
+
+
+class _Entry:
+    """Cached response for one limit."""
+
+    def __init__(self, payload: Dict, fetched_at: float):
+        self.payload = payload
+        self.fetched_at = fetched_at
+
+
+class FeatureCache:
+    """
+    Per-limit cache of list_recent_features responses.
+
+    Responses younger than ``ttl`` are served from memory. Until ``ttl +
+    stale`` they are still served, while one background fetch refreshes
+    them; older ones are fetched before answering (concurrent callers share
+    one fetch). If a fetch fails, the last cached response is served with
+    ``"stale": true`` instead of an error.
+
+    Tracked events are applied to cached responses right away
+    (record_event). Events still waiting in the outbox are applied to every
+    fetched response as well, so the list does not lose them while the
+    backend has not stored them yet.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int], Awaitable[Dict]],
+        pending_events: Callable[[], Awaitable[List[Dict]]],
+        ttl: float = 10.0,
+        stale: float = 60.0,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            fetch: Fetches the features response for a limit from the backend
+            pending_events: Returns events queued but not yet delivered
+            ttl: Seconds a response is served without revalidation
+            stale: Further seconds a response is served while revalidating
+        """
+        self.fetch = fetch
+        self.pending_events = pending_events
+        self.ttl = ttl
+        self.stale = stale
+
+        self._entries: Dict[int, _Entry] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, limit: int) -> Dict:
+        """
+        Get the features response for a limit.
+
+        Args:
+            limit: Maximum number of features
+
+        Returns:
+            Features response (a copy, safe to modify)
+
+        Raises:
+            httpx.HTTPError: If the backend fails and nothing is cached
+        """
+        entry = self._entries.get(limit)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl + self.stale:
+                self.hits += 1
+                if age >= self.ttl:
+                    self._revalidate(limit)
+                return copy.deepcopy(entry.payload)
+
+        self.misses += 1
+        try:
+            entry = await asyncio.shield(self._refresh(limit))
+        except Exception:
+            if entry is None:
+                raise
+            return {**copy.deepcopy(entry.payload), "stale": True}
+        return copy.deepcopy(entry.payload)
+
+    def record_event(self, event: Dict) -> None:
+        """
+        Apply a tracked event to every cached response.
+
+        Args:
+            event: Event payload queued for the backend
+        """
+        for limit, entry in list(self._entries.items()):
+            if not apply_event(entry.payload, event, limit):
+                # Totals of a feature beyond the cut-off are unknown: refetch
+                del self._entries[limit]
+
+    def invalidate(self, limit: Optional[int] = None) -> None:
+        """
+        Drop cached responses.
+
+        Args:
+            limit: Limit to drop (None for all)
+        """
+        if limit is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(limit, None)
+
+    def _refresh(self, limit: int) -> asyncio.Task:
+        """Start (or join) the fetch for a limit."""
+        task = self._inflight.get(limit)
+        if task is None:
+            task = asyncio.create_task(self._fetch_entry(limit))
+            self._inflight[limit] = task
+            task.add_done_callback(lambda _: self._inflight.pop(limit, None))
+        return task
+
+    def _revalidate(self, limit: int) -> None:
+        """Refresh a limit in the background, ignoring failures."""
+        task = self._refresh(limit)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        # Retrieve the exception so a failed refresh is not reported as unhandled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _fetch_entry(self, limit: int) -> _Entry:
+        """Fetch a response, overlay pending events and store it."""
+        started = time.monotonic()
+        payload = await self.fetch(limit)
+        # Read the outbox after the fetch: events delivered before the
+        # backend answered are in the payload and no longer pending
+        for event in await self.pending_events():
+            apply_event(payload, event, limit)
+        entry = _Entry(payload, started)
+        self._entries[limit] = entry
+        return entry
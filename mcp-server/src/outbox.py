@@ -0,0 +1,455 @@
+"""Durable on-disk outbox for events waiting to be sent to the backend."""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+
+# Acknowledged bytes at the head of the outbox before it is rewritten
+COMPACT_BYTES = 1024 * 1024
+
+
+class Outbox:
+    """
+    Append-only JSONL file of events with a persisted acknowledgement offset.
+
+    Each line is ``{"id": ..., "queued_at": ..., "event": {...}}``. Events
+    are fsynced before append() returns, so an acknowledged tool call
+    survives a crash of the MCP server. Sent events are acknowledged by
+    advancing the offset stored next to the file; the file is truncated once
+    everything is sent and compacted when the sent prefix grows large. The
+    batch being sent is recorded in a third file (see next_batch()).
+    """
+
+    def __init__(self, path: Path, fsync: bool = True):
+        """
+        Initialize outbox.
+
+        Args:
+            path: Outbox file path (created with its directory if missing)
+            fsync: fsync every append (disable only for tests/benchmarks)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ack_path = self.path.with_name(self.path.name + ".ack")
+        self.batch_path = self.path.with_name(self.path.name + ".batch")
+        self.dead_path = self.path.with_name(self.path.stem + ".dead.jsonl")
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        self.path.touch(exist_ok=True)
+        self._repair()
+        self._offset = self._read_offset()
+        self._depth, self._oldest = self._scan()
+
+    def _repair(self) -> None:
+        """Drop a torn last line left by a crash during append."""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _read_offset(self) -> int:
+        """Read the acknowledged offset, clamped to the file size."""
+        try:
+            offset = int(self.ack_path.read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        return min(offset, self.path.stat().st_size)
+
+    def _write_offset(self, offset: int) -> None:
+        """Persist the acknowledged offset atomically."""
+        tmp_path = self.ack_path.with_name(self.ack_path.name + ".tmp")
+        tmp_path.write_text(str(offset))
+        os.replace(tmp_path, self.ack_path)
+
+    def _scan(self) -> Tuple[int, Optional[float]]:
+        """Count pending entries and find when the oldest was queued."""
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            depth = sum(1 for _ in f)
+        return depth, self._first_queued_at()
+
+    def _first_queued_at(self) -> Optional[float]:
+        """When the first pending entry was queued (None if empty)."""
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            line = f.readline()
+        return json.loads(line).get("queued_at") if line else None
+
+    @property
+    def depth(self) -> int:
+        """Number of events not yet acknowledged by the backend."""
+        return self._depth
+
+    @property
+    def oldest_queued_at(self) -> Optional[float]:
+        """Unix time the oldest pending event was queued (None if empty)."""
+        return self._oldest
+
+    def append(self, event: Dict) -> str:
+        """
+        Durably queue an event.
+
+        Args:
+            event: Event payload as accepted by the backend
+
+        Returns:
+            Outbox entry ID
+        """
+        entry_id = uuid.uuid4().hex
+        queued_at = time.time()
+        line = json.dumps({"id": entry_id, "queued_at": queued_at, "event": event})
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._depth += 1
+            if self._oldest is None:
+                self._oldest = queued_at
+        return entry_id
+
+    def peek(self, limit: int) -> Tuple[List[Dict], int]:
+        """
+        Read the oldest pending entries.
+
+        Args:
+            limit: Maximum number of entries
+
+        Returns:
+            Tuple of (entries, file offset just past the last entry)
+        """
+        with self._lock:
+            return self._read_entries(limit)
+
+    def _read_entries(self, limit: int) -> Tuple[List[Dict], int]:
+        """Read the oldest pending entries (lock held); see peek()."""
+        entries = []
+        offset = self._offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while len(entries) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                entries.append(json.loads(line))
+                offset += len(line)
+        return entries, offset
+
+    def next_batch(self, limit: int) -> Tuple[str, List[Dict], int, List[int]]:
+        """
+        Read the batch to send next: the same one until it is acknowledged.
+
+        The first time, up to `limit` entries are taken and the batch's size
+        and ID are written next to the outbox before they are returned. A
+        retry, also after a restart, then resends exactly these entries under
+        the same ID, so the backend recognizes a batch it already saved even
+        if more events were queued since.
+
+        Args:
+            limit: Maximum number of entries of a new batch
+
+        Returns:
+            Tuple of (batch ID, entries, file offset just past the last entry,
+            indexes of entries dropped from the batch)
+        """
+        with self._lock:
+            batch = self._read_batch()
+            if batch is not None:
+                entries, offset = self._read_entries(batch["count"])
+                if entries and entries[0]["id"] == batch["first"]:
+                    return batch["id"], entries, offset, batch["dropped"]
+            # No batch yet, or one left over from entries acknowledged since
+            entries, offset = self._read_entries(limit)
+            if not entries:
+                return "", [], offset, []
+            batch = {
+                "first": entries[0]["id"],
+                "id": f"{entries[0]['id']}-{len(entries)}",
+                "count": len(entries),
+                "dropped": [],
+            }
+            self._write_batch(batch)
+            return batch["id"], entries, offset, []
+
+    def drop(self, indexes: List[int]) -> None:
+        """
+        Leave entries out of the current batch (e.g. after dead-lettering them).
+
+        Args:
+            indexes: Indexes of entries returned by next_batch()
+        """
+        with self._lock:
+            batch = self._read_batch()
+            if batch is not None:
+                batch["dropped"] = sorted(set(batch["dropped"]) | set(indexes))
+                self._write_batch(batch)
+
+    def _read_batch(self) -> Optional[Dict]:
+        """Batch last written by next_batch(), if any (lock held)."""
+        try:
+            batch = json.loads(self.batch_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return batch if isinstance(batch, dict) else None
+
+    def _write_batch(self, batch: Dict) -> None:
+        """Persist the current batch atomically (lock held)."""
+        tmp_path = self.batch_path.with_name(self.batch_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(batch, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.batch_path)
+
+    def ack(self, count: int, offset: int) -> None:
+        """
+        Mark entries up to a peek() offset as sent.
+
+        Args:
+            count: Number of entries acknowledged
+            offset: Offset returned by peek()
+        """
+        with self._lock:
+            size = self.path.stat().st_size
+            if offset >= size:
+                # Everything sent: start over with an empty file
+                with open(self.path, "w", encoding="utf-8"):
+                    pass
+                offset = 0
+            elif offset >= COMPACT_BYTES:
+                self._compact(offset)
+                offset = 0
+            self._offset = offset
+            self._write_offset(offset)
+            # The batch was sent or dead-lettered; the next one gets a new ID
+            self.batch_path.unlink(missing_ok=True)
+            self._depth = max(0, self._depth - count)
+            self._oldest = self._first_queued_at()
+
+    def _compact(self, offset: int) -> None:
+        """Rewrite the file without its acknowledged prefix (lock held)."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            src.seek(offset)
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        # The offset must never point into the new file's middle
+        self._write_offset(0)
+        os.replace(tmp_path, self.path)
+
+    def dead_letter(self, entries: List[Dict], reason: str) -> None:
+        """
+        Move entries the backend rejected permanently to the dead-letter file.
+
+        Args:
+            entries: Rejected outbox entries
+            reason: Rejection reason stored with each entry
+        """
+        with open(self.dead_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps({**entry, "error": reason}) + "\n")
+
+
+class OutboxFlusher:
+    """
+    Background task sending outbox events to the backend in batches.
+
+    Batches go to ``POST /api/events/batch`` with a batch ID derived from
+    their entries. The outbox keeps each batch's entries and ID until it is
+    acknowledged, so a retry after a lost response resends the same batch
+    and is not saved twice. Failures back off exponentially (with jitter) up
+    to ``max_backoff``; events the backend rejects as invalid are
+    dead-lettered and the rest of their batch is resent, so they do not
+    block the queue.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        client: Callable[[], httpx.AsyncClient],
+        batch_size: int = 50,
+        interval: float = 1.0,
+        base_backoff: float = 0.5,
+        max_backoff: float = 60.0,
+    ):
+        """
+        Initialize flusher.
+
+        Args:
+            outbox: Outbox to drain
+            client: Returns the HTTP client (with backend base_url) to use
+            batch_size: Maximum events per request
+            interval: Seconds between idle flush checks
+            base_backoff: First retry delay in seconds
+            max_backoff: Longest retry delay in seconds
+        """
+        self.outbox = outbox
+        self.client = client
+        self.batch_size = batch_size
+        self.interval = interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_flush_at: Optional[float] = None
+        self.sent = 0
+        self.dead_lettered = 0
+        self._retry_at = 0.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake the flusher after an append."""
+        self._wake.set()
+
+    def status(self) -> Dict:
+        """
+        Outbox depth and delivery state.
+
+        Returns:
+            Status dictionary
+        """
+        oldest = self.outbox.oldest_queued_at
+        return {
+            "depth": self.outbox.depth,
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest else None,
+            "sent": self.sent,
+            "dead_lettered": self.dead_lettered,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            "next_retry_in_seconds": round(max(0.0, self._retry_at - time.monotonic()), 3),
+            "running": self._task is not None and not self._task.done(),
+            "path": str(self.outbox.path),
+        }
+
+    def start(self) -> None:
+        """Start the background task (no-op if running)."""
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task after one last flush attempt."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Whatever is left stays on disk for the next start
+        await self.flush(force=True)
+
+    async def _run(self) -> None:
+        """Flush on wake-ups and every interval until cancelled."""
+        while True:
+            delay = max(self.interval, self._retry_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Send pending events until the outbox is empty or a request fails.
+
+        Args:
+            force: Ignore the backoff delay
+
+        Returns:
+            Number of events delivered
+        """
+        if not force and time.monotonic() < self._retry_at:
+            return 0
+
+        delivered = 0
+        while self.outbox.depth:
+            batch_id, entries, offset, dropped = await asyncio.to_thread(
+                self.outbox.next_batch, self.batch_size
+            )
+            if not entries:
+                break
+            # Positions in the batch of the entries still to send
+            sent = sorted(set(range(len(entries))) - set(dropped))
+            if sent:
+                batch = {
+                    "batch_id": batch_id,
+                    "events": [entries[i]["event"] for i in sent],
+                }
+                try:
+                    response = await self.client().post("/api/events/batch", json=batch)
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    if 400 <= status < 500 and status not in (408, 429):
+                        # Retrying cannot fix invalid events; the rest is resent
+                        invalid = [sent[i] for i in _invalid_events(e.response, len(sent))]
+                        reason = f"Backend rejected batch: {status} {e.response.text[:500]}"
+                        rejected = [entries[i] for i in invalid or sent]
+                        await asyncio.to_thread(self.outbox.dead_letter, rejected, reason)
+                        await asyncio.to_thread(self.outbox.drop, invalid or sent)
+                        self.dead_lettered += len(rejected)
+                        self.last_error = reason
+                        continue
+                    self._backoff(f"Backend error: {status}")
+                    break
+                except httpx.HTTPError as e:
+                    self._backoff(f"Failed to reach backend: {str(e) or type(e).__name__}")
+                    break
+
+            await asyncio.to_thread(self.outbox.ack, len(entries), offset)
+            delivered += len(sent)
+            self.sent += len(entries)
+            self.failures = 0
+            self.last_error = None
+            self._retry_at = 0.0
+            self.last_flush_at = time.time()
+        return delivered
+
+    def _backoff(self, error: str) -> None:
+        """Record a failure and schedule the next attempt."""
+        self.failures += 1
+        self.last_error = error
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (self.failures - 1))
+        self._retry_at = time.monotonic() + delay * random.uniform(0.5, 1.0)
+
+
+def _invalid_events(response: httpx.Response, count: int) -> List[int]:
+    """
+    Indexes of the events a 422 response of the batch endpoint reports invalid.
+
+    Args:
+        response: Error response
+        count: Number of events sent
+
+    Returns:
+        Sorted event indexes (empty if the response names none, e.g. when the
+        batch itself was rejected)
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return []
+    details = body.get("detail") if isinstance(body, dict) else None
+    if not isinstance(details, list):
+        return []
+    invalid = set()
+    for error in details:
+        loc = error.get("loc", []) if isinstance(error, dict) else []
+        if len(loc) > 2 and loc[:2] == ["body", "events"] and isinstance(loc[2], int):
+            if 0 <= loc[2] < count:
+                invalid.add(loc[2])
+    return sorted(invalid)
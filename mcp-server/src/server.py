@@ -3,13 +3,169 @@
 import os
 import sys
 import argparse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
 from mcp.server.fastmcp import FastMCP
 import httpx
 import uvicorn
+from .embedded import EmbeddedBackend
+from .feature_cache import FeatureCache
+from .outbox import Outbox, OutboxFlusher
+
+# Get backend URL from environment or use default
+BACKEND_URL = os.getenv("METRICS_BACKEND_URL", "http://localhost:8000")
+
+# Backend connection pool settings
+HTTP_TIMEOUT = float(os.getenv("METRICS_HTTP_TIMEOUT", "5.0"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("METRICS_HTTP_CONNECT_TIMEOUT", "2.0"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("METRICS_HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("METRICS_HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("METRICS_HTTP_KEEPALIVE_EXPIRY", "30.0"))
+
+# Local outbox of tracked events waiting for the backend
+OUTBOX_PATH = Path(
+    os.getenv("METRICS_OUTBOX_PATH")
+    or Path(__file__).parent.parent / "outbox" / "events.jsonl"
+)
+OUTBOX_BATCH_SIZE = int(os.getenv("METRICS_OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_FLUSH_INTERVAL = float(os.getenv("METRICS_OUTBOX_FLUSH_INTERVAL", "1.0"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("METRICS_OUTBOX_MAX_BACKOFF", "60.0"))
+
+# Feature list cache: fresh for TTL seconds, then served while revalidating
+FEATURE_CACHE_TTL = float(os.getenv("METRICS_FEATURE_CACHE_TTL", "10.0"))
+FEATURE_CACHE_STALE = float(os.getenv("METRICS_FEATURE_CACHE_STALE", "60.0"))
+
+# Shared pooled client, opened on first use and closed with the last session
+http_client: Optional[httpx.AsyncClient] = None
+_active_sessions = 0
+
+# In-process backend replacing HTTP calls when started with --embedded
+embedded: Optional[EmbeddedBackend] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the pooled backend client, creating it on first use.
+
+    Returns:
+        Shared AsyncClient with keep-alive connections to the backend
+    """
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled backend client and its connections."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+outbox = Outbox(OUTBOX_PATH)
+outbox_flusher = OutboxFlusher(
+    outbox,
+    get_http_client,
+    batch_size=OUTBOX_BATCH_SIZE,
+    interval=OUTBOX_FLUSH_INTERVAL,
+    max_backoff=OUTBOX_MAX_BACKOFF,
+)
+
+
+async def _fetch_features(limit: int) -> dict:
+    """Fetch the recent-features list from the backend."""
+    if embedded is not None:
+        return await embedded.features(limit)
+    response = await get_http_client().get("/api/metrics/features", params={"limit": limit})
+    response.raise_for_status()
+    return response.json()
+
+
+async def _pending_events() -> list:
+    """Events queued in the outbox and not yet delivered."""
+    entries, _ = await asyncio.to_thread(outbox.peek, outbox.depth)
+    return [entry["event"] for entry in entries]
+
+
+feature_cache = FeatureCache(
+    _fetch_features, _pending_events, ttl=FEATURE_CACHE_TTL, stale=FEATURE_CACHE_STALE
+)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """
+    Keep the backend client and outbox flusher running while any MCP session is.
+
+    FastMCP enters the lifespan once per session (once per process for
+    stdio, once per connection for SSE), so both are shared by concurrent
+    sessions and stopped when the last one ends. Events still queued then
+    stay in the outbox file and are sent after the next start.
+
+    In embedded mode the in-process backend is started instead, and events
+    left in the outbox by an earlier HTTP-mode run are saved to it.
+    """
+    global _active_sessions
+    _active_sessions += 1
+    if _active_sessions == 1:
+        if embedded is not None:
+            await embedded.start()
+            await _drain_outbox_locally()
+        else:
+            get_http_client()
+            outbox_flusher.start()
+            if outbox.depth:
+                outbox_flusher.notify()
+    try:
+        yield
+    finally:
+        _active_sessions -= 1
+        if _active_sessions == 0:
+            if embedded is not None:
+                await embedded.stop()
+            else:
+                await outbox_flusher.stop()
+                await close_http_client()
+
+
+async def _drain_outbox_locally() -> None:
+    """
+    Save events queued in the outbox to the embedded backend.
+
+    Events are validated one by one: invalid ones are dead-lettered, the
+    rest of their batch is still saved.
+    """
+    while outbox.depth:
+        entries, offset = await asyncio.to_thread(outbox.peek, OUTBOX_BATCH_SIZE)
+        models = []
+        for entry in entries:
+            try:
+                models.append(embedded.validate_event(entry["event"]))
+            except ValueError as e:
+                await asyncio.to_thread(outbox.dead_letter, [entry], f"Invalid event: {str(e)}")
+        if models:
+            await embedded.save_validated(models)
+        await asyncio.to_thread(outbox.ack, len(entries), offset)
+
 
 # Initialize FastMCP server with instructions
 mcp = FastMCP(
     "AI LOC Tracker",
+    lifespan=lifespan,
     instructions="""
 CRITICAL RULES - YOU MUST FOLLOW THESE:
 
@@ -44,13 +200,9 @@ CRITICAL RULES - YOU MUST FOLLOW THESE:
 """,
 )
 
-# Get backend URL from environment or use default
-BACKEND_URL = os.getenv("METRICS_BACKEND_URL", "http://localhost:8000")
-http_client = httpx.AsyncClient(timeout=10.0)
-
 
 @mcp.tool()
-def track_agent_code(
+async def track_agent_code(
     loc_count: int,
     feature_name: str,
     total_files: int = 1,
@@ -74,7 +226,7 @@ def track_agent_code(
         developer_id: Developer identifier (default: "unknown")
 
     Returns:
-        Success response with lines tracked
+        Success response with lines tracked and current outbox depth
     """
     if loc_count <= 0:
         return {"success": False, "message": "LOC count must be greater than 0"}
@@ -88,14 +240,11 @@ def track_agent_code(
             "message": "feature_name is REQUIRED and cannot be 'unknown'. Please call list_recent_features() first, then ask user for feature name.",
         }
 
-    # Determine event endpoint based on code_type
-    endpoint_map = {
-        "code": "/api/events/code",
-        "test": "/api/events/test",
-        "documentation": "/api/events/documentation",
-    }
-
-    endpoint = endpoint_map.get(code_type, "/api/events/code")
+    if code_type not in ("code", "test", "documentation"):
+        return {
+            "success": False,
+            "message": "code_type must be 'code', 'test' or 'documentation'",
+        }
 
     # Prepare event payload
     event = {
@@ -105,6 +254,8 @@ def track_agent_code(
         "language": "unknown",
         "developer_id": developer_id,
         "type": code_type,
+        # Stamp now; the backend may only see the event later
+        "timestamp": datetime.now().isoformat(),
         "metadata": {
             "feature_name": feature_name,
             "total_files": total_files,
@@ -117,10 +268,14 @@ def track_agent_code(
     elif code_type == "documentation":
         event["doc_type"] = "api-doc"
 
-    # Send to backend
-    try:
-        response = httpx.post(f"{BACKEND_URL}{endpoint}", json=event, timeout=5.0)
-        response.raise_for_status()
+    if embedded is not None:
+        try:
+            await embedded.save_events([event])
+        except ValueError as e:
+            return {"success": False, "message": f"Invalid event: {str(e)}"}
+        except OSError as e:
+            return {"success": False, "message": f"Failed to save event: {str(e)}"}
+        feature_cache.record_event(event)
         return {
             "success": True,
             "message": f"Agent code tracked: {loc_count} LOC across {total_files} file(s)",
@@ -128,21 +283,43 @@ def track_agent_code(
             "feature_name": feature_name,
             "total_files": total_files,
             "code_type": code_type,
+            "queued": 0,
         }
-    except httpx.RequestError as e:
-        return {
-            "success": False,
-            "message": f"Failed to send event to backend: {str(e)}",
-        }
-    except httpx.HTTPStatusError as e:
+
+    # Queue durably; the background flusher sends it to the backend
+    try:
+        await asyncio.to_thread(outbox.append, event)
+    except OSError as e:
         return {
             "success": False,
-            "message": f"Backend error: {e.response.status_code}",
+            "message": f"Failed to queue event: {str(e)}",
         }
+    outbox_flusher.notify()
+    feature_cache.record_event(event)
+    return {
+        "success": True,
+        "message": f"Agent code tracked: {loc_count} LOC across {total_files} file(s)",
+        "loc_count": loc_count,
+        "feature_name": feature_name,
+        "total_files": total_files,
+        "code_type": code_type,
+        "queued": outbox.depth,
+    }
+
+
+@mcp.resource("outbox://status")
+async def get_outbox_status() -> str:
+    """
+    Get the state of the local event outbox.
+
+    Returns:
+        JSON string with outbox depth, oldest queued event age and delivery state
+    """
+    return json.dumps(outbox_flusher.status())
 
 
 @mcp.resource("metrics://developer/{developer_id}")
-def get_developer_metrics(developer_id: str) -> str:
+async def get_developer_metrics(developer_id: str) -> str:
     """
     Get metrics for a specific developer.
 
@@ -152,10 +329,11 @@ def get_developer_metrics(developer_id: str) -> str:
     Returns:
         JSON string with developer metrics
     """
+    if embedded is not None:
+        return json.dumps(await embedded.developer_metrics(developer_id), default=str)
     try:
-        response = httpx.get(
-            f"{BACKEND_URL}/api/metrics/developer/{developer_id}",
-            timeout=5.0,
+        response = await get_http_client().get(
+            f"/api/metrics/developer/{developer_id}"
         )
         response.raise_for_status()
         return response.text
@@ -166,15 +344,17 @@ def get_developer_metrics(developer_id: str) -> str:
 
 
 @mcp.resource("metrics://team")
-def get_team_metrics() -> str:
+async def get_team_metrics() -> str:
     """
     Get team-wide metrics and leaderboard.
 
     Returns:
         JSON string with team metrics
     """
+    if embedded is not None:
+        return json.dumps(await embedded.team_metrics(), default=str)
     try:
-        response = httpx.get(f"{BACKEND_URL}/api/metrics/team", timeout=5.0)
+        response = await get_http_client().get("/api/metrics/team")
         response.raise_for_status()
         return response.text
     except httpx.RequestError as e:
@@ -184,7 +364,7 @@ def get_team_metrics() -> str:
 
 
 @mcp.tool()
-def list_recent_features(limit: int = 20) -> dict:
+async def list_recent_features(limit: int = 20) -> dict:
     """
     List recent features with their total LOC counts.
 
@@ -198,13 +378,7 @@ def list_recent_features(limit: int = 20) -> dict:
         Dictionary with recent features and their LOC counts
     """
     try:
-        response = httpx.get(
-            f"{BACKEND_URL}/api/metrics/features",
-            params={"limit": limit},
-            timeout=5.0,
-        )
-        response.raise_for_status()
-        return response.json()
+        return await feature_cache.get(limit)
     except httpx.RequestError as e:
         return {
             "success": False,
@@ -240,13 +414,30 @@ if __name__ == "__main__":
         default="localhost",
         help="Host for SSE transport (default: localhost)",
     )
+    parser.add_argument(
+        "--embedded",
+        action="store_true",
+        help="Run the backend storage and aggregator in-process instead of over HTTP",
+    )
+    parser.add_argument(
+        "--backend-dir",
+        type=Path,
+        default=os.getenv("METRICS_BACKEND_DIR") or None,
+        help="Backend project directory for --embedded (default: ../backend)",
+    )
 
     args = parser.parse_args()
 
+    if args.embedded:
+        embedded = EmbeddedBackend(args.backend_dir)
+        # stdout carries the stdio transport, so report on stderr
+        print(f"Embedded backend, data in {embedded.data_dir}", file=sys.stderr)
+
     if args.transport == "sse":
         # Run with SSE transport on specified port
         print(f"Starting MCP server on {args.host}:{args.port} with SSE transport...")
-        print(f"Backend URL: {BACKEND_URL}")
+        if embedded is None:
+            print(f"Backend URL: {BACKEND_URL}")
         print(f"Connect Cursor to: http://{args.host}:{args.port}")
 
         # FastMCP with SSE transport
@@ -260,8 +451,6 @@ if __name__ == "__main__":
             print(f"Using uvicorn to run server (FastMCP limitation: {e})")
             from fastapi import FastAPI
             from fastapi.responses import StreamingResponse
-            import json
-            import asyncio
 
             app = FastAPI(title="MCP Server - AI LOC Tracker")
 